@@ -0,0 +1,76 @@
+"""
+近似最近邻（IVF）索引基准测试
+在带簇结构的合成向量上，对比精确搜索与不同 nprobe 下 IVF 搜索的 recall@k 和 QPS
+
+用法:
+    python benchmarks/bench_ann.py --sizes 100000 1000000 --dim 1024 --nprobe 4 8 16 32
+"""
+import sys
+import time
+import asyncio
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+from VectorStore import VectorStore
+from IVFIndex import IVFIndex
+
+
+def make_vectors(rng: np.random.Generator, count: int, dim: int, clusters: int) -> np.ndarray:
+    """生成带簇结构的向量，模拟真实嵌入的分布（纯随机向量对任何 ANN 都没有结构可用）"""
+    centers = rng.standard_normal((clusters, dim), dtype=np.float32)
+    vectors = np.empty((count, dim), dtype=np.float32)
+    for start in range(0, count, 65536):
+        end = min(count, start + 65536)
+        labels = rng.integers(0, clusters, end - start)
+        vectors[start:end] = centers[labels] + 0.6 * rng.standard_normal((end - start, dim), dtype=np.float32)
+    return vectors
+
+
+async def run_queries(store: VectorStore, queries: np.ndarray, top_k: int, **kwargs):
+    """依次执行所有查询，返回结果列表和 QPS"""
+    start = time.perf_counter()
+    results = [await store.search(query, top_k, **kwargs) for query in queries]
+    return results, len(queries) / (time.perf_counter() - start)
+
+
+def recall(approx, exact) -> float:
+    return float(np.mean([len(set(a) & set(e)) / len(e) for a, e in zip(approx, exact)]))
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100_000])
+    parser.add_argument('--dim', type=int, default=1024)
+    parser.add_argument('--top-k', type=int, default=10)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--nlist', type=int, default=None)
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[4, 8, 16, 32])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for size in args.sizes:
+        vectors = make_vectors(rng, size, args.dim, clusters=max(16, size // 1000))
+        queries = vectors[rng.choice(size, args.queries, replace=False)] \
+            + 0.3 * rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+
+        store = VectorStore(initial_capacity=size, ann_index=IVFIndex(nlist=args.nlist))
+        await store.add_embeddings(vectors, [str(i) for i in range(size)])
+        exact, exact_qps = await run_queries(store, queries, args.top_k)
+
+        start = time.perf_counter()
+        store.train_index()
+        build_s = time.perf_counter() - start
+
+        print(f"N={size} dim={args.dim} nlist={store.ann_index.nlist} build={build_s:.1f}s")
+        print(f"{'mode':>12} {'recall@' + str(args.top_k):>10} {'QPS':>10}")
+        print(f"{'exact':>12} {1.0:>10.3f} {exact_qps:>10.1f}")
+        for nprobe in args.nprobe:
+            approx, qps = await run_queries(store, queries, args.top_k, nprobe=nprobe)
+            print(f"{'nprobe=' + str(nprobe):>12} {recall(approx, exact):>10.3f} {qps:>10.1f}")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,67 @@
+"""
+向量量化基准测试
+在带簇结构的合成向量上，对比 float32 精确搜索与 float16 / int8 / PQ 量化存储的
+每向量内存占用、recall@k 和 QPS，以及精确重排（rerank）对召回率的影响
+
+向量先保存到临时目录再以内存映射方式加载，因此全精度向量只在磁盘上，
+常驻内存的是量化编码
+
+用法:
+    python benchmarks/bench_quantization.py --size 100000 --dim 1024 --pq-m 64 128 --rerank 0 4 16
+"""
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+from VectorStore import VectorStore
+from Quantizer import Float16Quantizer, Int8Quantizer, ProductQuantizer
+from bench_ann import make_vectors, run_queries, recall
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=int, default=100_000)
+    parser.add_argument('--dim', type=int, default=1024)
+    parser.add_argument('--top-k', type=int, default=10)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--pq-m', type=int, nargs='+', default=[64, 128])
+    parser.add_argument('--rerank', type=int, nargs='+', default=[0, 4, 16])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = make_vectors(rng, args.size, args.dim, clusters=max(16, args.size // 1000))
+    queries = vectors[rng.choice(args.size, args.queries, replace=False)] \
+        + 0.3 * rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+
+    with tempfile.TemporaryDirectory() as path:
+        store = VectorStore(initial_capacity=args.size)
+        await store.add_embeddings(vectors, [str(i) for i in range(args.size)])
+        store.save(path)
+        del vectors
+        exact, exact_qps = await run_queries(store, queries, args.top_k)
+
+        print(f"N={args.size} dim={args.dim}")
+        print(f"{'mode':>24} {'rerank':>7} {'bytes/vec':>10} {'build':>8} {'recall@' + str(args.top_k):>10} {'QPS':>10}")
+        print(f"{'float32':>24} {'-':>7} {4 * args.dim:>10} {'-':>8} {1.0:>10.3f} {exact_qps:>10.1f}")
+
+        quantizers = [Float16Quantizer(), Int8Quantizer()] + [ProductQuantizer(m=m) for m in args.pq_m]
+        for quantizer in quantizers:
+            store = VectorStore.load(path, quantizer=quantizer)
+            start = time.perf_counter()
+            store.train_index()
+            build_s = time.perf_counter() - start
+            for rerank in args.rerank:
+                store.rerank = rerank
+                approx, qps = await run_queries(store, queries, args.top_k)
+                print(f"{repr(quantizer):>24} {rerank:>7} {quantizer.bytes_per_vector:>10.0f} "
+                      f"{build_s:>7.1f}s {recall(approx, exact):>10.3f} {qps:>10.1f}")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,66 @@
+"""
+多进程分片搜索基准测试
+对比单进程 VectorStore 与不同分片数的 ShardedVectorStore 的精确搜索 QPS，
+并校验分片搜索的结果与单进程完全一致
+
+用法:
+    python benchmarks/bench_sharded.py --size 1000000 --dim 1024 --workers 1 2 4 8 --concurrency 8
+"""
+import sys
+import time
+import asyncio
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+from VectorStore import VectorStore
+from ShardedVectorStore import ShardedVectorStore
+
+
+async def run_queries(store, queries: np.ndarray, top_k: int, concurrency: int):
+    """以固定并发度执行所有查询，返回结果列表和 QPS"""
+    results = [None] * len(queries)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with semaphore:
+            results[i] = await store.search(queries[i], top_k)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(len(queries))))
+    return results, len(queries) / (time.perf_counter() - start)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=int, default=200_000)
+    parser.add_argument('--dim', type=int, default=1024)
+    parser.add_argument('--top-k', type=int, default=10)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--concurrency', type=int, default=8)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    store = VectorStore(initial_capacity=args.size)
+    await store.add_embeddings(rng.standard_normal((args.size, args.dim), dtype=np.float32),
+                               [str(i) for i in range(args.size)])
+    queries = rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+
+    exact, qps = await run_queries(store, queries, args.top_k, args.concurrency)
+    print(f"N={args.size} dim={args.dim} concurrency={args.concurrency}")
+    print(f"{'mode':>12} {'QPS':>10} {'speedup':>8}")
+    print(f"{'single':>12} {qps:>10.1f} {1.0:>8.2f}")
+    for workers in args.workers:
+        async with ShardedVectorStore(store, workers=workers) as sharded:
+            # 预热：等待所有进程完成启动
+            await sharded.search(queries[0], args.top_k)
+            results, sharded_qps = await run_queries(sharded, queries, args.top_k, args.concurrency)
+        assert results == exact, 'sharded results differ from single-process search'
+        print(f"{'shards=' + str(workers):>12} {sharded_qps:>10.1f} {sharded_qps / qps:>8.2f}")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
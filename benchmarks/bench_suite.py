@@ -0,0 +1,249 @@
+"""
+端到端基准测试套件
+用本地替身（fake_servers.py 的流式聊天/嵌入接口、stub_mcp_server.py 的 stdio MCP 服务器）代替
+阿里云、SiliconFlow 和 npx 启动的 MCP 服务器，测量：
+  search     VectorStore.search 的 QPS 与语料规模的关系
+  ingest     KnowledgeIngestor 流水线导入的吞吐量
+  agent      多个 Agent 会话并发运行时的每秒步数（一步 = 一次 LLM 请求）
+  main_task  MainTask 的完整流程（冷启动建索引、热启动复用索引和缓存），在子进程中运行
+
+结果写入 JSON 文件（默认 benchmarks/results/<commit>.json），用 --compare 与之前的结果对比
+
+用法:
+    python benchmarks/bench_suite.py
+    python benchmarks/bench_suite.py --scenarios search ingest --compare benchmarks/results/abc1234.json
+"""
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+import contextlib
+from pathlib import Path
+from typing import Any, Dict
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'src'))
+from VectorStore import VectorStore
+from EmbeddingRetriever import EmbeddingRetriever
+from KnowledgeIngestor import KnowledgeIngestor
+from MCPClient import MCPClient
+from Agent import Agent
+from EventSink import NullSink
+from fake_servers import FakeServerProcess
+from bench_ann import run_queries
+
+STUB_MCP_SERVER = str(Path(__file__).resolve().parent / 'stub_mcp_server.py')
+SCENARIOS = ('search', 'ingest', 'agent', 'main_task')
+
+# 在子进程中运行 MainTask：把文件系统 MCP 服务器换成替身，其余流程不变
+MAIN_TASK_RUNNER = '''
+import sys, asyncio
+sys.path.insert(0, {src!r})
+import MainTask
+from MCPClient import MCPClient
+MainTask.file_mcp = MCPClient('stub-mcp', sys.executable, [{stub!r}, '--latency', {latency!r}])
+asyncio.run(MainTask.main())
+'''
+
+
+@contextlib.contextmanager
+def quiet():
+    """屏蔽被测代码的启动和进度日志，只保留基准测试自己的结果"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def write_chapters(directory: Path, chapters: int, paragraphs: int):
+    """生成合成的章节文件，段落格式与 knowledge 目录一致（以全角空格开头）"""
+    directory.mkdir(parents=True, exist_ok=True)
+    for chapter in range(chapters):
+        text = ''.join(f'　　第{chapter}章第{paragraph}段，郭靖与黄蓉在桃花岛上练习武功，洪七公在旁指点。\n'
+                       for paragraph in range(paragraphs))
+        (directory / f'Chapter{chapter:04d}.txt').write_text(text, encoding='utf-8')
+
+
+async def bench_search(args) -> Dict[str, Any]:
+    """不同语料规模下精确搜索的 QPS"""
+    rng = np.random.default_rng(0)
+    results = {}
+    for size in args.search_sizes:
+        store = VectorStore(initial_capacity=size)
+        await store.add_embeddings(rng.standard_normal((size, args.dim), dtype=np.float32),
+                                   [str(i) for i in range(size)])
+        queries = rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+        _, qps = await run_queries(store, queries, args.top_k)
+        results[str(size)] = {'qps': qps}
+        print(f"  search N={size:<9} {qps:>10.1f} QPS")
+    return results
+
+
+async def bench_ingest(args, server: FakeServerProcess) -> Dict[str, Any]:
+    """从空索引导入合成章节的吞吐量，以及各流水线阶段的统计"""
+    with tempfile.TemporaryDirectory() as path:
+        knowledge = Path(path) / 'knowledge'
+        write_chapters(knowledge, args.chapters, args.paragraphs)
+        async with EmbeddingRetriever('fake', url=server.url + '/v1/embeddings') as retriever:
+            ingestor = KnowledgeIngestor(retriever, Path(path) / 'index')
+            start = time.perf_counter()
+            with quiet():
+                stats = await ingestor.sync(knowledge)
+            elapsed = time.perf_counter() - start
+    result = {
+        'files': args.chapters,
+        'texts': stats['added'],
+        'seconds': elapsed,
+        'texts_per_s': stats['added'] / elapsed,
+        'stages': {stage: {'busy': counter['busy'], 'throughput': counter['throughput']}
+                   for stage, counter in ingestor.pipeline_stats.items() if stage != 'total'},
+    }
+    print(f"  ingest {stats['added']} texts from {args.chapters} files in {elapsed:.2f}s "
+          f"({result['texts_per_s']:.1f} texts/s)")
+    return result
+
+
+async def bench_agent(args, server: FakeServerProcess) -> Dict[str, Any]:
+    """多个 Agent 会话共享一个 MCP 客户端并发执行任务，统计每秒完成的 LLM 步数"""
+    client = MCPClient('stub-mcp', sys.executable, [STUB_MCP_SERVER, '--latency', str(args.tool_latency)])
+    agents = [Agent('fake', [client], base_url=server.url + '/v1', api_key='fake', sink=NullSink())
+              for _ in range(args.sessions)]
+    with quiet():
+        await agents[0].init()
+        for agent in agents[1:]:
+            await agent.init()
+    before = await server.stats()
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*(agent.invoke(f'task {i}') for i, agent in enumerate(agents)))
+        elapsed = time.perf_counter() - start
+    finally:
+        with quiet():
+            await agents[0].close()
+    after = await server.stats()
+    steps = after['chat_requests'] - before['chat_requests']
+    result = {
+        'sessions': args.sessions,
+        'steps': steps,
+        'tool_calls': after['tool_calls'] - before['tool_calls'],
+        'seconds': elapsed,
+        'steps_per_s': steps / elapsed,
+    }
+    print(f"  agent {args.sessions} sessions, {steps} steps in {elapsed:.2f}s ({result['steps_per_s']:.1f} steps/s)")
+    return result
+
+
+async def bench_main_task(args, server: FakeServerProcess) -> Dict[str, Any]:
+    """在临时工作目录中运行两次 MainTask：第一次从头建索引，第二次复用索引和嵌入缓存"""
+    env = {**os.environ, 'LLM_BASE_URL': server.url + '/v1', 'EMBEDDING_URL': server.url + '/v1/embeddings',
+           'ALIYUN_API_KEY': 'fake', 'SILICONFLOW_API_KEY': 'fake', 'AGENT_OUTPUT': 'null'}
+    code = MAIN_TASK_RUNNER.format(src=str(ROOT / 'src'), stub=STUB_MCP_SERVER, latency=str(args.tool_latency))
+    result = {}
+    with tempfile.TemporaryDirectory() as path:
+        shutil.copytree(ROOT / 'knowledge', Path(path) / 'knowledge')
+        (Path(path) / 'output').mkdir()
+        for run in ('cold', 'warm'):
+            start = time.perf_counter()
+            completed = await asyncio.to_thread(subprocess.run, [sys.executable, '-c', code], cwd=path, env=env,
+                                                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+            elapsed = time.perf_counter() - start
+            if completed.returncode != 0:
+                raise RuntimeError(f'MainTask failed:\n{completed.stderr.decode(errors="replace")}')
+            result[run] = {'seconds': elapsed}
+            print(f"  main_task {run:<5} {elapsed:.2f}s")
+    return result
+
+
+def flatten(results: Dict[str, Any], prefix: str = '') -> Dict[str, float]:
+    """把嵌套结果展开为 "场景.指标" -> 数值"""
+    flat = {}
+    for key, value in results.items():
+        name = f'{prefix}.{key}' if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, name))
+        elif isinstance(value, (int, float)):
+            flat[name] = value
+    return flat
+
+
+def compare(current: Dict[str, Any], baseline_path: str):
+    """打印与之前结果相比变化的指标；耗时类指标（seconds、busy）越小越好，其余越大越好"""
+    baseline = json.loads(Path(baseline_path).read_text(encoding='utf-8'))
+    old, new = flatten(baseline['results']), flatten(current['results'])
+    print(f"\nCompared with {baseline.get('commit', baseline_path)}:")
+    print(f"{'metric':<44} {'before':>12} {'after':>12} {'change':>8}")
+    for name in sorted(old.keys() & new.keys()):
+        if not old[name]:
+            continue
+        change = new[name] / old[name] - 1
+        lower_is_better = name.endswith(('seconds', 'busy'))
+        flag = '⚠️' if (change > 0.1 if lower_is_better else change < -0.1) else ''
+        print(f"{name:<44} {old[name]:>12.3f} {new[name]:>12.3f} {change:>+7.1%} {flag}")
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--dim', type=int, default=1024, help='嵌入向量维度')
+    parser.add_argument('--search-sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--chapters', type=int, default=100)
+    parser.add_argument('--paragraphs', type=int, default=40, help='每个章节的段落数')
+    parser.add_argument('--sessions', type=int, default=8, help='agent 场景中并发的会话数')
+    parser.add_argument('--ttft', type=float, default=0.05, help='替身 LLM 首个 token 的延迟秒数')
+    parser.add_argument('--token-delay', type=float, default=0.002, help='替身 LLM 相邻 token 的延迟秒数')
+    parser.add_argument('--tokens', type=int, default=64, help='替身 LLM 每个回答的 token 数')
+    parser.add_argument('--embedding-latency', type=float, default=0.02, help='替身嵌入接口每个请求的延迟秒数')
+    parser.add_argument('--tool-latency', type=float, default=0.005, help='替身 MCP 工具的延迟秒数')
+    parser.add_argument('--output', default=None, help='结果文件，默认为 benchmarks/results/<commit>.json')
+    parser.add_argument('--compare', default=None, help='与之前的结果文件对比')
+    args = parser.parse_args()
+
+    commit = git_commit()
+    report = {
+        'commit': commit,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'config': vars(args),
+        'results': {},
+    }
+    async with FakeServerProcess(ttft=args.ttft, token_delay=args.token_delay, tokens=args.tokens,
+                                 embedding_dim=args.dim, embedding_latency=args.embedding_latency) as server:
+        runners = {
+            'search': lambda: bench_search(args),
+            'ingest': lambda: bench_ingest(args, server),
+            'agent': lambda: bench_agent(args, server),
+            'main_task': lambda: bench_main_task(args, server),
+        }
+        for scenario in args.scenarios:
+            print(f'{scenario}:')
+            report['results'][scenario] = await runners[scenario]()
+
+    output = Path(args.output) if args.output else Path(__file__).resolve().parent / 'results' / f'{commit}.json'
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+    print(f'\nResults written to {output}')
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,84 @@
+"""
+VectorStore.search 基准测试
+对比原纯 Python 余弦相似度实现与 NumPy 矩阵实现的查询延迟
+
+用法:
+    python benchmarks/bench_vector_store.py --sizes 10000 100000 1000000 --dim 1024
+"""
+import sys
+import math
+import time
+import asyncio
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
+from VectorStore import VectorStore
+
+
+def python_search(items, query_embedding, top_k):
+    """原实现：逐项计算余弦相似度后全量排序"""
+    def cosine(vec_a, vec_b):
+        dot_product = sum(a * b for a, b in zip(vec_a, vec_b))
+        norm_a = math.sqrt(sum(a * a for a in vec_a))
+        norm_b = math.sqrt(sum(b * b for b in vec_b))
+        return dot_product / (norm_a * norm_b)
+
+    scored = [
+        {'document': document, 'score': cosine(query_embedding, embedding)}
+        for embedding, document in items
+    ]
+    return [item['document'] for item in sorted(scored, key=lambda x: x['score'], reverse=True)[:top_k]]
+
+
+async def build_store(vectors: np.ndarray) -> VectorStore:
+    store = VectorStore(initial_capacity=len(vectors))
+    for i, vector in enumerate(vectors):
+        await store.add_embedding(vector, f'doc-{i}')
+    return store
+
+
+async def timeit(fn, repeat: int) -> float:
+    """返回 repeat 次调用的平均耗时（毫秒），fn 可以返回协程"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+        if asyncio.iscoroutine(result):
+            await result
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000])
+    parser.add_argument('--dim', type=int, default=1024)
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--python-max', type=int, default=10_000,
+                        help='纯 Python 实现只在不超过该规模时测试（太慢）')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'N':>10} {'numpy ms':>10} {'python ms':>10} {'speedup':>8}")
+    for size in args.sizes:
+        vectors = rng.standard_normal((size, args.dim), dtype=np.float32)
+        query = rng.standard_normal(args.dim, dtype=np.float32)
+        store = await build_store(vectors)
+
+        numpy_ms = await timeit(lambda: store.search(query, args.top_k), args.repeat)
+
+        python_ms = float('nan')
+        if size <= args.python_max:
+            items = [(vector.tolist(), f'doc-{i}') for i, vector in enumerate(vectors)]
+            query_list = query.tolist()
+            expected = python_search(items, query_list, args.top_k)
+            assert await store.search(query, args.top_k) == expected, 'result ordering differs'
+            python_ms = await timeit(lambda: python_search(items, query_list, args.top_k), 1)
+
+        print(f"{size:>10} {numpy_ms:>10.2f} {python_ms:>10.2f} {python_ms / numpy_ms:>8.1f}x")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
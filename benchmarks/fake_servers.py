@@ -0,0 +1,198 @@
+"""
+本地替身服务：兼容 OpenAI 的流式聊天接口 /v1/chat/completions 和嵌入接口 /v1/embeddings
+不访问任何外部服务，延迟可配置，输出完全确定，用于可复现的基准测试
+
+聊天接口：请求带 tools 且当前用户消息之后的工具调用轮数少于 --tool-rounds 时，返回一次工具调用
+（优先调用 --tool-name 指定的工具，否则调用列表中的第一个）；否则按 --ttft 和 --token-delay
+逐个流式返回 --tokens 个文本 token，最后附带 usage。
+嵌入接口：以文本的 SHA-256 为种子生成 --embedding-dim 维的正态分布向量，同一文本始终得到同一向量
+
+用法:
+    python benchmarks/fake_servers.py --port 8000 --ttft 0.2 --token-delay 0.01 --embedding-latency 0.05
+    # 然后令 LLM_BASE_URL=http://127.0.0.1:8000/v1 EMBEDDING_URL=http://127.0.0.1:8000/v1/embeddings
+"""
+import sys
+import json
+import asyncio
+import hashlib
+import argparse
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import aiohttp
+from aiohttp import web
+
+
+def embed(text: str, dim: int) -> List[float]:
+    """文本的确定性伪嵌入向量"""
+    seed = int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'little')
+    return np.random.default_rng(seed).standard_normal(dim, dtype=np.float32).tolist()
+
+
+class FakeServer:
+    """聊天和嵌入两个接口的替身，stats 记录各接口的请求数"""
+    def __init__(self, ttft: float = 0.0, token_delay: float = 0.0, tokens: int = 32,
+                 tool_rounds: int = 1, tool_name: Optional[str] = None, tool_arguments: str = '{}',
+                 embedding_dim: int = 1024, embedding_latency: float = 0.0, embedding_latency_per_text: float = 0.0):
+        self.ttft = ttft
+        self.token_delay = token_delay
+        self.tokens = tokens
+        self.tool_rounds = tool_rounds
+        self.tool_name = tool_name
+        self.tool_arguments = tool_arguments
+        self.embedding_dim = embedding_dim
+        self.embedding_latency = embedding_latency
+        self.embedding_latency_per_text = embedding_latency_per_text
+        self.stats = {'chat_requests': 0, 'tool_calls': 0, 'embedding_requests': 0, 'embedded_texts': 0}
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_post('/v1/chat/completions', self.chat)
+        app.router.add_post('/v1/embeddings', self.embeddings)
+        app.router.add_get('/stats', self.get_stats)
+        return app
+
+    async def chat(self, request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        self.stats['chat_requests'] += 1
+        response = web.StreamResponse(headers={'Content-Type': 'text/event-stream'})
+        await response.prepare(request)
+
+        async def send(payload: Dict[str, Any]):
+            await response.write(f'data: {json.dumps(payload, ensure_ascii=False)}\n\n'.encode('utf-8'))
+
+        def chunk(delta: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+            choices = [{'index': 0, 'delta': delta, 'finish_reason': None}] if delta is not None else []
+            return {'id': 'fake', 'object': 'chat.completion.chunk', 'created': 0, 'model': body['model'],
+                    'choices': choices}
+
+        await asyncio.sleep(self.ttft)
+        tool = self._pick_tool(body)
+        if tool is not None:
+            self.stats['tool_calls'] += 1
+            arguments = self.tool_arguments if tool == self.tool_name else '{}'
+            call_id = f"call_{self.stats['tool_calls']}"
+            await send(chunk({'tool_calls': [{'index': 0, 'id': call_id, 'type': 'function',
+                                              'function': {'name': tool, 'arguments': ''}}]}))
+            await send(chunk({'tool_calls': [{'index': 0, 'function': {'arguments': arguments}}]}))
+            completion_tokens = 1 + len(arguments) // 4
+        else:
+            for i in range(self.tokens):
+                if i:
+                    await asyncio.sleep(self.token_delay)
+                await send(chunk({'content': f'token{i} '}))
+            completion_tokens = self.tokens
+        prompt_tokens = sum(len(str(message.get('content') or '')) for message in body['messages']) // 4
+        usage = chunk(None)
+        usage['usage'] = {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                          'total_tokens': prompt_tokens + completion_tokens}
+        await send(usage)
+        await response.write(b'data: [DONE]\n\n')
+        return response
+
+    def _pick_tool(self, body: Dict[str, Any]) -> Optional[str]:
+        """还需要调用工具时返回工具名，否则返回 None"""
+        tools = [tool['function']['name'] for tool in body.get('tools') or []]
+        if not tools:
+            return None
+        rounds = 0
+        for message in reversed(body['messages']):
+            if message['role'] == 'user':
+                break
+            if message['role'] == 'assistant' and message.get('tool_calls'):
+                rounds += 1
+        if rounds >= self.tool_rounds:
+            return None
+        return self.tool_name if self.tool_name in tools else tools[0]
+
+    async def embeddings(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        texts = body['input'] if isinstance(body['input'], list) else [body['input']]
+        self.stats['embedding_requests'] += 1
+        self.stats['embedded_texts'] += len(texts)
+        await asyncio.sleep(self.embedding_latency + self.embedding_latency_per_text * len(texts))
+        return web.json_response({
+            'object': 'list',
+            'model': body.get('model', ''),
+            'data': [{'object': 'embedding', 'index': i, 'embedding': embed(text, self.embedding_dim)}
+                     for i, text in enumerate(texts)],
+        })
+
+    async def get_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats)
+
+
+class FakeServerProcess:
+    """
+    在独立进程中运行 FakeServer，避免替身服务与被测代码争用同一个事件循环：
+        async with FakeServerProcess(ttft=0.1) as server:
+            server.url  # http://127.0.0.1:端口
+    """
+    def __init__(self, **options):
+        self.options = options
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.url = ''
+
+    async def __aenter__(self) -> 'FakeServerProcess':
+        args = []
+        for key, value in self.options.items():
+            if value is not None:
+                args += ['--' + key.replace('_', '-'), str(value)]
+        self.process = await asyncio.create_subprocess_exec(
+            sys.executable, __file__, '--port', '0', *args, stdout=asyncio.subprocess.PIPE)
+        # 子进程监听成功后输出 "READY 端口"
+        line = (await self.process.stdout.readline()).decode().split()
+        if not line or line[0] != 'READY':
+            await self.__aexit__(None, None, None)
+            raise RuntimeError('Fake server failed to start')
+        self.url = f'http://127.0.0.1:{line[1]}'
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self.process is not None and self.process.returncode is None:
+            self.process.terminate()
+            await self.process.wait()
+
+    async def stats(self) -> Dict[str, int]:
+        """读取替身服务的请求计数"""
+        async with aiohttp.ClientSession() as session:
+            async with session.get(self.url + '/stats') as response:
+                return await response.json()
+
+
+async def serve(server: FakeServer, host: str, port: int):
+    runner = web.AppRunner(server.app(), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    print(f'READY {runner.addresses[0][1]}', flush=True)
+    await asyncio.Event().wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--ttft', type=float, default=0.0, help='首个 token 之前的延迟秒数')
+    parser.add_argument('--token-delay', type=float, default=0.0, help='相邻 token 之间的延迟秒数')
+    parser.add_argument('--tokens', type=int, default=32, help='每个回答的 token 数')
+    parser.add_argument('--tool-rounds', type=int, default=1, help='每个用户提示先进行的工具调用轮数')
+    parser.add_argument('--tool-name', default=None)
+    parser.add_argument('--tool-arguments', default='{}')
+    parser.add_argument('--embedding-dim', type=int, default=1024)
+    parser.add_argument('--embedding-latency', type=float, default=0.0, help='每个嵌入请求的固定延迟秒数')
+    parser.add_argument('--embedding-latency-per-text', type=float, default=0.0, help='每条文本增加的延迟秒数')
+    args = parser.parse_args()
+    server = FakeServer(
+        ttft=args.ttft, token_delay=args.token_delay, tokens=args.tokens, tool_rounds=args.tool_rounds,
+        tool_name=args.tool_name, tool_arguments=args.tool_arguments, embedding_dim=args.embedding_dim,
+        embedding_latency=args.embedding_latency, embedding_latency_per_text=args.embedding_latency_per_text,
+    )
+    try:
+        asyncio.run(serve(server, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
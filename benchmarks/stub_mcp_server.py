@@ -0,0 +1,45 @@
+"""
+stdio MCP 替身服务器，供基准测试替代 npx 启动的真实 MCP 服务器
+工具执行时间可配置，结果确定
+
+用法（通常由 MCPClient 启动）:
+    python benchmarks/stub_mcp_server.py --latency 0.01
+"""
+import time
+import asyncio
+import argparse
+
+from mcp.server.fastmcp import FastMCP
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument('--latency', type=float, default=0.0, help='每次工具调用的延迟秒数')
+args = parser.parse_args()
+
+mcp = FastMCP('stub', log_level='WARNING')
+
+
+@mcp.tool()
+async def echo(text: str = '') -> str:
+    """原样返回输入文本"""
+    await asyncio.sleep(args.latency)
+    return text
+
+
+@mcp.tool()
+async def write_file(path: str = '', content: str = '') -> str:
+    """模拟写文件：不落盘，只返回写入的字节数"""
+    await asyncio.sleep(args.latency)
+    return f'Wrote {len(content.encode("utf-8"))} bytes to {path}'
+
+
+@mcp.tool()
+def busy(milliseconds: int = 10) -> str:
+    """占用 CPU 指定的毫秒数，模拟计算型工具"""
+    deadline = time.perf_counter() + milliseconds / 1000
+    while time.perf_counter() < deadline:
+        pass
+    return 'done'
+
+
+if __name__ == '__main__':
+    mcp.run()
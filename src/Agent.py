@@ -1,12 +1,21 @@
 import json
-from typing import List, Optional
-from MCPClient import MCPClient
-from ChatOpenAI import ChatOpenAI
+import time
+import asyncio
+import weakref
+from typing import Dict, List, Optional
+from MCPClient import MCPClient, Tool
+from ChatOpenAI import ChatOpenAI, LLM_BASE_URL
+from TokenBudget import TokenBudget
+from Tracer import trace
+from EventSink import EventSink, ConsoleSink
 from utils import log_title
 
 class Agent:
     """MCP代理类，用于管理多个MCP客户端和LLM交互"""
-    def __init__(self, model: str, mcp_clients: List[MCPClient], system_prompt: str='', context: str=''):
+    def __init__(self, model: str, mcp_clients: List[MCPClient], system_prompt: str='', context: str='',
+                 tool_timeout: float = 60.0, max_concurrent_tool_calls: int = 4, startup_timeout: float = 60.0,
+                 token_budget: Optional[TokenBudget] = None, base_url: str = LLM_BASE_URL,
+                 api_key: Optional[str] = None, sink: Optional[EventSink] = None):
         """
         初始化Agent
         Args:
@@ -14,39 +23,165 @@ class Agent:
             mcp_clients: MCP客户端列表
             system_prompt: 系统提示词
             context: 上下文信息
+            tool_timeout: 单次工具调用的超时秒数
+            max_concurrent_tool_calls: 每个MCP客户端同时执行的工具调用数上限
+            startup_timeout: 单个MCP服务器启动（连接并获取工具列表）的超时秒数
+            token_budget: 对话历史的 token 预算，为 None 时不压缩历史
+            base_url: 兼容 OpenAI 的接口地址
+            api_key: API Key，默认读取环境变量 ALIYUN_API_KEY
+            sink: 对话和工具调用的输出事件接收器，默认以 ConsoleSink 打印到终端
         """
         self.model = model
         self.mcp_clients = mcp_clients
         self.system_prompt = system_prompt
         self.context = context
         self.llm: Optional[ChatOpenAI] = None
+        self.tool_timeout = tool_timeout
+        self.max_concurrent_tool_calls = max_concurrent_tool_calls
+        self.startup_timeout = startup_timeout
+        self.token_budget = token_budget
+        self.base_url = base_url
+        self.api_key = api_key
+        self.sink = sink if sink is not None else ConsoleSink()
+        # 每个MCP服务器的启动耗时（秒）
+        self.startup_times: Dict[str, float] = {}
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        # 工具名到 MCP 客户端的路由表
+        self._tool_routes: Dict[str, MCPClient] = {}
+        # 最近一次 invoke() 的追踪 id，未启用追踪时为 None
+        self.last_trace_id: Optional[str] = None
+        # 由 session() 创建的会话；会话的 _parent 指向创建它的代理
+        self._sessions = weakref.WeakSet()
+        self._parent: Optional['Agent'] = None
 
     async def init(self):
         """初始化代理，连接所有MCP客户端并创建LLM实例"""
         log_title("TOOLS")
 
-        # 初始化所有MCP客户端
-        for client in self.mcp_clients:
-            await client.init()
+        # 并发初始化所有MCP客户端，单个服务器启动失败不影响其他服务器
+        results = await asyncio.gather(*(self._init_client(client) for client in self.mcp_clients))
+
+        log_title("STARTUP")
+        for client, (elapsed, error) in zip(self.mcp_clients, results):
+            self.startup_times[client.name] = elapsed
+            status = f"❌ {error}" if error else "✅"
+            print(f"  {client.name}: {elapsed:.2f}s {status}")
         
-        # 获取所有工具
-        tools = []
+        # 建立工具路由表，并在任一客户端工具列表变化时重建；
+        # 监听者是绑定方法，重复 init() 不会重复注册，close() 时移除
+        tools = self._rebuild_tool_routes()
         for client in self.mcp_clients:
-            tools.extend(client.get_tools())
+            client.add_tools_listener(self._on_tools_changed)
         
         # 创建LLM实例
         self.llm = ChatOpenAI(
             model=self.model,
             system_prompt=self.system_prompt,
             tools=tools,
-            context=self.context
+            context=self.context,
+            base_url=self.base_url,
+            api_key=self.api_key,
+            token_budget=self.token_budget,
+            sink=self.sink
+        )
+
+    async def _init_client(self, client: MCPClient):
+        """
+        在超时限制内初始化单个MCP客户端
+        Returns:
+            (耗时秒数, 错误信息)，成功时错误信息为空字符串
+        """
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(client.init(), timeout=self.startup_timeout)
+            error = ''
+        except asyncio.TimeoutError:
+            error = f"startup timed out after {self.startup_timeout}s"
+            print(f"❌ {client.name} {error}")
+        except Exception as e:
+            error = str(e) or type(e).__name__
+        return time.perf_counter() - start, error
+
+    def _on_tools_changed(self, client: MCPClient):
+        """客户端工具列表变化的回调"""
+        self._rebuild_tool_routes()
+
+    def _rebuild_tool_routes(self) -> List[Tool]:
+        """
+        重建工具名到 MCP 客户端的路由表
+        工具名冲突时保留排在前面的客户端并给出警告
+        Returns:
+            去重后的工具列表
+        """
+        routes: Dict[str, MCPClient] = {}
+        tools = []
+        for client in self.mcp_clients:
+            for tool in client.get_tools():
+                if tool.name in routes:
+                    print(f"⚠️ Tool name collision: '{tool.name}' from {client.name} is shadowed by {routes[tool.name].name}")
+                    continue
+                routes[tool.name] = client
+                tools.append(tool)
+        # 原地更新，会话与父代理共用同一个路由表
+        self._tool_routes.clear()
+        self._tool_routes.update(routes)
+        if self.llm is not None:
+            self.llm.tools = tools
+        for session in self._sessions:
+            session.llm.tools = tools
+        return tools
+
+    def session(self, context: Optional[str] = None, sink: Optional[EventSink] = None) -> 'Agent':
+        """
+        创建一个新会话：与本代理共用已连接的MCP客户端、工具路由表、工具并发限制和 LLM 连接池，
+        但拥有独立的 ChatOpenAI 对话历史。适用于在一个进程中并发服务多个用户，
+        会话不需要 init()，调用会话的 close() 也不会关闭共享的MCP客户端
+        Args:
+            context: 会话的上下文信息，默认沿用本代理的上下文
+            sink: 会话的输出事件接收器，默认沿用本代理的 sink
+        Returns:
+            新的 Agent 会话
+        """
+        if self.llm is None:
+            raise RuntimeError("Agent not initialized. Call init() first.")
+        session = Agent(
+            self.model, self.mcp_clients, self.system_prompt, self.context if context is None else context,
+            tool_timeout=self.tool_timeout, max_concurrent_tool_calls=self.max_concurrent_tool_calls,
+            startup_timeout=self.startup_timeout, token_budget=self.token_budget,
+            base_url=self.base_url, api_key=self.api_key, sink=sink if sink is not None else self.sink,
+        )
+        session.startup_times = self.startup_times
+        session._semaphores = self._semaphores
+        session._tool_routes = self._tool_routes
+        session._parent = self
+        session.llm = ChatOpenAI(
+            model=self.model,
+            system_prompt=self.system_prompt,
+            tools=self.llm.tools,
+            context=session.context,
+            token_budget=self.token_budget,
+            sink=session.sink,
+            client=self.llm.llm
         )
+        self._sessions.add(session)
+        return session
+
+    def set_sink(self, sink: EventSink):
+        """更换代理及其 LLM 的输出事件接收器，例如在会话的两次 invoke() 之间"""
+        self.sink = sink
+        if self.llm is not None:
+            self.llm.sink = sink
     async def close(self):
-        """关闭代理，断开所有MCP客户端连接"""
+        """关闭代理，断开所有MCP客户端连接；会话只从父代理注销"""
+        if self._parent is not None:
+            self._parent._sessions.discard(self)
+            return
         print("Closing Agent...")
+        for client in self.mcp_clients:
+            client.remove_tools_listener(self._on_tools_changed)
 
-        # 关闭每个 MCP 客户端
-        for i, client in enumerate(self.mcp_clients):
+        # 并发关闭所有 MCP 客户端
+        async def close_client(i: int, client: MCPClient):
             print(f"  Closing MCP Client {i+1}/{len(self.mcp_clients)}: {client.name}")
             try:
                 await client.close()
@@ -54,6 +189,8 @@ class Agent:
             except Exception as e:
                 print(f" ❌ Error closing {client.name}: {e}")
 
+        await asyncio.gather(*(close_client(i, client) for i, client in enumerate(self.mcp_clients)))
+
         print("Agent closed")
 
     async def invoke(self, prompt: str):
@@ -69,69 +206,93 @@ class Agent:
         # 添加初始化检查
         if self.llm is None:
             raise RuntimeError("Agent not initialized. Call init() first.")
-            
-        # 获取初始响应
-        response = await self.llm.chat(prompt)
-
-        while True:
-            #检查是否有工具调用
-            if len(response.get('toolCalls', [])) > 0:  # 添加默认值防止KeyError
-                #处理每一个工具调用
-                for tool_call in response['toolCalls']:
-                    # 找到第一个支持 tool_call 中指定函数的 MCP 客户端，将其赋值给 mcp，并停止进一步的循环以提高效率。
-                    #查找对应MCP客户端
-                    mcp = None
-                    for client in self.mcp_clients:
-                        client_tools = client.get_tools()
-                        if any(tool.name == tool_call['function']['name'] for tool in client_tools):
-                            mcp = client
-                            break
-                    
-                    if mcp:
-                        log_title('TOOL USE')
-                        print(f"Calling tool: {tool_call['function']['name']}")
-                        print(f"Arguments: {tool_call['function']['arguments']}")
-
-                        try:
-                            # 调用工具
-                            result = await mcp.call_tool(
-                                tool_call['function']['name'],
-                                json.loads(tool_call['function']['arguments'])
-                            )
-
-                            # 处理 CallToolResult 对象
-                            result_str = self._format_tool_result(result)
-                            
-                            print(f"Result: {result_str[:500]}...")
-
-                            # 将工具结果添加到对话历史
-                            self.llm.append_tool_result(
-                                tool_call['id'], 
-                                result_str
-                            )
-
-                        except Exception as e:
-                            # 工具调用失败时的错误处理
-                            error_msg = f"Tool execution failed: {str(e)}"
-                            print(f"Error: {error_msg}")
-                            self.llm.append_tool_result(
-                                tool_call['id'],
-                                error_msg
-                            )
 
-                    else:
-                        # 工具未找到
-                        self.llm.append_tool_result(
-                            tool_call['id'],
-                            'Tool not found'
-                        )
-                # 工具调用后，继续对话
-                response = await self.llm.chat()
-                continue
-
-            # 如果没有工具调用，结束对话
-            return response['content']
-        
+        # 整个任务作为一次追踪的根 span，LLM 请求和工具调用都是它的子节点
+        with trace('agent.invoke', model=self.model) as span:
+            self.last_trace_id = span.trace_id
+            # 获取初始响应
+            response = await self.llm.chat(prompt)
+            steps = 1
+
+            while True:
+                #检查是否有工具调用
+                if len(response.get('toolCalls', [])) > 0:  # 添加默认值防止KeyError
+                    span.add('tool_calls', len(response['toolCalls']))
+                    # 同一轮中的工具调用相互独立，并发执行
+                    results = await asyncio.gather(
+                        *(self._run_tool_call(tool_call) for tool_call in response['toolCalls'])
+                    )
+                    # 按原始 tool_call 顺序将结果添加到对话历史
+                    for tool_call, result_str in zip(response['toolCalls'], results):
+                        self.llm.append_tool_result(tool_call['id'], result_str)
+
+                    # 工具调用后，继续对话
+                    response = await self.llm.chat()
+                    steps += 1
+                    continue
+
+                # 如果没有工具调用，结束对话
+                span.set(steps=steps)
+                return response['content']
+
+    async def _run_tool_call(self, tool_call) -> str:
+        """
+        执行单个工具调用，受所属客户端的并发上限和单次调用超时约束
+        Args:
+            tool_call: LLM 返回的工具调用
+        Returns:
+            工具结果文本；失败时返回错误信息，不抛出异常
+        """
+        # 通过路由表查找提供该工具的 MCP 客户端
+        name = tool_call['function']['name']
+        mcp = self._tool_routes.get(name)
+
+        if not mcp:
+            # 工具未找到
+            return 'Tool not found'
+
+        self.sink.emit({'type': 'tool_call', 'name': name, 'arguments': tool_call['function']['arguments']})
+
+        with trace('agent.tool', tool=name, client=mcp.name,
+                   request_bytes=len(tool_call['function']['arguments'].encode('utf-8'))) as span:
+            try:
+                # 调用工具；等待并发名额的时间单独记录
+                queued = time.perf_counter()
+                async with self._client_semaphore(mcp):
+                    span.set(queue_s=time.perf_counter() - queued)
+                    result = await asyncio.wait_for(
+                        mcp.call_tool(
+                            name,
+                            json.loads(tool_call['function']['arguments'])
+                        ),
+                        timeout=self.tool_timeout
+                    )
+
+                # 处理 CallToolResult 对象
+                result_str = self._format_tool_result(result)
+                span.set(response_bytes=len(result_str.encode('utf-8')))
+
+                self.sink.emit({'type': 'tool_result', 'name': name, 'content': result_str})
+                return result_str
+
+            except asyncio.TimeoutError:
+                error_msg = f"Tool execution timed out after {self.tool_timeout}s"
+                self.sink.emit({'type': 'tool_error', 'name': name, 'message': error_msg})
+                span.set(error='timeout', errors=1)
+                return error_msg
+            except Exception as e:
+                # 工具调用失败时的错误处理
+                error_msg = f"Tool execution failed: {str(e)}"
+                self.sink.emit({'type': 'tool_error', 'name': name, 'message': error_msg})
+                span.set(error=type(e).__name__, errors=1)
+                return error_msg
+
+    def _client_semaphore(self, client: MCPClient) -> asyncio.Semaphore:
+        """获取（必要时创建）限制单个 MCP 客户端并发调用数的信号量"""
+        if client.name not in self._semaphores:
+            self._semaphores[client.name] = asyncio.Semaphore(self.max_concurrent_tool_calls)
+        return self._semaphores[client.name]
+
     def _format_tool_result(self, result):
         """格式化工具调用结果"""
         if hasattr(result, 'content'):
@@ -0,0 +1,406 @@
+import sys
+import json
+import time
+import uuid
+import asyncio
+import argparse
+import contextlib
+from collections import deque
+from typing import Any, Dict, Optional
+from aiohttp import web
+from Agent import Agent
+from EmbeddingRetriever import EmbeddingRetriever
+from EventSink import EventSink, NullSink, QueueSink
+from Tracer import trace
+from utils import log_title
+
+
+class ServerBusy(Exception):
+    """等待队列已满，任务被拒绝（HTTP 接口返回 429）"""
+
+
+class _Job:
+    """一个排队中的任务"""
+    def __init__(self, prompt: str, session: '_Session', sink: EventSink):
+        self.id = uuid.uuid4().hex
+        self.prompt = prompt
+        self.session = session
+        self.session_id = session.id
+        self.sink = sink
+        self.submitted = time.perf_counter()
+        # 任务结束时设为结果字典
+        self.done: asyncio.Future = asyncio.get_running_loop().create_future()
+
+
+class _Session:
+    """一个会话：独立的对话历史，同一会话的任务依次执行"""
+    def __init__(self, session_id: str):
+        self.id = session_id
+        self.agent: Optional[Agent] = None
+        # busy 为 True 时会话已有任务在执行队列中或正在执行，后续任务暂存在 pending 里
+        self.busy = False
+        self.pending: deque = deque()
+        self.last_used = time.monotonic()
+
+
+class AgentServer:
+    """
+    多租户 Agent 服务
+    一个进程内并发运行多个 Agent.invoke() 循环：所有会话共用一个已初始化的 Agent 的MCP客户端、
+    工具并发限制和 LLM 连接池（见 Agent.session()），以及同一个 EmbeddingRetriever / VectorStore；
+    每个会话有独立的 ChatOpenAI 对话历史，会话的第一个任务会检索知识库作为该会话的上下文。
+
+    准入控制：最多 max_concurrent 个任务同时执行，其余最多 max_queue 个任务等待，
+    已满时 submit() 抛出 ServerBusy，而不是无限堆积请求。metrics() 返回队列深度、
+    执行中的任务数、排队和执行耗时等指标。
+
+    同一会话的任务依次执行，并在进入执行队列之前就按会话排队：执行队列中每个会话
+    最多只有一个任务，工作协程取到的任务都能立即执行，不会为等待同会话的前一个任务
+    而占用并发名额。
+
+    通过 serve_http()（本地 HTTP）或 serve_stdin()（stdin/stdout JSON 行）对外提供服务
+    """
+    def __init__(self, agent: Agent, retriever: Optional[EmbeddingRetriever] = None, top_k: int = 5,
+                 max_concurrent: int = 8, max_queue: int = 64, session_ttl: Optional[float] = 1800.0):
+        """
+        Args:
+            agent: 已调用过 init() 的代理，各会话由它创建
+            retriever: 共享的检索器，为 None 时会话沿用 agent 的上下文
+            top_k: 每个会话检索的文档数
+            max_concurrent: 同时执行的任务数上限
+            max_queue: 等待队列的长度上限
+            session_ttl: 会话空闲超过该秒数后被清除，为 None 时一直保留
+        """
+        self.agent = agent
+        self.retriever = retriever
+        self.top_k = top_k
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.session_ttl = session_ttl
+        self.sessions: Dict[str, _Session] = {}
+        # 可立即执行的任务（每个会话最多一个）；其余同会话任务在 _Session.pending 中
+        self._queue: asyncio.Queue = asyncio.Queue()
+        # 等待中的任务数（执行队列 + 各会话的 pending）受 max_queue 限制
+        self._waiting = 0
+        self._slots = asyncio.Semaphore(max_queue)
+        self._workers: list = []
+        self._running = 0
+        # 过期会话的关闭任务，保留引用直到完成，close() 时等待剩余的
+        self._closing: set = set()
+        self.stats = {
+            'submitted': 0, 'rejected': 0, 'completed': 0, 'failed': 0,
+            'max_queue_depth': 0, 'queue_s': 0.0, 'max_queue_s': 0.0, 'run_s': 0.0, 'max_run_s': 0.0,
+        }
+
+    async def start(self):
+        """启动执行任务的工作协程"""
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._worker()) for _ in range(self.max_concurrent)]
+
+    async def close(self, drain: bool = True):
+        """
+        停止服务
+        Args:
+            drain: 是否先等待已排队的任务执行完
+        """
+        if drain:
+            await self._queue.join()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        for session in self.sessions.values():
+            if session.agent is not None:
+                await session.agent.close()
+        self.sessions.clear()
+        await asyncio.gather(*self._closing, return_exceptions=True)
+
+    async def submit(self, prompt: str, session_id: Optional[str] = None, sink: Optional[EventSink] = None,
+                     wait: bool = False) -> _Job:
+        """
+        提交任务
+        Args:
+            prompt: 用户输入的提示词
+            session_id: 会话 id，为 None 时新建会话；同一会话的任务共享对话历史并依次执行
+            sink: 本任务的输出事件接收器，任务结束时收到 result 事件并被关闭
+            wait: 队列已满时是否等待空位，为 False 时立即拒绝
+        Returns:
+            任务，await job.done 得到结果字典
+        Raises:
+            ServerBusy: 队列已满且 wait 为 False
+        """
+        self._expire_sessions()
+        if not wait and self._slots.locked():
+            self.stats['rejected'] += 1
+            raise ServerBusy(f'Queue is full ({self.max_queue} tasks waiting)')
+        await self._slots.acquire()
+        session_id = session_id or uuid.uuid4().hex
+        session = self.sessions.get(session_id)
+        if session is None:
+            session = self.sessions[session_id] = _Session(session_id)
+        job = _Job(prompt, session, sink if sink is not None else NullSink())
+        self._waiting += 1
+        # 会话空闲时直接进入执行队列，否则等同会话的前一个任务结束后由 _worker 放入
+        if session.busy:
+            session.pending.append(job)
+        else:
+            session.busy = True
+            self._queue.put_nowait(job)
+        self.stats['submitted'] += 1
+        self.stats['max_queue_depth'] = max(self.stats['max_queue_depth'], self._waiting)
+        return job
+
+    async def run(self, prompt: str, session_id: Optional[str] = None, sink: Optional[EventSink] = None,
+                  wait: bool = False) -> Dict[str, Any]:
+        """提交任务并等待结果，见 submit()"""
+        job = await self.submit(prompt, session_id, sink, wait)
+        return await job.done
+
+    def metrics(self) -> Dict[str, Any]:
+        """队列深度、执行中任务数、会话数、累计计数，以及平均/最大排队和执行耗时（秒）"""
+        stats = self.stats
+        finished = stats['completed'] + stats['failed']
+        return {
+            'queue_depth': self._waiting,
+            'running': self._running,
+            'sessions': len(self.sessions),
+            'max_concurrent': self.max_concurrent,
+            'max_queue': self.max_queue,
+            'submitted': stats['submitted'],
+            'rejected': stats['rejected'],
+            'completed': stats['completed'],
+            'failed': stats['failed'],
+            'max_queue_depth': stats['max_queue_depth'],
+            'avg_queue_s': stats['queue_s'] / finished if finished else 0.0,
+            'max_queue_s': stats['max_queue_s'],
+            'avg_run_s': stats['run_s'] / finished if finished else 0.0,
+            'max_run_s': stats['max_run_s'],
+        }
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            self._waiting -= 1
+            self._slots.release()
+            session = job.session
+            try:
+                await self._execute(job)
+            finally:
+                # 先放入同会话的下一个任务再 task_done，drain 时 join() 不会提前返回
+                if session.pending:
+                    self._queue.put_nowait(session.pending.popleft())
+                else:
+                    session.busy = False
+                self._queue.task_done()
+
+    async def _execute(self, job: _Job):
+        """在会话中执行任务；任何错误都记录在结果中，不会终止工作协程"""
+        session = job.session
+        result: Dict[str, Any] = {'task_id': job.id, 'session_id': job.session_id}
+        queue_s = time.perf_counter() - job.submitted
+        self._running += 1
+        started = time.perf_counter()
+        try:
+            with trace('server.task', session=job.session_id, queue_s=queue_s):
+                if session.agent is None:
+                    session.agent = self.agent.session(context=await self._retrieve(job.prompt))
+                session.agent.set_sink(job.sink)
+                result['content'] = await session.agent.invoke(job.prompt)
+            self.stats['completed'] += 1
+        except Exception as e:
+            result['error'] = str(e) or type(e).__name__
+            self.stats['failed'] += 1
+        finally:
+            self._running -= 1
+            run_s = time.perf_counter() - started
+            session.last_used = time.monotonic()
+        self.stats['queue_s'] += queue_s
+        self.stats['max_queue_s'] = max(self.stats['max_queue_s'], queue_s)
+        self.stats['run_s'] += run_s
+        self.stats['max_run_s'] = max(self.stats['max_run_s'], run_s)
+        result.update(queue_s=queue_s, run_s=run_s)
+        job.sink.emit({'type': 'result', **result})
+        job.sink.close()
+        # 等待者可能已被取消（如 HTTP 客户端断开）
+        if not job.done.done():
+            job.done.set_result(result)
+
+    async def _retrieve(self, prompt: str) -> Optional[str]:
+        """检索会话的上下文；没有检索器时返回 None（沿用 agent 的上下文）"""
+        if self.retriever is None:
+            return None
+        return '\n'.join(await self.retriever.retrieve(prompt, top_k=self.top_k))
+
+    def _expire_sessions(self):
+        """清除空闲过久且没有任务在排队或执行的会话"""
+        if self.session_ttl is None:
+            return
+        now = time.monotonic()
+        for session_id, session in list(self.sessions.items()):
+            if not session.busy and now - session.last_used > self.session_ttl:
+                del self.sessions[session_id]
+                if session.agent is not None:
+                    task = asyncio.create_task(session.agent.close())
+                    self._closing.add(task)
+                    task.add_done_callback(self._closing.discard)
+
+    def app(self) -> web.Application:
+        """
+        HTTP 接口：
+            POST   /tasks           {"prompt": ..., "session_id": 可选, "stream": 可选}
+                                    返回结果 JSON；stream 为 true 时以 NDJSON 逐行返回事件，最后一行为 result 事件；
+                                    队列已满时返回 429
+            GET    /metrics         metrics() 的 JSON
+            DELETE /sessions/{id}   删除会话及其对话历史
+        """
+        app = web.Application()
+        app.router.add_post('/tasks', self._handle_task)
+        app.router.add_get('/metrics', self._handle_metrics)
+        app.router.add_delete('/sessions/{session_id}', self._handle_delete_session)
+        return app
+
+    async def serve_http(self, host: str = '127.0.0.1', port: int = 8080):
+        """在本地 HTTP 端口上提供服务，直到被取消"""
+        await self.start()
+        runner = web.AppRunner(self.app(), access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, host, port)
+        await site.start()
+        print(f"✅ Agent server listening on http://{host}:{runner.addresses[0][1]}")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await runner.cleanup()
+            await self.close(drain=False)
+
+    async def serve_stdin(self):
+        """
+        从 stdin 逐行读取 JSON 任务 {"id": 可选, "prompt": ..., "session_id": 可选}，
+        每个任务完成时向 stdout 写一行结果 JSON（带回 id，按完成顺序）。
+        队列已满时暂停读取 stdin 形成背压，而不是拒绝任务；stdin 结束后等待全部任务完成再返回
+        """
+        await self.start()
+        stdout = sys.stdout
+        pending = set()
+
+        async def reply(request_id, job: _Job):
+            result = await job.done
+            stdout.write(json.dumps({'id': request_id, **result}, ensure_ascii=False) + '\n')
+            stdout.flush()
+
+        # stdout 只输出结果，其余日志改写到 stderr
+        with contextlib.redirect_stdout(sys.stderr):
+            while True:
+                line = await asyncio.to_thread(sys.stdin.readline)
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                try:
+                    request = json.loads(line)
+                    job = await self.submit(request['prompt'], request.get('session_id'), wait=True)
+                except (ValueError, KeyError, TypeError) as e:
+                    stdout.write(json.dumps({'error': f'Invalid request: {e}'}, ensure_ascii=False) + '\n')
+                    stdout.flush()
+                    continue
+                task = asyncio.create_task(reply(request.get('id'), job))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+            await asyncio.gather(*pending)
+            await self.close()
+
+    async def _handle_task(self, request: web.Request) -> web.StreamResponse:
+        try:
+            body = await request.json()
+            prompt = body['prompt']
+        except (ValueError, KeyError, TypeError) as e:
+            return web.json_response({'error': f'Invalid request: {e}'}, status=400)
+        stream = bool(body.get('stream'))
+        sink = QueueSink() if stream else None
+        try:
+            job = await self.submit(prompt, body.get('session_id'), sink)
+        except ServerBusy as e:
+            return web.json_response({'error': str(e), **self.metrics()}, status=429)
+        if not stream:
+            return web.json_response(await job.done)
+
+        response = web.StreamResponse(headers={'Content-Type': 'application/x-ndjson'})
+        await response.prepare(request)
+        async for event in sink:
+            await response.write((json.dumps(event, ensure_ascii=False) + '\n').encode('utf-8'))
+        await response.write_eof()
+        return response
+
+    async def _handle_metrics(self, request: web.Request) -> web.Response:
+        return web.json_response(self.metrics())
+
+    async def _handle_delete_session(self, request: web.Request) -> web.Response:
+        session = self.sessions.get(request.match_info['session_id'])
+        if session is None:
+            return web.json_response({'error': 'Session not found'}, status=404)
+        if session.busy:
+            return web.json_response({'error': 'Session is busy'}, status=409)
+        del self.sessions[session.id]
+        if session.agent is not None:
+            await session.agent.close()
+        return web.json_response({'deleted': session.id})
+
+
+async def main():
+    """使用与 MainTask 相同的知识库、索引和MCP服务器启动 Agent 服务"""
+    # 导入 MainTask 只为复用其配置（路径常量和MCP客户端），不会运行任务
+    from MainTask import file_mcp, INDEX_PATH, KNOWLEDGE_PATH, CACHE_PATH
+    from TokenBudget import TokenBudget
+    from VectorStore import VectorStore
+    from BM25Index import BM25Index
+    from EmbeddingCache import EmbeddingCache
+    from KnowledgeIngestor import KnowledgeIngestor
+
+    parser = argparse.ArgumentParser(description='多租户 Agent 服务')
+    parser.add_argument('--stdin', action='store_true', help='从 stdin 读取 JSON 行任务，而不是监听 HTTP')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--model', default='qwen3-235b-a22b')
+    parser.add_argument('--max-concurrent', type=int, default=8, help='同时执行的任务数上限')
+    parser.add_argument('--max-queue', type=int, default=64, help='等待队列的长度上限')
+    parser.add_argument('--max-tool-calls', type=int, default=8, help='所有会话对单个MCP服务器的并发调用数上限')
+    parser.add_argument('--top-k', type=int, default=5)
+    args = parser.parse_args()
+
+    # stdin 模式下 stdout 只用于输出结果
+    log = contextlib.redirect_stdout(sys.stderr) if args.stdin else contextlib.nullcontext()
+    with log:
+        lexical_index = BM25Index()
+        if VectorStore.exists(INDEX_PATH):
+            vector_store = VectorStore.load(INDEX_PATH, lexical_index=lexical_index)
+        else:
+            vector_store = VectorStore(lexical_index=lexical_index)
+        embedding_cache = EmbeddingCache(CACHE_PATH)
+    async with EmbeddingRetriever("BAAI/bge-m3", vector_store=vector_store, cache=embedding_cache,
+                                  retrieval_mode='hybrid') as retriever:
+        with log:
+            stats = await KnowledgeIngestor(retriever, INDEX_PATH).sync(KNOWLEDGE_PATH)
+            log_title(f'Index synced: {len(retriever.vector_store)} documents')
+            print(f'Ingestion: {stats}')
+            agent = Agent(args.model, [file_mcp], token_budget=TokenBudget(max_tokens=32000),
+                          max_concurrent_tool_calls=args.max_tool_calls, sink=NullSink())
+            await agent.init()
+        server = AgentServer(agent, retriever, top_k=args.top_k, max_concurrent=args.max_concurrent,
+                             max_queue=args.max_queue)
+        try:
+            if args.stdin:
+                await server.serve_stdin()
+            else:
+                await server.serve_http(args.host, args.port)
+        finally:
+            with log:
+                print(f'Server metrics: {server.metrics()}')
+                await agent.close()
+    embedding_cache.close()
+
+
+if __name__ == '__main__':
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
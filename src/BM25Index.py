@@ -0,0 +1,134 @@
+import re
+import math
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+
+# 需要按字切分的 CJK 文字（汉字、假名、谚文），不含全角标点
+CJK_WORD_PATTERN = '[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af]'
+# 一段连续的 CJK 文字，或一个英文单词/数字
+LEXICAL_TOKEN_RE = re.compile(f'({CJK_WORD_PATTERN}+)|[0-9a-z]+')
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    词法检索用的分词：连续的 CJK 文字切成重叠的二元组（单字成段时保留单字），
+    其余文本按小写的字母数字单词切分，标点和空白被忽略
+    例如 "郭靖和黄蓉" -> ["郭靖", "靖和", "和黄", "黄蓉"]
+    """
+    tokens = []
+    for match in LEXICAL_TOKEN_RE.finditer(text.lower()):
+        run = match.group(1)
+        if run is None:
+            tokens.append(match.group(0))
+        elif len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+class BM25Index:
+    """
+    基于 BM25 打分的内存倒排索引
+    文档 id 与 VectorStore 一致（插入顺序下标），由 VectorStore 在查询时惰性同步新文档，
+    词法检索完全在本地完成，不需要调用嵌入API。
+    倒排表按词项保存文档 id 和词频，查询时只遍历查询词项的倒排表，用 numpy 累加分数
+    """
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        """
+        Args:
+            k1: 词频饱和参数
+            b: 文档长度归一化参数
+        """
+        self.k1 = k1
+        self.b = b
+        self.clear()
+
+    def __len__(self) -> int:
+        """已建立索引的文档数"""
+        return len(self._lengths)
+
+    def __repr__(self) -> str:
+        return f'BM25Index(k1={self.k1}, b={self.b})'
+
+    def clear(self):
+        """清空索引，下次同步时从头重建"""
+        # 词项 -> (文档 id 列表, 词频列表)
+        self._postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        self._lengths: List[int] = []
+        self._total_length = 0
+        # 查询时使用的 numpy 形式的倒排表，添加文档后失效
+        self._arrays: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        # 每个文档的长度归一化项 k1 * (1 - b + b * dl / avgdl)，添加文档后失效
+        self._norms: Optional[np.ndarray] = None
+
+    def add(self, documents: Iterable[str]):
+        """
+        依次为文档建立索引，id 紧接已有文档之后
+        Args:
+            documents: 文档内容
+        """
+        for document in documents:
+            doc_id = len(self._lengths)
+            counts = Counter(tokenize(document))
+            for term, tf in counts.items():
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = ([], [])
+                postings[0].append(doc_id)
+                postings[1].append(tf)
+                self._arrays.pop(term, None)
+            length = sum(counts.values())
+            self._lengths.append(length)
+            self._total_length += length
+        self._norms = None
+
+    def search(self, query: str, top_k: int = 5, exclude: Optional[set] = None,
+               allowed: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        按 BM25 分数检索文档
+        Args:
+            query: 查询文本
+            top_k: 返回的文档数上限
+            exclude: 需要排除的文档 id（如已删除的文档）
+            allowed: 元数据过滤位图，只返回其中为 True 的文档
+        Returns:
+            (文档 id 数组, 分数数组)，按分数降序排列，只包含至少命中一个词项的文档
+        """
+        count = len(self._lengths)
+        terms = Counter(term for term in tokenize(query) if term in self._postings)
+        if not count or not terms or top_k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        if self._norms is None:
+            lengths = np.asarray(self._lengths, dtype=np.float32)
+            self._norms = self.k1 * (1 - self.b + self.b * lengths / (self._total_length / count or 1))
+        norms = self._norms
+
+        scores = np.zeros(count, dtype=np.float32)
+        for term, query_tf in terms.items():
+            ids, tfs = self._term_arrays(term)
+            idf = math.log(1 + (count - len(ids) + 0.5) / (len(ids) + 0.5))
+            scores[ids] += query_tf * idf * tfs * (self.k1 + 1) / (tfs + norms[ids])
+
+        if exclude:
+            scores[[doc_id for doc_id in exclude if doc_id < count]] = 0
+        if allowed is not None:
+            scores[~allowed[:count]] = 0
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > top_k:
+            # 与 VectorStore 相同：补齐所有与第K名同分的文档，再按插入顺序取舍
+            threshold = scores[candidates[np.argpartition(-scores[candidates], top_k - 1)[:top_k]]].min()
+            candidates = candidates[scores[candidates] >= threshold]
+        # 分数相同时按插入顺序排列
+        order = np.lexsort((candidates, -scores[candidates]))[:top_k]
+        return candidates[order], scores[candidates[order]]
+
+    def _term_arrays(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        """返回词项倒排表的 numpy 形式，按需转换并缓存"""
+        arrays = self._arrays.get(term)
+        if arrays is None:
+            ids, tfs = self._postings[term]
+            arrays = self._arrays[term] = (np.asarray(ids, dtype=np.int64), np.asarray(tfs, dtype=np.float32))
+        return arrays
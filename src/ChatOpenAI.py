@@ -1,11 +1,18 @@
 import os
-from typing import List, Dict, Any, Optional
-from openai import OpenAI
+import json
+import time
+from typing import List, Dict, Any, AsyncIterator, Optional
+from openai import AsyncOpenAI
 from dotenv import load_dotenv
-from utils import log_title
+from TokenBudget import TokenBudget
+from Tracer import start_span
+from EventSink import EventSink, ConsoleSink
 # 加载环境变量
 load_dotenv()
 
+# 可通过环境变量指向其他兼容 OpenAI 的服务（如基准测试中的本地替身）
+LLM_BASE_URL = os.getenv('LLM_BASE_URL', "https://dashscope.aliyuncs.com/compatible-mode/v1")
+
 class ToolCall:
     """
     工具调用类
@@ -41,7 +48,10 @@ class Tool:
 class ChatOpenAI:
     """OpenAI聊天客户端类"""
     
-    def __init__(self, model: str, system_prompt: str = '', tools: List[Tool] = None, context: str = ''):
+    def __init__(self, model: str, system_prompt: str = '', tools: List[Tool] = None, context: str = '',
+                 base_url: str = LLM_BASE_URL, api_key: Optional[str] = None,
+                 token_budget: Optional[TokenBudget] = None, sink: Optional[EventSink] = None,
+                 client: Optional[AsyncOpenAI] = None):
         """
         初始化ChatOpenAI实例
         
@@ -50,14 +60,21 @@ class ChatOpenAI:
             system_prompt: 系统提示词
             tools: 工具列表
             context: 上下文信息
+            base_url: 兼容 OpenAI 的接口地址
+            api_key: API Key，默认读取环境变量 ALIYUN_API_KEY
+            token_budget: 消息历史的 token 预算，为 None 时不压缩历史
+            sink: chat() 的输出事件接收器，默认以 ConsoleSink 打印到终端
+            client: 共享的 AsyncOpenAI 客户端（连接池），提供时忽略 base_url 和 api_key
         """
-        self.llm = OpenAI(
-            api_key=os.getenv('ALIYUN_API_KEY'),
-            base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
+        self.llm = client if client is not None else AsyncOpenAI(
+            api_key=api_key or os.getenv('ALIYUN_API_KEY'),
+            base_url=base_url,
         )
         self.model = model
         self.tools = tools or []
         self.messages = []
+        self.token_budget = token_budget
+        self.sink = sink if sink is not None else ConsoleSink()
         
         # 添加系统提示词
         if system_prompt:
@@ -66,6 +83,9 @@ class ChatOpenAI:
         # 添加上下文
         if context:
             self.messages.append({"role": "user", "content": context})
+
+        # 系统提示词和上下文在压缩历史时始终保留
+        self._pinned = len(self.messages)
     
     async def chat(self, prompt: Optional[str] = None) -> Dict[str, Any]:
         """
@@ -77,45 +97,89 @@ class ChatOpenAI:
         Returns:
             包含content和toolCalls的字典
         """
-        log_title('CHAT')
+        self.sink.emit({'type': 'chat_start', 'prompt': prompt})
+        # 没有人接收逐 token 事件时跳过，流式生成不产生任何输出开销
+        wants_tokens = self.sink.wants_tokens
+        try:
+            result = {"content": "", "toolCalls": []}
+            async for event in self.stream(prompt):
+                if event['type'] == 'content':
+                    if wants_tokens:
+                        self.sink.emit({'type': 'token', 'content': event['content']})
+                elif event['type'] == 'done':
+                    result = {"content": event['content'], "toolCalls": event['toolCalls']}
+
+            self.sink.emit({'type': 'chat_end', **result})
+            return result
+            
+        except Exception as e:
+            self.sink.emit({'type': 'error', 'message': f"API call failed: {e}"})
+            raise
+
+    async def stream(self, prompt: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        以异步迭代器的形式进行流式对话，不阻塞事件循环
         
-        # 如果提供了新的用户消息，添加到消息历史中并显示
+        Args:
+            prompt: 用户输入的提示词，为 None 时基于现有历史（如工具结果）继续对话
+            
+        Yields:
+            增量事件字典：
+              {"type": "content", "content": 文本增量}
+              {"type": "tool_call", "index": 序号, "id": id增量, "name": 名称增量, "arguments": 参数增量}
+              {"type": "done", "content": 完整文本, "toolCalls": 完整工具调用列表}（最后一个事件）
+            收到 done 事件时，助手消息已加入消息历史
+        """
+        # 如果提供了新的用户消息，添加到消息历史中
         if prompt:
-            print(f"User: {prompt}")
             self.messages.append({
                 "role": "user", 
                 "content": prompt
             })
-        else:
-            # 如果没有新的用户消息，显示当前状态
-            print("Continuing to process tool call results...")
+
+        # 超出 token 预算时压缩历史，保证每次请求的负载有上限
+        if self.token_budget is not None:
+            messages = self.messages
+            self.messages, before, after = self.token_budget.compact(messages, self._pinned)
+            if self.messages is not messages:
+                self.sink.emit({'type': 'history_compacted', 'before': before, 'after': after})
+
+        # 异步生成器可能跨多次调度执行，span 不设为当前 span，只记录本次请求
+        span = start_span('llm.chat', model=self.model, messages=len(self.messages))
+        if span.recording:
+            span.set(prompt_tokens=TokenBudget.count(self.messages),
+                     request_bytes=len(json.dumps(self.messages, ensure_ascii=False).encode('utf-8')))
+        started = time.perf_counter()
+        first_token = None
         try:
             # 创建流式聊天完成
-            stream = self.llm.chat.completions.create(
+            stream = await self.llm.chat.completions.create(
                 model=self.model,
                 messages=self.messages,
                 stream=True,
                 tools=self._get_tools_definition() if self.tools else None,  # 只有工具存在时才传递
             )
-            
+
             content = ""
             tool_calls = []
-            
-            log_title('RESPONSE')
-            print("AI: ", end="", flush=True)  # 添加AI标识
-            
+
             # 处理流式响应
-            for chunk in stream:
+            async for chunk in stream:
+                # 服务端返回用量时以其为准，代替本地估算
+                usage = getattr(chunk, 'usage', None)
+                if usage is not None and span.recording:
+                    span.set(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens)
                 if not chunk.choices:  # 检查choices是否存在
                     continue
-                    
+
                 delta = chunk.choices[0].delta
-                
+                if first_token is None and (delta.content or delta.tool_calls):
+                    first_token = time.perf_counter()
+
                 # 处理普通内容
                 if delta.content:
-                    content_chunk = delta.content
-                    content += content_chunk
-                    print(content_chunk, end='', flush=True)  
+                    content += delta.content
+                    yield {"type": "content", "content": delta.content}
 
                 # 处理工具调用
                 if delta.tool_calls:
@@ -126,50 +190,60 @@ class ChatOpenAI:
                                 'id': '', 
                                 'function': {'name': '', 'arguments': ''}
                             })
-                        
+                    
                         current_call = tool_calls[tool_call_chunk.index]
-                        
+                        name = tool_call_chunk.function.name if tool_call_chunk.function else None
+                        arguments = tool_call_chunk.function.arguments if tool_call_chunk.function else None
+                    
                         if tool_call_chunk.id:
                             current_call['id'] += tool_call_chunk.id
-                        if tool_call_chunk.function and tool_call_chunk.function.name:
-                            current_call['function']['name'] += tool_call_chunk.function.name
-                        if tool_call_chunk.function and tool_call_chunk.function.arguments:
-                            current_call['function']['arguments'] += tool_call_chunk.function.arguments
-            
-            print()  # 添加换行
-            
-            # 如果有工具调用但没有文本内容，显示工具调用信息
-            if tool_calls and not content:
-                print("The tool is being invoked...")
-
-            # 构建工具调用格式用于消息历史
-            formatted_tool_calls = [
-                {
-                    "id": call['id'],
-                    "type": "function",
-                    "function": call['function']
-                }
-                for call in tool_calls
-            ] if tool_calls else None
-
-            # 添加助手响应到消息历史
-            assistant_message = {
-                "role": "assistant",
-                "content": content,
-            }
-            if formatted_tool_calls:
-                assistant_message["tool_calls"] = formatted_tool_calls
-                
-            self.messages.append(assistant_message)
-            
-            return {
-                "content": content,
-                "toolCalls": tool_calls,
+                        if name:
+                            current_call['function']['name'] += name
+                        if arguments:
+                            current_call['function']['arguments'] += arguments
+
+                        yield {
+                            "type": "tool_call",
+                            "index": tool_call_chunk.index,
+                            "id": tool_call_chunk.id or '',
+                            "name": name or '',
+                            "arguments": arguments or '',
+                        }
+        except BaseException as e:
+            span.set(error=type(e).__name__, errors=1)
+            span.finish()
+            raise
+
+        # 构建工具调用格式用于消息历史
+        formatted_tool_calls = [
+            {
+                "id": call['id'],
+                "type": "function",
+                "function": call['function']
             }
+            for call in tool_calls
+        ] if tool_calls else None
+
+        # 添加助手响应到消息历史
+        assistant_message = {
+            "role": "assistant",
+            "content": content,
+        }
+        if formatted_tool_calls:
+            assistant_message["tool_calls"] = formatted_tool_calls
             
-        except Exception as e:
-            print(f"\n❌ API call failed: {e}")
-            raise
+        self.messages.append(assistant_message)
+
+        if span.recording:
+            finished = time.perf_counter()
+            if 'completion_tokens' not in span.attributes:
+                span.set(completion_tokens=TokenBudget.count([assistant_message]))
+            span.set(ttft_s=(first_token or finished) - started, generation_s=finished - (first_token or finished),
+                     response_bytes=len(json.dumps(assistant_message, ensure_ascii=False).encode('utf-8')),
+                     tool_calls=len(tool_calls))
+        span.finish()
+
+        yield {"type": "done", "content": content, "toolCalls": tool_calls}
     
     def append_tool_result(self, tool_call_id: str, tool_output: str):
         """
@@ -0,0 +1,134 @@
+import asyncio
+import hashlib
+import sqlite3
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+import numpy as np
+
+
+class EmbeddingCache:
+    """
+    嵌入向量缓存类
+    以 (模型名, 规范化文本的哈希) 为键，持久化保存在 SQLite 文件中，
+    并在内存中维护一个按 LRU 淘汰的热点层，避免对未变化的文本重复调用嵌入API。
+    热点层保存 float32 数组（1024 维约 4 KB/条）；SQLite 读写在专用的单线程执行器中进行，不阻塞事件循环
+    """
+    def __init__(self, path: Union[str, Path] = ':memory:', max_memory_items: int = 10000):
+        """
+        Args:
+            path: SQLite 数据库文件路径，默认为纯内存数据库
+            max_memory_items: 内存热点层最多保留的向量数
+        """
+        if path != ':memory:':
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        # 连接只在执行器的单个线程中使用（close() 除外，此时执行器已停止）
+        self.conn = sqlite3.connect(str(path), check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, model TEXT NOT NULL, vector BLOB NOT NULL)"
+        )
+        self.conn.commit()
+        self.max_memory_items = max_memory_items
+        self._memory: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='embedding-cache')
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        """
+        计算缓存键：对文本做 NFKC 规范化并合并空白后，与模型名一起取 SHA-256
+        """
+        normalized = ' '.join(unicodedata.normalize('NFKC', text).split())
+        return hashlib.sha256(f'{model}\0{normalized}'.encode('utf-8')).hexdigest()
+
+    async def get_many(self, model: str, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """
+        批量查询缓存：先查内存热点层，未命中的键再到 SQLite 中查询
+        Args:
+            model: 嵌入模型名称
+            texts: 文本列表
+        Returns:
+            与 texts 一一对应的嵌入向量（只读的 float32 数组），未命中的位置为 None
+        """
+        keys = [self.make_key(model, text) for text in texts]
+        results: List[Optional[np.ndarray]] = [None] * len(texts)
+
+        missing: Dict[str, List[int]] = {}
+        for i, key in enumerate(keys):
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                results[i] = self._memory[key]
+                self.memory_hits += 1
+            else:
+                missing.setdefault(key, []).append(i)
+
+        if missing:
+            rows = await asyncio.get_running_loop().run_in_executor(self._executor, self._select, list(missing))
+            for key, blob in rows:
+                embedding = np.frombuffer(blob, dtype=np.float32)
+                self._remember(key, embedding)
+                for i in missing[key]:
+                    results[i] = embedding
+                self.disk_hits += len(missing[key])
+
+        self.misses += sum(1 for result in results if result is None)
+        return results
+
+    async def put_many(self, model: str, texts: List[str], embeddings: Sequence[Sequence[float]]):
+        """
+        批量写入缓存（内存热点层立即更新，SQLite 在执行器中写入）
+        Args:
+            model: 嵌入模型名称
+            texts: 文本列表
+            embeddings: 与 texts 一一对应的嵌入向量
+        """
+        rows = []
+        for text, embedding in zip(texts, embeddings):
+            key = self.make_key(model, text)
+            blob = np.asarray(embedding, dtype=np.float32).tobytes()
+            self._remember(key, np.frombuffer(blob, dtype=np.float32))
+            rows.append((key, model, blob))
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._insert, rows)
+
+    def stats(self) -> Dict[str, float]:
+        """返回命中/未命中计数及命中率"""
+        hits = self.memory_hits + self.disk_hits
+        total = hits + self.misses
+        return {
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': hits / total if total else 0.0,
+        }
+
+    def close(self):
+        """等待未完成的写入后关闭数据库连接"""
+        self._executor.shutdown(wait=True)
+        self.conn.close()
+
+    def _select(self, keys: List[str]) -> List[Tuple[str, bytes]]:
+        """在执行器线程中查询；SQLite 单条语句的参数个数有限，分批查询"""
+        rows = []
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            rows.extend(self.conn.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk
+            ).fetchall())
+        return rows
+
+    def _insert(self, rows: List[Tuple[str, str, bytes]]):
+        """在执行器线程中写入"""
+        self.conn.executemany("INSERT OR REPLACE INTO embeddings (key, model, vector) VALUES (?, ?, ?)", rows)
+        self.conn.commit()
+
+    def _remember(self, key: str, embedding: np.ndarray):
+        """放入内存热点层，超出容量时淘汰最久未使用的项"""
+        self._memory[key] = embedding
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
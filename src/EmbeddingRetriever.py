@@ -1,39 +1,135 @@
 import os
+import asyncio
 import aiohttp
+from typing import Any, Dict, List, Optional
 from dotenv import load_dotenv
 from VectorStore import VectorStore
-from utils import log_title
+from EmbeddingCache import EmbeddingCache
+from Tracer import trace
+from utils import log_title, estimate_tokens
 
 
 # 加载环境变量
 load_dotenv()
 
 API_KEY = os.getenv('SILICONFLOW_API_KEY')
+EMBEDDING_URL = os.getenv('EMBEDDING_URL', "https://api.siliconflow.cn/v1/embeddings")
+# 需要重试的HTTP状态码：限流和服务端错误
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+# 检索模式：稠密向量、BM25 词法、二者融合
+RETRIEVAL_MODES = ('dense', 'lexical', 'hybrid')
 
 
 class EmbeddingRetriever:
     """
     嵌入向量检索器类
     负责将文档和查询转换为嵌入向量，并提供基于向量相似度的检索功能
-    """    
-    def __init__(self, embedding_model: str):
+
+    所有请求复用同一个带连接池的 aiohttp 会话，建议以异步上下文管理器的方式使用：
+        async with EmbeddingRetriever("BAAI/bge-m3") as retriever:
+            ...
+    """
+    def __init__(self, embedding_model: str, batch_size: int = 32, max_batch_tokens: int = 8192,
+                 url: str = EMBEDDING_URL, max_concurrency: int = 4, max_connections: int = 8,
+                 max_retries: int = 3, retry_backoff: float = 0.5,
+                 vector_store: Optional[VectorStore] = None, cache: Optional[EmbeddingCache] = None,
+                 retrieval_mode: str = 'dense', rrf_k: int = 60, fusion_depth: int = 4):
+        """
+        Args:
+            embedding_model: 嵌入模型名称
+            batch_size: 单次请求最多包含的文本数
+            max_batch_tokens: 单次请求的估算 token 上限
+            url: 兼容 OpenAI 的 /v1/embeddings 接口地址
+            max_concurrency: 同时进行中的嵌入请求数上限
+            max_connections: 连接池的最大连接数
+            max_retries: 遇到 429/5xx 或网络错误时的最大重试次数
+            retry_backoff: 指数退避的初始等待秒数
+            vector_store: 使用的向量存储（例如从磁盘加载的索引），默认新建空存储
+            cache: 嵌入向量缓存，文档和查询共用；为 None 时每次都调用API
+            retrieval_mode: retrieve() 的默认检索模式，'dense'、'lexical' 或 'hybrid'；
+                后两者要求向量存储挂载了词法索引（BM25Index）
+            rrf_k: 倒数排名融合（RRF）的平滑常数
+            fusion_depth: 混合检索时每路取 top_k * fusion_depth 个候选参与融合
+        """
         self.embedding_model = embedding_model
-        self.vector_store = VectorStore()
-    
-    async def embed_document(self, document: str):
+        self.batch_size = batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.url = url
+        self.max_connections = max_connections
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.vector_store = vector_store if vector_store is not None else VectorStore()
+        self.cache = cache
+        if retrieval_mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode: {retrieval_mode}")
+        self.retrieval_mode = retrieval_mode
+        self.rrf_k = rrf_k
+        self.fusion_depth = fusion_depth
+        self.max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def __aenter__(self):
+        self._get_session()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def close(self):
+        """关闭共享会话及其连接池"""
+        if self._session and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """获取共享会话，首次使用（或关闭后再次使用）时创建"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers={
+                    "Authorization": f"Bearer {API_KEY}",
+                    "Content-Type": "application/json"
+                }
+            )
+        return self._session
+
+    async def embed_document(self, document: str, metadata: Optional[Dict[str, Any]] = None,
+                             namespace: Optional[str] = None):
         """
         嵌入文档并存储到向量库
         Args:
-            document: 要嵌入的文档内容  
+            document: 要嵌入的文档内容
+            metadata: 文档的元数据（来源文件、段落序号、标签等）
+            namespace: 文档所属的命名空间
         Returns:
             文档的嵌入向量
         """
         log_title('EMBEDDING DOCUMENT')
 
         embedding = await self.embed_text(document)
-        await self.vector_store.add_embedding(embedding, document)
+        await self.vector_store.add_embedding(embedding, document, metadata, namespace)
         return embedding
-    
+
+    async def embed_documents(self, documents: List[str], metadatas: Optional[List[Optional[Dict[str, Any]]]] = None,
+                              namespace: Optional[str] = None) -> List[List[float]]:
+        """
+        批量嵌入文档并一次性写入向量库
+        文档按 batch_size 和 max_batch_tokens 打包，每个批次只发送一次请求
+        Args:
+            documents: 要嵌入的文档内容列表
+            metadatas: 与 documents 一一对应的元数据
+            namespace: 这批文档所属的命名空间
+        Returns:
+            与 documents 顺序一致的嵌入向量列表
+        """
+        log_title('EMBEDDING DOCUMENTS')
+
+        embeddings = await self.embed_many(documents)
+        await self.vector_store.add_embeddings(embeddings, documents, metadatas, namespace)
+        return embeddings
+
     async def embed_query(self, query: str):
         log_title('EMBEDDING QUERY')
         embedding = await self.embed_text(query)
@@ -41,42 +137,204 @@ class EmbeddingRetriever:
 
     async def embed_text(self, text: str):
         """
-        调用嵌入API将文本转换为向量
+        将文本转换为向量，优先使用缓存，未命中时调用嵌入API
         Args:
             text: 要嵌入的文本
         Returns:
             嵌入向量（浮点数列表）
         """
+        embeddings = await self.embed_many([text])
+        return embeddings[0]
 
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                url="https://api.siliconflow.cn/v1/embeddings",
-                json={
+    async def embed_texts(self, texts: List[str]) -> List[List[float]]:
+        """
+        在一次API请求中嵌入多条文本
+        Args:
+            texts: 要嵌入的文本列表
+        Returns:
+            与 texts 顺序一致的嵌入向量列表
+        """
+        with trace('embed.request', texts=len(texts)) as span:
+            if span.recording:
+                span.set(tokens=sum(estimate_tokens(text) for text in texts))
+            async with self._semaphore:
+                span.set(queue_s=span.duration)
+                data = await self._post_with_retry({
                     "model": self.embedding_model,
-                    "input": text
-                },
-                headers={
-                    "Authorization": f"Bearer {API_KEY}",
-                    "Content-Type": "application/json"
-                }
-            ) as response:
-                data = await response.json()
-                embedding = data['data'][0]['embedding']
-                return embedding
-    
-    async def retrieve(self, query: str, top_k: int = 5):
+                    "input": texts
+                })
+
+        # 接口不保证返回顺序，按 index 字段还原
+        embeddings: List[List[float]] = [None] * len(texts)
+        for item in data['data']:
+            embeddings[item['index']] = item['embedding']
+        if any(embedding is None for embedding in embeddings):
+            raise RuntimeError(f"Embedding response is missing items: expected {len(texts)}, got {len(data['data'])}")
+        return embeddings
+
+    async def embed_many(self, texts: List[str]) -> List[List[float]]:
+        """
+        嵌入任意数量的文本（不写入向量库）：先查缓存，只把未命中的文本打包成批次并发请求，结果再写回缓存
+        Args:
+            texts: 要嵌入的文本列表
+        Returns:
+            与 texts 顺序一致的嵌入向量列表（命中缓存的为 float32 数组）
+        """
+        with trace('embed', texts=len(texts)) as span:
+            if self.cache is not None:
+                embeddings = await self.cache.get_many(self.embedding_model, texts)
+            else:
+                embeddings = [None] * len(texts)
+            missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+            span.set(cache_hits=len(texts) - len(missing))
+            if not missing:
+                return embeddings
+
+            batches = self._make_batches([texts[i] for i in missing])
+            if len(texts) > 1:
+                print(f'Embedding {len(missing)}/{len(texts)} uncached texts in {len(batches)} batches...')
+
+            # 各批次并发发送，实际并发数由信号量限制
+            results = await asyncio.gather(*(self.embed_texts(batch) for batch in batches))
+        fetched = [embedding for batch in results for embedding in batch]
+        for i, embedding in zip(missing, fetched):
+            embeddings[i] = embedding
+
+        if self.cache is not None:
+            await self.cache.put_many(self.embedding_model, [texts[i] for i in missing], fetched)
+        return embeddings
+
+    async def _post_with_retry(self, payload: dict) -> dict:
+        """
+        发送嵌入请求，遇到 429/5xx 或网络错误时按指数退避重试
+        若响应带有 Retry-After 头，则以其为准
+        """
+        session = self._get_session()
+        for attempt in range(self.max_retries + 1):
+            delay = self.retry_backoff * (2 ** attempt)
+            try:
+                async with session.post(self.url, json=payload) as response:
+                    if response.status not in RETRYABLE_STATUS:
+                        response.raise_for_status()
+                        return await response.json()
+                    if attempt == self.max_retries:
+                        response.raise_for_status()
+                    retry_after = response.headers.get('Retry-After', '')
+                    if retry_after.replace('.', '', 1).isdigit():
+                        delay = float(retry_after)
+                    print(f"⚠️ Embedding request returned {response.status}, retrying in {delay:.2f}s...")
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if attempt == self.max_retries:
+                    raise
+                print(f"⚠️ Embedding request failed: {e}, retrying in {delay:.2f}s...")
+            await asyncio.sleep(delay)
+
+    def _make_batches(self, texts: List[str]) -> List[List[str]]:
+        """
+        按文本数和估算 token 数将文本切分为批次
+        单条超过 token 上限的文本会独占一个批次
+        """
+        batches: List[List[str]] = []
+        batch: List[str] = []
+        batch_tokens = 0
+        for text in texts:
+            tokens = estimate_tokens(text)
+            if batch and (len(batch) >= self.batch_size or batch_tokens + tokens > self.max_batch_tokens):
+                batches.append(batch)
+                batch, batch_tokens = [], 0
+            batch.append(text)
+            batch_tokens += tokens
+        if batch:
+            batches.append(batch)
+        return batches
+
+    async def retrieve(self, query: str, top_k: int = 5, mode: Optional[str] = None,
+                       filter: Optional[Dict[str, Any]] = None, namespace: Optional[str] = None):
         """
         根据查询检索最相似的文档
         Args:
             query: 查询文本
             top_k: 返回最相似的前K个文档，默认为5
+            mode: 检索模式，默认使用实例的 retrieval_mode：
+                'dense' 按嵌入向量的余弦相似度检索；
+                'lexical' 按 BM25 分数检索，不调用嵌入API；
+                'hybrid' 两路检索结果按倒数排名融合（RRF），对人名等专有名词的召回更好
+            filter: 元数据过滤条件，格式见 MetadataIndex，例如 {'source': 'Chapter1.txt'}
+            namespace: 只在该命名空间内检索
         Returns:
             按相似度排序的文档列表
         """
-        # 获取查询的嵌入向量
+        mode = mode or self.retrieval_mode
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode: {mode}")
+        with trace('retrieve', mode=mode, top_k=top_k):
+            scope = {'filter': filter, 'namespace': namespace}
+            if mode == 'lexical':
+                return await self.vector_store.lexical_search(query, top_k, **scope)
+
+            # 获取查询的嵌入向量
+            query_embedding = await self.embed_query(query)
+
+            if mode == 'dense':
+                # 在向量存储中搜索最相似的文档
+                return await self.vector_store.search(query_embedding, top_k, **scope)
+
+            depth = top_k * self.fusion_depth
+            rankings = [
+                await self.vector_store.search_ids(query_embedding, depth, **scope),
+                self.vector_store.lexical_search_ids(query, depth, **scope),
+            ]
+            return [self.vector_store.documents[i] for i in self._fuse(rankings, top_k)]
+
+    async def retrieve_many(self, queries: List[str], top_k: int = 5, mode: Optional[str] = None,
+                            filter: Optional[Dict[str, Any]] = None,
+                            namespace: Optional[str] = None) -> List[List[str]]:
+        """
+        批量检索多个查询，适用于查询扩展和批量评测
+        所有查询的嵌入合并为一次（超出 batch_size 时为少数几次并发的）API 请求，
+        再与向量存储做一次矩阵-矩阵乘法，避免逐个查询的请求和扫描开销
+        Args:
+            queries: 查询文本列表
+            top_k: 每个查询返回的文档数，默认为5
+            mode: 检索模式，含义同 retrieve()
+            filter: 元数据过滤条件，对所有查询生效
+            namespace: 只在该命名空间内检索
+        Returns:
+            与查询一一对应的文档列表
+        """
+        mode = mode or self.retrieval_mode
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode: {mode}")
+        if not queries:
+            return []
+        with trace('retrieve_many', mode=mode, top_k=top_k, queries=len(queries)):
+            scope = {'filter': filter, 'namespace': namespace}
+            if mode == 'lexical':
+                return [await self.vector_store.lexical_search(query, top_k, **scope) for query in queries]
+
+            query_embeddings = await self.embed_many(list(queries))
 
-        query_embedding = await self.embed_query(query)
+            if mode == 'dense':
+                return await self.vector_store.search_many(query_embeddings, top_k, **scope)
 
-        # 在向量存储中搜索最相似的文档
-        return await self.vector_store.search(query_embedding, top_k)
+            depth = top_k * self.fusion_depth
+            dense_rankings = await self.vector_store.search_many_ids(query_embeddings, depth, **scope)
+            documents = self.vector_store.documents
+            return [
+                [documents[i] for i in
+                 self._fuse([dense, self.vector_store.lexical_search_ids(query, depth, **scope)], top_k)]
+                for query, dense in zip(queries, dense_rankings)
+            ]
+
+    def _fuse(self, rankings: List[List[int]], top_k: int) -> List[int]:
+        """
+        倒数排名融合：文档得分为其在各路排名中 1 / (rrf_k + 名次) 之和
+        只依赖名次而不依赖分数，不需要对余弦相似度和 BM25 分数做归一化
+        """
+        scores = {}
+        for ranking in rankings:
+            for rank, doc_id in enumerate(ranking, start=1):
+                scores[int(doc_id)] = scores.get(int(doc_id), 0.0) + 1.0 / (self.rrf_k + rank)
+        # 分数相同时按 id（插入顺序）排列
+        return sorted(scores, key=lambda doc_id: (-scores[doc_id], doc_id))[:top_k]
 
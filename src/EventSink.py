@@ -0,0 +1,156 @@
+import sys
+import asyncio
+from typing import Any, Callable, Dict, Optional, TextIO
+
+# 事件为字典，type 字段取值及其余字段：
+#   chat_start   prompt（为 None 表示基于工具结果继续对话）
+#   token        content（流式文本增量）
+#   chat_end     content, toolCalls
+#   tool_call    name, arguments
+#   tool_result  name, content
+#   tool_error   name, message
+#   error        message
+#   context      content（RAG 检索到的上下文）
+#   history_compacted  before, after（对话历史压缩前后估算的 token 数）
+Event = Dict[str, Any]
+
+
+class EventSink:
+    """
+    输出与事件接收器的基类
+    ChatOpenAI、Agent 等组件不再直接 print，而是把事件交给 sink，由 sink 决定如何展示或转发。
+    wants_tokens 为 False 时组件跳过逐 token 事件，没有人关注输出时流式生成没有额外开销
+    """
+    wants_tokens = True
+
+    def emit(self, event: Event):
+        """接收一个事件；必须立即返回，不能阻塞事件循环"""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class NullSink(EventSink):
+    """丢弃所有事件"""
+    wants_tokens = False
+
+    def emit(self, event: Event):
+        pass
+
+
+class ConsoleSink(EventSink):
+    """
+    以原来的终端格式打印事件（默认的 sink）
+    输出到终端时每个 token 立即刷新；输出被管道或重定向时交给流自身的缓冲，不再逐 token 刷新
+    """
+    def __init__(self, stream: Optional[TextIO] = None, flush: Optional[bool] = None, max_result_chars: int = 500):
+        """
+        Args:
+            stream: 输出流，默认为（调用时的）sys.stdout
+            flush: 是否逐 token 刷新，默认仅在输出为终端时刷新
+            max_result_chars: 工具结果最多打印的字符数
+        """
+        self.stream = stream
+        self.flush = flush
+        self.max_result_chars = max_result_chars
+
+    def emit(self, event: Event):
+        stream = self.stream or sys.stdout
+        kind = event['type']
+        if kind == 'token':
+            flush = self.flush if self.flush is not None else stream.isatty()
+            print(event['content'], end='', flush=flush, file=stream)
+        elif kind == 'chat_start':
+            self._title(stream, 'CHAT')
+            # 如果提供了新的用户消息，显示出来；否则显示当前状态
+            print(f"User: {event['prompt']}" if event['prompt'] else "Continuing to process tool call results...",
+                  file=stream)
+            self._title(stream, 'RESPONSE')
+            print("AI: ", end="", flush=True, file=stream)
+        elif kind == 'chat_end':
+            print(file=stream, flush=True)
+            # 如果有工具调用但没有文本内容，显示工具调用信息
+            if event['toolCalls'] and not event['content']:
+                print("The tool is being invoked...", file=stream)
+        elif kind == 'tool_call':
+            self._title(stream, 'TOOL USE')
+            print(f"Calling tool: {event['name']}", file=stream)
+            print(f"Arguments: {event['arguments']}", file=stream)
+        elif kind == 'tool_result':
+            print(f"Result: {event['content'][:self.max_result_chars]}...", file=stream)
+        elif kind == 'tool_error':
+            print(f"Error: {event['message']}", file=stream)
+        elif kind == 'error':
+            print(f"\n❌ {event['message']}", file=stream, flush=True)
+        elif kind == 'context':
+            self._title(stream, 'CONTEXT')
+            print(event['content'], file=stream)
+        elif kind == 'history_compacted':
+            print(f"History compacted: ~{event['before']} -> ~{event['after']} tokens", file=stream)
+
+    @staticmethod
+    def _title(stream: TextIO, title: str):
+        """与 utils.log_title 格式相同，但写入指定的流"""
+        print(f"\n{'=' * 20} {title} {'=' * 20}\n", file=stream)
+
+
+class QueueSink(EventSink):
+    """
+    把事件放入有界的 asyncio 队列，由消费者异步读取：
+        sink = QueueSink()
+        async for event in sink:
+            ...
+    队列已满时丢弃最早的事件（计入 dropped），生产者永远不会因为消费者慢而等待。
+    close() 后迭代在读完剩余事件时结束
+    """
+    def __init__(self, maxsize: int = 10000):
+        """
+        Args:
+            maxsize: 队列容量
+        """
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self.dropped = 0
+        self._closed = False
+
+    def emit(self, event: Optional[Event]):
+        if self._closed and event is not None:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.queue.get_nowait()
+            self.queue.put_nowait(event)
+            self.dropped += 1
+
+    def close(self):
+        """放入结束标记"""
+        if not self._closed:
+            self.emit(None)
+            self._closed = True
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> Event:
+        event = await self.queue.get()
+        if event is None:
+            raise StopAsyncIteration
+        return event
+
+
+class CallbackSink(EventSink):
+    """把每个事件交给回调函数，适用于 UI 或把流转发给其他消费者；回调应尽快返回"""
+    def __init__(self, callback: Callable[[Event], None], types: Optional[set] = None):
+        """
+        Args:
+            callback: 回调函数，参数为事件字典
+            types: 只转发这些类型的事件，为 None 时转发全部
+        """
+        self.callback = callback
+        self.types = types
+        self.wants_tokens = types is None or 'token' in types
+
+    def emit(self, event: Event):
+        if self.types is None or event['type'] in self.types:
+            self.callback(event)
@@ -0,0 +1,136 @@
+import math
+from typing import Optional
+import numpy as np
+
+
+class IVFIndex:
+    """
+    倒排文件（IVF）近似最近邻索引
+    用球面 k-means 把单位向量划分到 nlist 个簇中，搜索时只对与查询最接近的
+    nprobe 个簇内的向量打分。nprobe 越大召回率越高、速度越慢，nprobe == nlist 时等同精确搜索。
+
+    索引本身只保存簇中心和每个向量所属的簇，向量数据仍由 VectorStore 持有：
+        store = VectorStore(ann_index=IVFIndex(nlist=1024, nprobe=16))
+        ...添加向量...
+        store.train_index()
+    """
+    def __init__(self, nlist: Optional[int] = None, nprobe: int = 8, iterations: int = 10,
+                 max_train_points: int = 64, seed: int = 0):
+        """
+        Args:
+            nlist: 簇的数量，默认按训练时的向量数取 sqrt(N)
+            nprobe: 每次搜索探查的簇数量，召回率/延迟的调节旋钮
+            iterations: k-means 迭代次数
+            max_train_points: 每个簇最多使用的训练样本数，超过时随机采样
+            seed: 随机种子，保证训练结果可复现
+        """
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.iterations = iterations
+        self.max_train_points = max_train_points
+        self.seed = seed
+        self.centroids: Optional[np.ndarray] = None
+        # 每个向量（按 id）所属的簇
+        self._assignments = np.empty(0, dtype=np.int32)
+        self._count = 0
+        # 按簇排序的 id 及每个簇的起止位置（CSR 形式的倒排表），添加向量后惰性重建
+        self._sorted_ids: Optional[np.ndarray] = None
+        self._bounds: Optional[np.ndarray] = None
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def train(self, vectors: np.ndarray):
+        """
+        用球面 k-means 训练簇中心，并把 vectors 作为 id 0..N-1 加入索引
+        Args:
+            vectors: 已归一化的向量矩阵
+        """
+        count = vectors.shape[0]
+        if count == 0:
+            raise ValueError('Cannot train IVF index on an empty vector set')
+        nlist = min(self.nlist or max(1, int(math.sqrt(count))), count)
+        rng = np.random.default_rng(self.seed)
+
+        sample_size = min(count, nlist * self.max_train_points)
+        sample = np.asarray(vectors[np.sort(rng.choice(count, sample_size, replace=False))], dtype=np.float32)
+        centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+
+        for _ in range(self.iterations):
+            assignments = self._assign(sample, centroids)
+            sizes = np.bincount(assignments, minlength=nlist)
+            # 按簇排序后用 reduceat 分段求和，比 np.add.at 快得多
+            order = np.argsort(assignments, kind='stable')
+            nonempty = np.flatnonzero(sizes)
+            starts = (np.cumsum(sizes) - sizes)[nonempty]
+            sums = np.zeros_like(centroids)
+            sums[nonempty] = np.add.reduceat(sample[order], starts, axis=0)
+            # 空簇用随机样本重新初始化
+            empty = np.flatnonzero(sizes == 0)
+            if len(empty):
+                sums[empty] = sample[rng.choice(sample_size, len(empty), replace=False)]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            centroids = np.divide(sums, norms, out=centroids, where=norms > 0)
+
+        self.nlist = nlist
+        self.centroids = centroids
+        self._assignments = np.empty(0, dtype=np.int32)
+        self._count = 0
+        self.add(vectors)
+
+    def reset(self):
+        """清除簇中心和全部向量，回到未训练状态"""
+        self.centroids = None
+        self._assignments = np.empty(0, dtype=np.int32)
+        self._count = 0
+        self._sorted_ids = None
+        self._bounds = None
+
+    def add(self, vectors: np.ndarray):
+        """
+        把新向量依次分配到最近的簇，id 紧接已有向量之后
+        Args:
+            vectors: 已归一化的向量矩阵
+        """
+        if not self.is_trained:
+            raise RuntimeError('IVF index is not trained. Call train() first.')
+        assignments = self._assign(vectors, self.centroids)
+        needed = self._count + len(assignments)
+        if needed > self._assignments.shape[0]:
+            grown = np.empty(max(needed, 2 * self._assignments.shape[0]), dtype=np.int32)
+            grown[:self._count] = self._assignments[:self._count]
+            self._assignments = grown
+        self._assignments[self._count:needed] = assignments
+        self._count = needed
+        self._sorted_ids = None
+
+    def candidates(self, query: np.ndarray, nprobe: Optional[int] = None) -> np.ndarray:
+        """
+        返回与查询最接近的 nprobe 个簇中的全部向量 id
+        Args:
+            query: 已归一化的查询向量
+            nprobe: 覆盖实例默认的探查簇数
+        Returns:
+            候选向量 id 数组（升序）
+        """
+        if self._sorted_ids is None:
+            assignments = self._assignments[:self._count]
+            self._sorted_ids = np.argsort(assignments, kind='stable')
+            self._bounds = np.searchsorted(assignments[self._sorted_ids], np.arange(self.nlist + 1))
+
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        centroid_scores = self.centroids @ query
+        probes = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        ids = np.concatenate([self._sorted_ids[self._bounds[c]:self._bounds[c + 1]] for c in probes])
+        ids.sort()
+        return ids
+
+    @staticmethod
+    def _assign(vectors: np.ndarray, centroids: np.ndarray, chunk_size: int = 16384) -> np.ndarray:
+        """分块计算每个向量最接近（内积最大）的簇，避免一次性生成 N×nlist 的大矩阵"""
+        assignments = np.empty(vectors.shape[0], dtype=np.int32)
+        for start in range(0, vectors.shape[0], chunk_size):
+            chunk = np.asarray(vectors[start:start + chunk_size], dtype=np.float32)
+            assignments[start:start + chunk_size] = np.argmax(chunk @ centroids.T, axis=1)
+        return assignments
@@ -0,0 +1,357 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+from EmbeddingRetriever import EmbeddingRetriever
+from Tracer import trace
+from utils import log_title, iter_paragraphs, estimate_tokens
+
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_VERSION = 1
+# 流水线各阶段的名称，依次为：文件发现、读取切分、批量嵌入、批量写入向量库
+PIPELINE_STAGES = ('discover', 'chunk', 'embed', 'insert')
+
+
+class KnowledgeIngestor:
+    """
+    知识库增量导入类
+    为每个文件记录 mtime、大小和内容哈希，为每个段落记录内容哈希及其在向量库中的 id。
+    再次导入时只嵌入新增或修改的段落，并从向量库中删除已不存在的段落
+
+    文件以流式方式逐段读取，可选的 chunker（如 utils.TokenWindowChunker、
+    utils.SentenceChunker）把段落流再切分为检索用的文本块
+
+    导入以 asyncio 流水线执行，各阶段之间用有界队列连接：
+        文件发现 -> 读取切分（线程中执行）-> 批量嵌入 -> 批量写入向量库
+    下游阶段处理不过来时队列写满，上游随之等待（背压），内存占用与知识库大小无关。
+    各阶段同时运行，总耗时接近最慢的阶段单独运行的耗时；
+    每次同步后 pipeline_stats 记录各阶段的处理数量、忙碌时间和吞吐量
+
+    每个文本块在向量库中带有元数据：source（相对路径）、paragraph（块在文件中的序号）
+    和 mtime（文件修改时间），可用于 retrieve(..., filter={'source': ...})
+    """
+    def __init__(self, retriever: EmbeddingRetriever, index_path: Union[str, Path],
+                 compact_ratio: float = 0.5,
+                 chunker: Optional[Callable[[Iterable[str]], Iterable[str]]] = None,
+                 chunk_workers: int = 2, embed_workers: Optional[int] = None, queue_size: int = 256,
+                 batch_wait: float = 0.05):
+        """
+        Args:
+            retriever: 嵌入检索器，新段落通过它嵌入并写入其向量库
+            index_path: 索引目录，向量库和清单文件都保存在这里
+            compact_ratio: 已删除文档占比超过该值时整理向量库
+            chunker: 段落切分器，为 None 时每个段落即为一个文本块
+            chunk_workers: 读取切分阶段的并发数（每个占用一个线程）
+            embed_workers: 嵌入阶段的并发请求数，默认与检索器的 max_concurrency 一致
+            queue_size: 阶段之间每个队列的容量（文件数 / 文本块数 / 批次数）
+            batch_wait: 嵌入阶段凑批时等待更多文本块的最长秒数
+        """
+        self.retriever = retriever
+        self.index_path = Path(index_path)
+        self.compact_ratio = compact_ratio
+        self.chunker = chunker
+        self.chunk_workers = max(1, chunk_workers)
+        self.embed_workers = max(1, embed_workers or retriever.max_concurrency)
+        self.queue_size = queue_size
+        self.batch_wait = batch_wait
+        self.pipeline_stats: Dict[str, Dict[str, float]] = {}
+        self.manifest = self._load_manifest()
+
+    async def sync(self, knowledge_dir: Union[str, Path]) -> Dict[str, int]:
+        """
+        将知识库目录与向量库同步
+        Args:
+            knowledge_dir: 知识库目录
+        Returns:
+            本次同步的统计信息：新增、删除、未变化的段落数以及变化的文件数
+        """
+        knowledge_dir = Path(knowledge_dir)
+        store = self.retriever.vector_store
+        old_files: Dict[str, dict] = self.manifest['files']
+        new_files: Dict[str, dict] = {}
+        to_delete: List[int] = []
+        # 新文本块写入向量库后分配到的 id：(文件相对路径, 块在文件中的序号) -> id
+        assigned: Dict[Tuple[str, int], int] = {}
+        stats = {'added': 0, 'deleted': 0, 'unchanged': 0, 'changed_files': 0}
+        # 切分方式变化后所有文件都要重新切分（内容未变的文本块仍会复用原有向量）
+        rechunk = self.manifest.get('chunker') != repr(self.chunker)
+
+        counters = {stage: {'workers': workers, 'items': 0, 'busy': 0.0}
+                    for stage, workers in zip(PIPELINE_STAGES, (1, self.chunk_workers, self.embed_workers, 1))}
+        paths: asyncio.Queue = asyncio.Queue(self.queue_size)
+        chunks: asyncio.Queue = asyncio.Queue(self.queue_size)
+        batches: asyncio.Queue = asyncio.Queue(self.queue_size)
+
+        async def discover():
+            started = time.perf_counter()
+            files = await asyncio.to_thread(self._scan, knowledge_dir)
+            counters['discover']['busy'] += time.perf_counter() - started
+            for path in files:
+                counters['discover']['items'] += 1
+                await paths.put(path)
+
+        async def chunk():
+            while (path := await paths.get()) is not None:
+                name = path.relative_to(knowledge_dir).as_posix()
+                started = time.perf_counter()
+                entry, unchanged, changed, new_chunks, deleted = await asyncio.to_thread(
+                    self._read_file, path, name, old_files.get(name), rechunk)
+                counters['chunk']['busy'] += time.perf_counter() - started
+                counters['chunk']['items'] += 1
+                new_files[name] = entry
+                stats['unchanged'] += unchanged
+                stats['changed_files'] += changed
+                to_delete.extend(deleted)
+                for i, text in new_chunks:
+                    await chunks.put((name, i, text))
+
+        async def embed():
+            carry, done = None, False
+            while True:
+                item = carry if carry is not None else None if done else await chunks.get()
+                if item is None:
+                    break
+                batch, carry, done = await self._collect_batch(chunks, item)
+                started = time.perf_counter()
+                embeddings = await self.retriever.embed_many([text for _, _, text in batch])
+                counters['embed']['busy'] += time.perf_counter() - started
+                counters['embed']['items'] += len(batch)
+                await batches.put((batch, embeddings))
+
+        async def insert():
+            done = False
+            while not done:
+                item = await batches.get()
+                if item is None:
+                    break
+                # 把队列中已积压的批次合并为一次写入
+                items, embeddings = list(item[0]), list(item[1])
+                while not batches.empty():
+                    item = batches.get_nowait()
+                    if item is None:
+                        done = True
+                        break
+                    items.extend(item[0])
+                    embeddings.extend(item[1])
+                started = time.perf_counter()
+                # 向量库只由本阶段写入，新文本块按写入顺序追加到末尾，id 即为追加时的下标
+                start = len(store.documents)
+                await store.add_embeddings(embeddings, [text for _, _, text in items])
+                for offset, (name, i, _) in enumerate(items):
+                    assigned[(name, i)] = start + offset
+                counters['insert']['busy'] += time.perf_counter() - started
+                counters['insert']['items'] += len(items)
+
+        started = time.perf_counter()
+        with trace('ingest.pipeline') as span:
+            await self._run_pipeline([
+                (discover, 1, paths, self.chunk_workers),
+                (chunk, self.chunk_workers, chunks, self.embed_workers),
+                (embed, self.embed_workers, batches, 1),
+                (insert, 1, None, 0),
+            ])
+            span.set(files=counters['chunk']['items'], texts=counters['insert']['items'])
+        self._report_pipeline(counters, time.perf_counter() - started)
+
+        # 已被删除的文件，其全部段落都要移除
+        for name in old_files.keys() - new_files.keys():
+            to_delete.extend(doc_id for _, doc_id in old_files[name]['paragraphs'])
+
+        # 旧版本建立的索引没有元数据，为所有文件补齐
+        backfill = len(store.documents) > 0 and 'source' not in store.metadata.kinds
+        if not assigned and not to_delete and not rechunk and new_files == old_files and not backfill:
+            return stats
+
+        for (name, i), doc_id in assigned.items():
+            new_files[name]['paragraphs'][i][1] = doc_id
+        # 变化文件中复用的文本块序号可能改变，与新文本块一起更新元数据
+        changed = new_files.keys() if backfill else {name for name, entry in new_files.items()
+                                                    if old_files.get(name) is not entry}
+        for name in changed:
+            entry = new_files[name]
+            for i, (_, doc_id) in enumerate(entry['paragraphs']):
+                store.metadata.update(doc_id, {'source': name, 'paragraph': i, 'mtime': entry['mtime_ns'] / 1e9})
+        if to_delete:
+            store.delete(to_delete)
+        stats['added'], stats['deleted'] = len(assigned), len(to_delete)
+
+        if store.deleted and len(store.deleted) > self.compact_ratio * len(store.documents):
+            remap = store.compact()
+            for entry in new_files.values():
+                for paragraph in entry['paragraphs']:
+                    paragraph[1] = int(remap[paragraph[1]])
+
+        # 清单中的文件按路径排序，与并发处理的完成顺序无关
+        new_files = {name: new_files[name] for name in sorted(new_files)}
+        self.manifest = {'version': MANIFEST_VERSION, 'chunker': repr(self.chunker), 'files': new_files}
+        self.save()
+        return stats
+
+    def _read_file(self, path: Path, name: str, entry: Optional[dict],
+                   rechunk: bool) -> Tuple[dict, int, bool, List[Tuple[int, str]], List[int]]:
+        """
+        在线程中执行：判断文件是否变化，变化时流式读取切分，找出需要重新嵌入的文本块
+        Args:
+            path: 文件路径
+            name: 文件相对知识库目录的路径
+            entry: 该文件在旧清单中的条目，新文件为 None
+            rechunk: 切分方式是否已变化
+        Returns:
+            (新的清单条目, 复用原有向量的文本块数, 文件内容是否变化,
+             待嵌入的 (块序号, 文本) 列表, 不再使用的旧文本块 id 列表)
+        """
+        stat = path.stat()
+        # mtime 和大小都未变化时直接跳过，不读取文件
+        if entry and not rechunk and entry['mtime_ns'] == stat.st_mtime_ns and entry['size'] == stat.st_size:
+            return entry, len(entry['paragraphs']), False, [], []
+
+        content_hash = self._hash_file(path)
+        if entry and not rechunk and entry['sha256'] == content_hash:
+            entry = {**entry, 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+            return entry, len(entry['paragraphs']), False, [], []
+
+        log_title(f'Processing file: {name}')
+        # 旧段落按哈希分组，内容相同的段落复用原有向量
+        reusable: Dict[str, List[int]] = {}
+        for paragraph_hash, doc_id in (entry['paragraphs'] if entry else []):
+            reusable.setdefault(paragraph_hash, []).append(doc_id)
+
+        paragraphs, new_chunks = [], []
+        for i, paragraph in enumerate(self._read_chunks(path)):
+            paragraph_hash = self._hash_text(paragraph)
+            if reusable.get(paragraph_hash):
+                paragraphs.append([paragraph_hash, reusable[paragraph_hash].pop(0)])
+            else:
+                # id 在写入向量库后回填
+                paragraphs.append([paragraph_hash, None])
+                new_chunks.append((i, paragraph))
+        deleted = [doc_id for ids in reusable.values() for doc_id in ids]
+
+        entry = {
+            'mtime_ns': stat.st_mtime_ns,
+            'size': stat.st_size,
+            'sha256': content_hash,
+            'paragraphs': paragraphs,
+        }
+        return entry, len(paragraphs) - len(new_chunks), True, new_chunks, deleted
+
+    async def _collect_batch(self, chunks: asyncio.Queue, first: Tuple[str, int, str]) \
+            -> Tuple[List[Tuple[str, int, str]], Optional[Tuple[str, int, str]], bool]:
+        """
+        从队列中凑出一个嵌入批次，上限与检索器的 batch_size 和 max_batch_tokens 一致；
+        队列暂时为空时最多等待 batch_wait 秒
+        Returns:
+            (批次, 放不进本批次、留给下一批次的文本块, 是否已读到结束标记)
+        """
+        batch, tokens = [first], estimate_tokens(first[2])
+        deadline = time.perf_counter() + self.batch_wait
+        while len(batch) < self.retriever.batch_size:
+            try:
+                item = chunks.get_nowait()
+            except asyncio.QueueEmpty:
+                if time.perf_counter() >= deadline:
+                    break
+                await asyncio.sleep(0.005)
+                continue
+            if item is None:
+                return batch, None, True
+            item_tokens = estimate_tokens(item[2])
+            if tokens + item_tokens > self.retriever.max_batch_tokens:
+                return batch, item, False
+            batch.append(item)
+            tokens += item_tokens
+        return batch, None, False
+
+    @staticmethod
+    async def _run_pipeline(stages: List[Tuple[Callable, int, Optional[asyncio.Queue], int]]):
+        """
+        并发运行流水线的所有阶段
+        每个阶段为 (工作协程函数, 并发数, 输出队列, 下游并发数)：某阶段的全部工作协程结束后，
+        向输出队列放入与下游并发数相同个数的 None 作为结束标记。任一阶段出错时取消其余阶段
+        """
+        async def run_stage(worker, workers, output, downstream):
+            await asyncio.gather(*(worker() for _ in range(workers)))
+            for _ in range(downstream):
+                await output.put(None)
+
+        tasks = [asyncio.create_task(run_stage(*stage)) for stage in stages]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+    def _report_pipeline(self, counters: Dict[str, Dict[str, float]], elapsed: float):
+        """计算各阶段吞吐量并打印统计表；吞吐量按忙碌时间计算，即该阶段单独运行时的处理速度"""
+        for counter in counters.values():
+            busy = counter['busy'] / counter['workers']
+            counter['throughput'] = counter['items'] / busy if busy > 0 else 0.0
+        self.pipeline_stats = {**counters, 'total': {'elapsed': elapsed}}
+
+        log_title('INGEST PIPELINE')
+        print(f"{'stage':<10} {'workers':>7} {'items':>8} {'busy':>9} {'items/s':>10}")
+        for stage, counter in counters.items():
+            print(f"{stage:<10} {counter['workers']:>7} {counter['items']:>8} "
+                  f"{counter['busy']:>8.2f}s {counter['throughput']:>10.1f}")
+        print(f"Total: {elapsed:.2f}s")
+
+    def save(self):
+        """保存向量库和清单；清单记录向量库的文档数，用于加载时校验二者是否一致"""
+        store = self.retriever.vector_store
+        store.save(self.index_path)
+        self.manifest['index_count'] = len(store.documents)
+        manifest_tmp = self.index_path / (MANIFEST_NAME + '.tmp')
+        manifest_tmp.write_text(json.dumps(self.manifest, ensure_ascii=False), encoding='utf-8')
+        os.replace(manifest_tmp, self.index_path / MANIFEST_NAME)
+
+    def _load_manifest(self) -> dict:
+        """
+        读取清单；若清单缺失或与向量库不一致，则清空向量库，从头开始导入
+        """
+        try:
+            manifest = json.loads((self.index_path / MANIFEST_NAME).read_text(encoding='utf-8'))
+        except FileNotFoundError:
+            manifest = None
+
+        store = self.retriever.vector_store
+        if manifest and manifest.get('version') == MANIFEST_VERSION \
+                and manifest.get('index_count') == len(store.documents):
+            return manifest
+
+        if len(store.documents):
+            print('⚠️ Index manifest is missing or out of date, rebuilding the index...')
+            # 原地清空，保留向量库挂载的近似索引、量化器和词法索引等配置
+            store.clear()
+        return {'version': MANIFEST_VERSION, 'chunker': repr(self.chunker), 'files': {}}
+
+    def _read_chunks(self, path: Path) -> Iterable[str]:
+        """流式读取文件的段落，并按配置的切分器切成文本块"""
+        paragraphs = iter_paragraphs(path)
+        return self.chunker(paragraphs) if self.chunker else paragraphs
+
+    @staticmethod
+    def _scan(knowledge_dir: Path) -> List[Path]:
+        """递归列出知识库目录下的所有文件，按路径排序"""
+        files = []
+        for root, dirs, names in os.walk(knowledge_dir):
+            dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+            files.extend(Path(root) / name for name in sorted(names) if not name.startswith('.'))
+        return files
+
+    @staticmethod
+    def _hash_file(path: Path) -> str:
+        """分块计算文件的 SHA-256"""
+        digest = hashlib.sha256()
+        with open(path, 'rb') as file:
+            for block in iter(lambda: file.read(1 << 20), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    @staticmethod
+    def _hash_text(text: str) -> str:
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()[:32]
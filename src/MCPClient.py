@@ -1,7 +1,15 @@
-from typing import List, Dict, Any, Optional
+import asyncio
+from typing import List, Dict, Any, Callable, Optional
 from contextlib import AsyncExitStack
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
+from mcp.types import ToolListChangedNotification
+from ToolResultCache import ToolResultCache
+from Tracer import trace
+
+
+# 正在后台清理的会话任务；asyncio 只弱引用任务，这里保持强引用直到清理完成
+_cleanup_tasks = set()
 
 
 class Tool:
@@ -16,7 +24,8 @@ class Tool:
 
 class MCPClient:
     
-    def __init__(self, name: str, command: str, args: List[str], version: Optional[str] = None):
+    def __init__(self, name: str, command: str, args: List[str], version: Optional[str] = None,
+                 env: Optional[Dict[str, str]] = None, result_cache: Optional[ToolResultCache] = None):
         """
         初始化MCP客户端
         Args:
@@ -24,15 +33,24 @@ class MCPClient:
             command: 服务器命令  
             args: 命令参数列表
             version: 客户端版本号（此参数在当前MCP Python SDK中未使用）
+            env: 服务器进程的环境变量，为 None 时使用 SDK 默认的安全环境变量
+            result_cache: 可选的工具结果缓存，只缓存其白名单中的幂等工具
         """
         self.name = name
         self.version = version or "0.0.1"
         self.command = command
         self.args = args
+        self.env = env
+        self.result_cache = result_cache
         self.session: Optional[ClientSession] = None
-        self.exit_stack = AsyncExitStack()
+        self._session_task: Optional[asyncio.Task] = None
+        self._stop_event: Optional[asyncio.Event] = None
         self.tools: List[Tool] = []
         self._initialized = False  # 初始化状态跟踪
+        self._tools_listeners: List[Callable[['MCPClient'], None]] = []
+        self._refresh_task: Optional[asyncio.Task] = None
+        # 启动被取消（如超时）后在后台清理连接和子进程的任务，close() 时等待其完成
+        self._cleanup_task: Optional[asyncio.Task] = None
     
     async def init(self):
         """初始化客户端连接"""
@@ -51,13 +69,14 @@ class MCPClient:
     async def close(self):
         """关闭客户端连接"""
         if not self._initialized:
+            if self._cleanup_task is not None:
+                await asyncio.gather(self._cleanup_task, return_exceptions=True)
+                self._cleanup_task = None
             return
         try:
-            # 先关闭会话
-            if self.session:
-                self.session = None
-            # 关闭资源管理器，并捕获可能的异常
-            await self.exit_stack.aclose()
+            # 通知后台任务退出会话和 stdio 连接，并等待其清理完成
+            self._stop_event.set()
+            await self._session_task
             
         except Exception as e:
             # 忽略关闭时的异常，因为这通常是由于资源已经被清理导致的
@@ -70,6 +89,58 @@ class MCPClient:
         获取可用工具列表
         """
         return self.tools
+
+    def add_tools_listener(self, callback: Callable[['MCPClient'], None]):
+        """
+        注册工具列表变化的回调，服务器发送 tools/list_changed 通知并重新获取工具后调用；
+        已注册的回调不会重复注册
+        Args:
+            callback: 回调函数，参数为本客户端
+        """
+        if callback not in self._tools_listeners:
+            self._tools_listeners.append(callback)
+
+    def remove_tools_listener(self, callback: Callable[['MCPClient'], None]):
+        """移除已注册的工具列表变化回调"""
+        if callback in self._tools_listeners:
+            self._tools_listeners.remove(callback)
+
+    async def ping(self, timeout: float = 5.0) -> bool:
+        """
+        检查服务器是否仍然存活
+        Args:
+            timeout: 等待响应的超时秒数
+        Returns:
+            服务器在超时内响应 ping 时返回 True
+        """
+        if not self._initialized or not self.session or self._session_task.done():
+            return False
+        try:
+            await asyncio.wait_for(self.session.send_ping(), timeout=timeout)
+            return True
+        except Exception:
+            return False
+
+    async def refresh_tools(self):
+        """重新从服务器获取工具列表，并通知所有监听者"""
+        tools_result = await self.session.list_tools()
+        self.tools = [
+            Tool(
+                name=tool.name,
+                description=tool.description or "",
+                input_schema=tool.inputSchema or {}
+            )
+            for tool in tools_result.tools
+        ]
+        for callback in self._tools_listeners:
+            callback(self)
+
+    async def _handle_message(self, message):
+        """处理服务器推送的消息，工具列表变化时异步刷新工具"""
+        notification = getattr(message, 'root', message)
+        if isinstance(notification, ToolListChangedNotification) and self.session:
+            # 不能在消息处理回调中直接等待请求响应，否则会阻塞消息接收循环
+            self._refresh_task = asyncio.create_task(self.refresh_tools())
     
     async def call_tool(self, name: str, params: Dict[str, Any]):
         """
@@ -80,6 +151,23 @@ class MCPClient:
         Returns:
             工具调用结果
         """
+        with trace('mcp.call_tool', client=self.name, tool=name) as span:
+            if self.result_cache is not None:
+                cached = self.result_cache.get(name, params)
+                span.set(cache_hits=int(cached is not None))
+                if cached is not None:
+                    return cached
+                # 调用期间若有并发的写操作使该工具失效，结果不再写入缓存
+                generation = self.result_cache.generation(name)
+
+            result = await self._call_tool(name, params)
+
+            if self.result_cache is not None:
+                self.result_cache.put(name, params, result, generation)
+            return result
+
+    async def _call_tool(self, name: str, params: Dict[str, Any]):
+        """直接调用服务器上的工具，不经过缓存"""
         if not self.session:
             raise RuntimeError(f"Client {self.name} not initialized. Call init() first.")
         
@@ -93,44 +181,80 @@ class MCPClient:
             raise
     
     async def _connect_to_server(self):
-        """连接到MCP服务器（私有方法）"""
+        """
+        连接到MCP服务器（私有方法）
+        连接的整个生命周期在独立的后台任务中运行：stdio_client 和 ClientSession 基于 anyio 的
+        cancel scope，必须在同一个任务中进入和退出，这样多个客户端才能并发启动、按任意顺序关闭
+        """
         try:
             print(f"Connecting to {self.name} server...")
-            
-            # 创建服务器参数
-            server_params = StdioServerParameters(
-                command=self.command,
-                args=self.args,
-                env=None
-            )
-            
-            # 建立stdio连接
-            stdio_transport = await self.exit_stack.enter_async_context(
-                stdio_client(server_params)
-            )
-            stdio, write = stdio_transport
-            
-            # 创建客户端会话
-            self.session = await self.exit_stack.enter_async_context(
-                ClientSession(stdio, write)
-            )
-            
-            # 初始化会话
-            await self.session.initialize()
-            
-            # 获取工具列表
-            tools_result = await self.session.list_tools()
-            self.tools = [
-                Tool(
-                    name=tool.name,
-                    description=tool.description or "",
-                    input_schema=tool.inputSchema or {}
-                )
-                for tool in tools_result.tools
-            ]
+
+            ready = asyncio.get_running_loop().create_future()
+            self._stop_event = asyncio.Event()
+            self._session_task = asyncio.create_task(self._run_session(ready))
+            try:
+                await ready
+            except asyncio.CancelledError:
+                # 启动被取消（如启动超时）：关闭 stdio 连接、等待子进程退出可能要几秒，
+                # 不在这里等待，否则调用方设置的超时会被拖长；清理在后台完成，close() 时再等待
+                self._session_task.cancel()
+                self._cleanup_task = self._session_task
+                _cleanup_tasks.add(self._cleanup_task)
+                self._cleanup_task.add_done_callback(_cleanup_tasks.discard)
+                raise
+            except BaseException:
+                # 启动失败时后台任务已在退出，等待它清理完子进程
+                self._session_task.cancel()
+                await asyncio.gather(self._session_task, return_exceptions=True)
+                raise
             
             print(f"✅ Connected to {self.name} with tools: {[tool.name for tool in self.tools]}")
             
         except Exception as e:
             print(f"❌ Failed to connect to MCP server {self.name}: {e}")
-            raise
\ No newline at end of file
+            raise
+
+    async def _run_session(self, ready: asyncio.Future):
+        """
+        后台任务：建立连接、初始化会话并获取工具列表，然后保持连接直到 close() 被调用
+        Args:
+            ready: 连接就绪（或失败）时完成的 Future
+        """
+        try:
+            async with AsyncExitStack() as exit_stack:
+                # 创建服务器参数
+                server_params = StdioServerParameters(
+                    command=self.command,
+                    args=self.args,
+                    env=self.env
+                )
+
+                # 建立stdio连接
+                stdio, write = await exit_stack.enter_async_context(
+                    stdio_client(server_params)
+                )
+
+                # 创建客户端会话
+                self.session = await exit_stack.enter_async_context(
+                    ClientSession(stdio, write, message_handler=self._handle_message)
+                )
+
+                # 初始化会话
+                await self.session.initialize()
+
+                # 获取工具列表
+                await self.refresh_tools()
+
+                ready.set_result(None)
+                await self._stop_event.wait()
+        except asyncio.CancelledError:
+            if not ready.done():
+                ready.cancel()
+            raise
+        except BaseException as e:
+            if not ready.done():
+                ready.set_exception(e)
+            else:
+                raise
+        finally:
+            self.session = None
@@ -0,0 +1,251 @@
+import time
+import asyncio
+from typing import Dict, List, Optional, Tuple
+from MCPClient import MCPClient, Tool
+from ToolResultCache import ToolResultCache
+
+# 池中连接的键：(命令, 参数, 环境变量)
+PoolKey = Tuple[str, Tuple[str, ...], Optional[Tuple[Tuple[str, str], ...]]]
+
+
+class _PoolEntry:
+    """池中的一个服务器进程及其借用情况"""
+    def __init__(self, client: MCPClient):
+        self.client = client
+        self.leases = 0
+        self.last_used = time.monotonic()
+        # 进程启动完成（或失败）时完成
+        self.ready: asyncio.Future = asyncio.get_running_loop().create_future()
+        # 防止同一个进程被并发重启
+        self.restart_lock = asyncio.Lock()
+
+
+class MCPPool:
+    """
+    MCP服务器进程池
+    按 (命令, 参数, 环境变量) 保持长期运行的热进程，供多个 Agent 共享同一个会话
+    （MCP 会话本身支持并发请求）。借出前做健康检查，后台定期检查并重启失效的进程，
+    并限制池中进程的总数，超出时淘汰最久未使用的空闲进程。
+
+    使用 pool.client(...) 得到的 PooledMCPClient 可以直接传给 Agent：
+    Agent.init() 时借出，Agent.close() 时归还，进程不会被关闭
+    """
+    def __init__(self, max_processes: int = 8, health_check_interval: float = 30.0,
+                 idle_timeout: Optional[float] = 600.0, check_on_acquire: bool = True):
+        """
+        Args:
+            max_processes: 池中同时运行的服务器进程数上限
+            health_check_interval: 后台健康检查的间隔秒数
+            idle_timeout: 空闲超过该秒数的进程会被关闭，为 None 时一直保留
+            check_on_acquire: 借出前是否先 ping 一次服务器
+        """
+        self.max_processes = max_processes
+        self.health_check_interval = health_check_interval
+        self.idle_timeout = idle_timeout
+        self.check_on_acquire = check_on_acquire
+        self._entries: Dict[PoolKey, _PoolEntry] = {}
+        self._condition = asyncio.Condition()
+        self._health_task: Optional[asyncio.Task] = None
+        self.restarts = 0
+
+    def client(self, name: str, command: str, args: List[str], env: Optional[Dict[str, str]] = None,
+               result_cache: Optional[ToolResultCache] = None) -> 'PooledMCPClient':
+        """
+        创建一个从本池借用连接的客户端
+        Args:
+            name: 客户端名称
+            command: 服务器命令
+            args: 命令参数列表
+            env: 服务器进程的环境变量
+            result_cache: 该客户端（而非共享进程）专用的工具结果缓存
+        """
+        return PooledMCPClient(self, name, command, args, env, result_cache)
+
+    async def acquire(self, name: str, command: str, args: List[str],
+                      env: Optional[Dict[str, str]] = None) -> MCPClient:
+        """
+        借出一个已连接的共享客户端，必要时启动或重启服务器进程
+        池已满且没有空闲进程时等待其他借用者归还
+        Returns:
+            已初始化的 MCPClient，用完后必须调用 release()
+        """
+        key = self._make_key(command, args, env)
+        if self._health_task is None or self._health_task.done():
+            self._health_task = asyncio.create_task(self._health_loop())
+
+        evicted: List[MCPClient] = []
+        async with self._condition:
+            while True:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    entry.leases += 1
+                    starting = False
+                    break
+                if len(self._entries) >= self.max_processes:
+                    idle = [(k, e) for k, e in self._entries.items() if e.leases == 0 and e.ready.done()]
+                    if not idle:
+                        await self._condition.wait()
+                        continue
+                    idle_key, idle_entry = min(idle, key=lambda item: item[1].last_used)
+                    del self._entries[idle_key]
+                    evicted.append(idle_entry.client)
+                    continue
+                entry = _PoolEntry(MCPClient(name, command, list(args), env=env))
+                entry.leases = 1
+                self._entries[key] = entry
+                starting = True
+                break
+
+        for client in evicted:
+            await client.close()
+
+        try:
+            if starting:
+                await self._start(key, entry)
+            else:
+                await asyncio.shield(entry.ready)
+                if self.check_on_acquire and not await entry.client.ping():
+                    await self._restart(entry)
+        except BaseException:
+            await self._release_entry(key, entry)
+            raise
+        return entry.client
+
+    async def release(self, client: MCPClient):
+        """归还借出的客户端，进程保持运行以供复用"""
+        key = self._make_key(client.command, client.args, client.env)
+        entry = self._entries.get(key)
+        if entry is not None and entry.client is client:
+            await self._release_entry(key, entry)
+
+    async def close(self):
+        """关闭池中所有服务器进程"""
+        if self._health_task is not None:
+            self._health_task.cancel()
+            await asyncio.gather(self._health_task, return_exceptions=True)
+            self._health_task = None
+        async with self._condition:
+            entries = list(self._entries.values())
+            self._entries.clear()
+            self._condition.notify_all()
+        await asyncio.gather(*(entry.client.close() for entry in entries), return_exceptions=True)
+
+    def stats(self) -> Dict[str, int]:
+        """返回池中进程数、借出数和累计重启次数"""
+        return {
+            'processes': len(self._entries),
+            'leases': sum(entry.leases for entry in self._entries.values()),
+            'restarts': self.restarts,
+        }
+
+    async def _start(self, key: PoolKey, entry: _PoolEntry):
+        """启动新的服务器进程；失败时从池中移除该条目"""
+        try:
+            await entry.client.init()
+            entry.ready.set_result(None)
+        except BaseException as e:
+            async with self._condition:
+                if self._entries.get(key) is entry:
+                    del self._entries[key]
+                self._condition.notify_all()
+            entry.ready.set_exception(e if isinstance(e, Exception) else RuntimeError('MCP server startup cancelled'))
+            # 没有其他等待者时避免 "Future exception was never retrieved" 警告
+            entry.ready.exception()
+            raise
+
+    async def _restart(self, entry: _PoolEntry):
+        """重启失效的服务器进程；并发的重启请求只会执行一次"""
+        async with entry.restart_lock:
+            if await entry.client.ping():
+                return
+            print(f"⚠️ MCP server {entry.client.name} is not responding, restarting...")
+            await entry.client.close()
+            await entry.client.init()
+            self.restarts += 1
+
+    async def _release_entry(self, key: PoolKey, entry: _PoolEntry):
+        async with self._condition:
+            entry.leases -= 1
+            entry.last_used = time.monotonic()
+            self._condition.notify_all()
+
+    async def _health_loop(self):
+        """后台任务：定期 ping 所有进程，重启失效的进程，关闭空闲过久的进程"""
+        while True:
+            await asyncio.sleep(self.health_check_interval)
+            now = time.monotonic()
+            expired: List[MCPClient] = []
+            async with self._condition:
+                for key, entry in list(self._entries.items()):
+                    if self.idle_timeout is not None and entry.leases == 0 and entry.ready.done() \
+                            and now - entry.last_used > self.idle_timeout:
+                        del self._entries[key]
+                        expired.append(entry.client)
+                if expired:
+                    self._condition.notify_all()
+                entries = [entry for entry in self._entries.values() if entry.ready.done()]
+
+            await asyncio.gather(*(client.close() for client in expired), return_exceptions=True)
+            for entry, alive in zip(entries, await asyncio.gather(*(e.client.ping() for e in entries))):
+                if not alive:
+                    try:
+                        await self._restart(entry)
+                    except Exception as e:
+                        print(f"❌ Failed to restart MCP server {entry.client.name}: {e}")
+
+    @staticmethod
+    def _make_key(command: str, args: List[str], env: Optional[Dict[str, str]]) -> PoolKey:
+        return command, tuple(args), tuple(sorted(env.items())) if env is not None else None
+
+
+class PooledMCPClient(MCPClient):
+    """
+    从 MCPPool 借用连接的MCP客户端，接口与 MCPClient 一致
+    init() 从池中借出共享的热连接，close() 将其归还而不关闭服务器进程
+    """
+    def __init__(self, pool: MCPPool, name: str, command: str, args: List[str],
+                 env: Optional[Dict[str, str]] = None, result_cache: Optional[ToolResultCache] = None):
+        super().__init__(name, command, args, env=env, result_cache=result_cache)
+        self.pool = pool
+        self._shared: Optional[MCPClient] = None
+
+    async def init(self):
+        """从池中借出连接"""
+        if self._shared is not None:
+            print(f"The {self.name} has been initialized. Skip it")
+            return
+        self._shared = await self.pool.acquire(self.name, self.command, self.args, self.env)
+        for callback in self._tools_listeners:
+            self._shared.add_tools_listener(callback)
+        self._initialized = True
+
+    async def close(self):
+        """把连接归还给池"""
+        if self._shared is None:
+            return
+        for callback in self._tools_listeners:
+            self._shared.remove_tools_listener(callback)
+        shared, self._shared = self._shared, None
+        self._initialized = False
+        await self.pool.release(shared)
+
+    def get_tools(self) -> List[Tool]:
+        return self._shared.get_tools() if self._shared is not None else []
+
+    def add_tools_listener(self, callback):
+        super().add_tools_listener(callback)
+        if self._shared is not None:
+            self._shared.add_tools_listener(callback)
+
+    def remove_tools_listener(self, callback):
+        super().remove_tools_listener(callback)
+        if self._shared is not None:
+            self._shared.remove_tools_listener(callback)
+
+    async def ping(self, timeout: float = 5.0) -> bool:
+        return self._shared is not None and await self._shared.ping(timeout)
+
+    async def _call_tool(self, name: str, params):
+        if self._shared is None:
+            raise RuntimeError(f"Client {self.name} not initialized. Call init() first.")
+        return await self._shared.call_tool(name, params)
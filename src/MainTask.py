@@ -3,13 +3,27 @@ import os
 import asyncio
 from pathlib import Path
 from MCPClient import MCPClient
+from ToolResultCache import ToolResultCache
+from TokenBudget import TokenBudget
 from Agent import Agent
 from EmbeddingRetriever import EmbeddingRetriever
-from utils import log_title, read_paragraphs
+from EmbeddingCache import EmbeddingCache
+from VectorStore import VectorStore
+from BM25Index import BM25Index
+from KnowledgeIngestor import KnowledgeIngestor
+from Tracer import Tracer, SpanCollector, JsonlExporter, set_tracer, trace
+from EventSink import ConsoleSink, NullSink
+from utils import log_title
 
 # 常量定义
 URL = 'https://news.ycombinator.com/'
 OUT_PATH = Path.cwd() / 'output'
+KNOWLEDGE_PATH = Path.cwd() / 'knowledge'
+INDEX_PATH = Path.cwd() / 'index'
+CACHE_PATH = Path.cwd() / 'cache' / 'embeddings.sqlite'
+TRACE_PATH = Path.cwd() / 'traces' / 'spans.jsonl'
+# 对话、工具调用和检索上下文的输出；AGENT_OUTPUT=null 时不输出（例如由上层进程托管、stdout 被管道接收时）
+OUTPUT = NullSink() if os.getenv('AGENT_OUTPUT') == 'null' else ConsoleSink()
 TASK = f"""
 先从我给你的context中找到相关信息，接着找出郭靖干的最多的事情，
 把郭靖干的最多的事情保存到{OUT_PATH}/guojing.md,输出一个漂亮md文件
@@ -17,49 +31,74 @@ TASK = f"""
 
 # MCP 客户端初始化
 # fetch_mcp = MCPClient("mcp-server-fetch", "uvx", ['mcp-server-fetch'])
-file_mcp = MCPClient("mcp-server-file", "npx", ['-y', '@modelcontextprotocol/server-filesystem', str(OUT_PATH)])
+# 文件系统的只读工具结果可缓存，写操作会使相关路径的缓存失效
+file_cache = ToolResultCache(
+    cacheable={'read_file': 60, 'read_multiple_files': 60, 'list_directory': 60, 'get_file_info': 60},
+    invalidates={
+        tool: ['read_file', 'read_multiple_files', 'list_directory', 'get_file_info']
+        for tool in ('write_file', 'edit_file', 'create_directory', 'move_file')
+    },
+)
+file_mcp = MCPClient("mcp-server-file", "npx", ['-y', '@modelcontextprotocol/server-filesystem', str(OUT_PATH)],
+                     result_cache=file_cache)
 
 async def main():
     """主函数：执行 RAG 检索和 Agent 任务"""
-    # RAG 检索上下文
-    context = await retrieve_context()
+    # 追踪各阶段耗时：span 写入 JSONL 文件，同时保存在进程内用于打印汇总
+    collector = SpanCollector()
+    tracer = Tracer(collector, JsonlExporter(TRACE_PATH))
+    set_tracer(tracer)
 
-    # 创建并运行 Agent
-    # agent = Agent('qwen3-235b-a22b', [fetch_mcp, file_mcp], '', context)
-    agent = Agent('qwen3-235b-a22b', [file_mcp], '', context)
+    with trace('main_task') as span:
+        # RAG 检索上下文
+        context = await retrieve_context()
 
-    await agent.init()
-    await agent.invoke(TASK)
-    await agent.close()
+        # 创建并运行 Agent
+        # agent = Agent('qwen3-235b-a22b', [fetch_mcp, file_mcp], '', context)
+        agent = Agent('qwen3-235b-a22b', [file_mcp], '', context, token_budget=TokenBudget(max_tokens=32000),
+                      sink=OUTPUT)
+
+        await agent.init()
+        await agent.invoke(TASK)
+        await agent.close()
+
+    log_title('TRACE')
+    print(collector.flamegraph(span.trace_id))
+    set_tracer(None)
+    tracer.close()
 
 async def retrieve_context():
     """
     检索相关上下文信息
     使用 RAG (Retrieval-Augmented Generation) 从知识库中检索相关文档
     """
-    # 初始化嵌入检索器
-    embedding_retriever = EmbeddingRetriever("BAAI/bge-m3")
-    
-    # 读取知识库目录中的所有文件
-    knowledge_dir = Path.cwd() / 'knowledge'
-    files = os.listdir(knowledge_dir)
-    
-    # 将每个文件的内容添加到嵌入数据库
-    for file in files:
-        log_title(f'Processing file: {file}')
-        paragraphs = read_paragraphs(file)
-        for i in range(len(paragraphs)):
-            print(f'Embedding paragraph {i + 1}/{len(paragraphs)}...')
-            content = paragraphs[i]
-            await embedding_retriever.embed_document(content)
-    
-    # 基于任务检索最相关的文档片段
-    retrieved_docs = await embedding_retriever.retrieve(TASK, top_k=5)
+    # 优先加载磁盘上已构建的向量索引，避免重复调用嵌入API；同时挂载 BM25 词法索引用于混合检索
+    lexical_index = BM25Index()
+    if VectorStore.exists(INDEX_PATH):
+        vector_store = VectorStore.load(INDEX_PATH, lexical_index=lexical_index)
+    else:
+        vector_store = VectorStore(lexical_index=lexical_index)
+
+    # 初始化嵌入检索器（共享连接池，结束时自动关闭）
+    embedding_cache = EmbeddingCache(CACHE_PATH)
+
+    async with EmbeddingRetriever("BAAI/bge-m3", vector_store=vector_store, cache=embedding_cache,
+                                  retrieval_mode='hybrid') as embedding_retriever:
+        # 增量同步知识库：只嵌入新增或修改的段落，删除已不存在的段落
+        ingestor = KnowledgeIngestor(embedding_retriever, INDEX_PATH)
+        stats = await ingestor.sync(KNOWLEDGE_PATH)
+        log_title(f'Index synced: {len(embedding_retriever.vector_store)} documents')
+        print(f'Ingestion: {stats}')
+
+        # 基于任务检索最相关的文档片段
+        retrieved_docs = await embedding_retriever.retrieve(TASK, top_k=5)
+
+    print(f'Embedding cache: {embedding_cache.stats()}')
+    embedding_cache.close()
     context = '\n'.join(retrieved_docs)
     
     # 显示检索到的上下文
-    log_title('CONTEXT')
-    print(context)
+    OUTPUT.emit({'type': 'context', 'content': context})
     
     return context
 
@@ -0,0 +1,288 @@
+import os
+import bisect
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+import numpy as np
+
+# 字段类型：字符串（字典编码）、数值、标签（多值字符串）
+CATEGORICAL, NUMERIC, TAGS = 'categorical', 'numeric', 'tags'
+# 过滤条件支持的比较运算符
+COMPARISONS = {
+    '$eq': np.equal, '$ne': np.not_equal,
+    '$gt': np.greater, '$gte': np.greater_equal, '$lt': np.less, '$lte': np.less_equal,
+}
+
+
+class MetadataIndex:
+    """
+    文档元数据的列式存储与过滤索引
+    每个字段是一列与文档 id 对齐的紧凑数组，字段类型由第一次出现的取值决定：
+      - 字符串（如 source、namespace）：字典编码为 int32 列，缺失为 -1
+      - 数值（如 paragraph、mtime）：float64 列，缺失为 NaN
+      - 字符串列表（如 tags）：每个标签一个倒排表（升序 id 列表）
+
+    filter() 把过滤条件计算为长度为文档数的布尔位图，VectorStore 据此在打分前裁剪候选。
+    过滤条件是字段到条件的字典，多个字段之间为“与”：
+        {'source': 'Chapter1.txt'}                    等于
+        {'source': ['a.txt', 'b.txt']}                属于其一（等价于 {'$in': [...]}）
+        {'paragraph': {'$gte': 10, '$lt': 20}}        比较，支持 $eq $ne $gt $gte $lt $lte $in
+        {'tags': 'battle'} / {'tags': {'$all': [...]}}  含任一标签 / 含全部标签
+    """
+    def __init__(self):
+        self.count = 0
+        self.kinds: Dict[str, str] = {}
+        # 字符串字段：取值列表与取值到编码的映射
+        self._values: Dict[str, List[str]] = {}
+        self._codes: Dict[str, Dict[str, int]] = {}
+        # 标签字段：标签 -> 文档 id 列表
+        self._postings: Dict[str, Dict[str, List[int]]] = {}
+        self._columns: Dict[str, np.ndarray] = {}
+        # 字符串字段取值相等的位图缓存（如 namespace），重复的过滤条件无需再扫描列；数据变化时清空
+        self._bitmaps: Dict[tuple, np.ndarray] = {}
+
+    def add(self, metadatas: List[Optional[Dict[str, Any]]]):
+        """
+        追加文档的元数据，id 紧接已有文档之后
+        Args:
+            metadatas: 与新文档一一对应的元数据字典，可以为 None
+        """
+        start = self.count
+        self.resize(start + len(metadatas))
+        try:
+            for offset, metadata in enumerate(metadatas):
+                self.update(start + offset, metadata or {})
+        except Exception:
+            # 字段类型不一致时撤销本批次，保持与向量库的文档数一致
+            self.resize(start)
+            raise
+
+    def update(self, doc_id: int, metadata: Dict[str, Any]):
+        """
+        设置单个文档的字段取值；字符串和数值字段覆盖原值，标签字段追加标签
+        Args:
+            doc_id: 文档 id
+            metadata: 字段到取值的映射，取值为 None 的字段被忽略
+        """
+        if not 0 <= doc_id < self.count:
+            raise IndexError(f'document id {doc_id} out of range')
+        self._bitmaps.clear()
+        for field, value in metadata.items():
+            if value is None:
+                continue
+            kind = self._field_kind(field, value)
+            if kind == TAGS:
+                postings = self._postings[field]
+                for tag in dict.fromkeys(str(tag) for tag in value):
+                    ids = postings.setdefault(tag, [])
+                    if not self._contains(ids, doc_id):
+                        bisect.insort(ids, doc_id)
+            elif kind == CATEGORICAL:
+                self._columns[field][doc_id] = self._encode(field, str(value))
+            else:
+                self._columns[field][doc_id] = float(value)
+
+    def get(self, doc_id: int) -> Dict[str, Any]:
+        """还原单个文档的元数据（标签字段需要扫描倒排表，只适合展示结果时使用）"""
+        metadata = {}
+        for field, kind in self.kinds.items():
+            if kind == TAGS:
+                tags = [tag for tag, ids in self._postings[field].items() if self._contains(ids, doc_id)]
+                if tags:
+                    metadata[field] = tags
+            elif kind == CATEGORICAL:
+                code = self._columns[field][doc_id]
+                if code >= 0:
+                    metadata[field] = self._values[field][code]
+            elif not np.isnan(self._columns[field][doc_id]):
+                value = float(self._columns[field][doc_id])
+                metadata[field] = int(value) if value.is_integer() else value
+        return metadata
+
+    def filter(self, conditions: Dict[str, Any]) -> np.ndarray:
+        """
+        计算满足全部条件的文档位图
+        Args:
+            conditions: 过滤条件，格式见类说明
+        Returns:
+            长度为文档数的布尔数组
+        """
+        mask = np.ones(self.count, dtype=bool)
+        for field, condition in conditions.items():
+            mask &= self._field_mask(field, condition)
+        return mask
+
+    def take(self, ids: np.ndarray) -> 'MetadataIndex':
+        """按给定的旧 id 顺序取出子集，得到重新编号的新索引（用于 compact）"""
+        taken = MetadataIndex()
+        taken.count = len(ids)
+        taken.kinds = dict(self.kinds)
+        taken._values = {field: list(values) for field, values in self._values.items()}
+        taken._codes = {field: dict(codes) for field, codes in self._codes.items()}
+        taken._columns = {field: column[ids] for field, column in self._columns.items()}
+        remap = np.full(self.count, -1, dtype=np.int64)
+        remap[ids] = np.arange(len(ids))
+        for field, postings in self._postings.items():
+            taken._postings[field] = {}
+            for tag, tag_ids in postings.items():
+                new_ids = remap[tag_ids]
+                new_ids = np.sort(new_ids[new_ids >= 0])
+                if len(new_ids):
+                    taken._postings[field][tag] = new_ids.tolist()
+        return taken
+
+    def resize(self, count: int):
+        """把所有列调整到 count 行：截断多余的行，新行为缺失值"""
+        self._bitmaps.clear()
+        for field, kind in self.kinds.items():
+            if kind == TAGS:
+                if count < self.count:
+                    for tag, ids in self._postings[field].items():
+                        self._postings[field][tag] = [doc_id for doc_id in ids if doc_id < count]
+                continue
+            column = self._columns[field]
+            if count > column.shape[0]:
+                grown = np.full(max(count, 2 * column.shape[0]), -1 if kind == CATEGORICAL else np.nan,
+                                dtype=column.dtype)
+                grown[:self.count] = column[:self.count]
+                self._columns[field] = grown
+            elif count < self.count:
+                column[count:self.count] = -1 if kind == CATEGORICAL else np.nan
+        self.count = count
+
+    def save(self, file: Union[str, Path]):
+        """以 npz 格式整体写出（先写临时文件再替换）"""
+        arrays = {'count': np.array(self.count)}
+        for field, kind in self.kinds.items():
+            arrays[f'{kind}:{field}'] = np.array(0)
+            if kind == TAGS:
+                postings = self._postings[field]
+                arrays[f'tags:{field}:values'] = np.array(list(postings), dtype=str)
+                arrays[f'tags:{field}:bounds'] = np.cumsum([0] + [len(ids) for ids in postings.values()])
+                arrays[f'tags:{field}:ids'] = np.array([i for ids in postings.values() for i in ids], dtype=np.int64)
+            else:
+                arrays[f'column:{field}'] = self._columns[field][:self.count]
+                if kind == CATEGORICAL:
+                    arrays[f'values:{field}'] = np.array(self._values[field], dtype=str)
+        file = Path(file)
+        tmp = file.with_name(file.name + '.tmp')
+        with open(tmp, 'wb') as handle:
+            np.savez(handle, **arrays)
+        os.replace(tmp, file)
+
+    @classmethod
+    def load(cls, file: Union[str, Path], count: int) -> 'MetadataIndex':
+        """
+        读取 save() 写出的文件，并调整到 count 行（与向量库的文档数对齐）
+        文件不存在时返回全部缺失的索引
+        """
+        index = cls()
+        if Path(file).is_file():
+            with np.load(file) as arrays:
+                index.count = int(arrays['count'])
+                for key in arrays.files:
+                    kind, _, field = key.partition(':')
+                    if kind not in (CATEGORICAL, NUMERIC, TAGS) or ':' in field:
+                        continue
+                    index.kinds[field] = kind
+                    if kind == TAGS:
+                        bounds, ids = arrays[f'tags:{field}:bounds'], arrays[f'tags:{field}:ids']
+                        index._postings[field] = {
+                            str(tag): ids[bounds[i]:bounds[i + 1]].tolist()
+                            for i, tag in enumerate(arrays[f'tags:{field}:values'])
+                        }
+                    else:
+                        index._columns[field] = arrays[f'column:{field}'].copy()
+                        if kind == CATEGORICAL:
+                            index._values[field] = [str(value) for value in arrays[f'values:{field}']]
+                            index._codes[field] = {value: i for i, value in enumerate(index._values[field])}
+        index.resize(count)
+        return index
+
+    def _field_kind(self, field: str, value: Any) -> str:
+        """返回字段类型，字段第一次出现时根据取值确定类型并建列"""
+        if isinstance(value, (list, tuple, set)):
+            kind = TAGS
+        else:
+            kind = CATEGORICAL if isinstance(value, str) else NUMERIC
+        existing = self.kinds.get(field)
+        if existing is not None:
+            if existing != kind:
+                raise TypeError(f"Metadata field '{field}' is {existing}, got {type(value).__name__}")
+            return kind
+
+        if kind == TAGS:
+            self._postings[field] = {}
+        else:
+            if kind == CATEGORICAL:
+                self._values[field], self._codes[field] = [], {}
+            self._columns[field] = np.full(max(self.count, 1024), -1 if kind == CATEGORICAL else np.nan,
+                                           dtype=np.int32 if kind == CATEGORICAL else np.float64)
+        self.kinds[field] = kind
+        return kind
+
+    def _encode(self, field: str, value: str) -> int:
+        codes = self._codes[field]
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(self._values[field])
+            self._values[field].append(value)
+        return code
+
+    def _field_mask(self, field: str, condition: Any) -> np.ndarray:
+        """计算单个字段条件的位图；不存在的字段视为全部缺失"""
+        if not isinstance(condition, dict):
+            condition = {'$in': list(condition)} if isinstance(condition, (list, tuple, set)) else {'$eq': condition}
+        kind = self.kinds.get(field)
+        if kind is None:
+            return np.full(self.count, set(condition) == {'$ne'}, dtype=bool)
+        mask = np.ones(self.count, dtype=bool)
+        for operator, operand in condition.items():
+            if kind == TAGS:
+                mask &= self._tags_mask(field, operator, operand)
+            elif operator == '$in':
+                mask &= np.logical_or.reduce([self._compare(field, kind, '$eq', value) for value in operand]) \
+                    if operand else np.zeros(self.count, dtype=bool)
+            elif operator in COMPARISONS:
+                mask &= self._compare(field, kind, operator, operand)
+            else:
+                raise ValueError(f"Unsupported filter operator for '{field}': {operator}")
+        return mask
+
+    def _compare(self, field: str, kind: str, operator: str, operand: Any) -> np.ndarray:
+        column = self._columns[field][:self.count]
+        if kind == CATEGORICAL:
+            if operator not in ('$eq', '$ne'):
+                raise ValueError(f"Operator {operator} is not supported on string field '{field}'")
+            # 未出现过的取值编码为 -2，不会与任何文档（含缺失值 -1）相等
+            code = self._codes[field].get(str(operand), -2)
+            bitmap = self._bitmaps.get((field, code))
+            if bitmap is None:
+                bitmap = self._bitmaps[(field, code)] = column == code
+            return ~bitmap if operator == '$ne' else bitmap
+        with np.errstate(invalid='ignore'):
+            return COMPARISONS[operator](column, float(operand))
+
+    def _tags_mask(self, field: str, operator: str, operand: Any) -> np.ndarray:
+        """标签条件：用倒排表直接置位，不扫描列"""
+        tags = [operand] if isinstance(operand, str) else list(operand)
+        postings = self._postings[field]
+        if operator in ('$eq', '$in'):
+            mask = np.zeros(self.count, dtype=bool)
+            for tag in tags:
+                mask[postings.get(str(tag), [])] = True
+            return mask
+        if operator == '$all':
+            mask = np.ones(self.count, dtype=bool)
+            for tag in tags:
+                tag_mask = np.zeros(self.count, dtype=bool)
+                tag_mask[postings.get(str(tag), [])] = True
+                mask &= tag_mask
+            return mask
+        if operator == '$ne':
+            return ~self._tags_mask(field, '$in', tags)
+        raise ValueError(f"Unsupported filter operator for tags field '{field}': {operator}")
+
+    @staticmethod
+    def _contains(ids: List[int], doc_id: int) -> bool:
+        position = bisect.bisect_left(ids, doc_id)
+        return position < len(ids) and ids[position] == doc_id
@@ -0,0 +1,261 @@
+from typing import Optional
+import numpy as np
+
+
+class Quantizer:
+    """
+    向量量化器的基类
+    量化器在内存中保存所有向量的压缩编码（id 与 VectorStore 一致），搜索时直接在编码上
+    计算近似内积；VectorStore 再用全精度向量对近似结果的前若干名做精确重排。
+
+    子类实现 _encode() 和 _decode_chunk()（或直接覆盖 scores()），需要训练的子类覆盖 _fit()。
+    量化器与 IVFIndex 一样不随 VectorStore.save() 持久化，加载后需重新训练
+    """
+    # 按块解码/打分的行数，避免一次性生成 N×维度 的 float32 临时矩阵
+    chunk_size = 16384
+
+    def __init__(self):
+        self.codes: Optional[np.ndarray] = None
+        self._count = 0
+        self._trained = False
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def is_trained(self) -> bool:
+        return self._trained
+
+    @property
+    def bytes_per_vector(self) -> float:
+        """每个向量的编码占用的字节数（含缩放系数等附加数据）"""
+        raise NotImplementedError
+
+    def train(self, vectors: np.ndarray):
+        """
+        训练量化器（如 PQ 的码本），并把 vectors 编码为 id 0..N-1
+        Args:
+            vectors: 已归一化的向量矩阵
+        """
+        if vectors.shape[0] == 0:
+            raise ValueError('Cannot train a quantizer on an empty vector set')
+        self._fit(vectors)
+        self._trained = True
+        self.codes = None
+        self._count = 0
+        self.add(vectors)
+
+    def reset(self):
+        """清除训练结果和全部编码，回到未训练状态"""
+        self._trained = False
+        self.codes = None
+        self._count = 0
+
+    def add(self, vectors: np.ndarray):
+        """
+        编码新向量，id 紧接已有向量之后
+        Args:
+            vectors: 已归一化的向量矩阵
+        """
+        if not self._trained:
+            raise RuntimeError('Quantizer is not trained. Call train() first.')
+        codes = [self._encode(np.asarray(vectors[start:start + self.chunk_size], dtype=np.float32))
+                 for start in range(0, vectors.shape[0], self.chunk_size)]
+        if not codes:
+            return
+        codes = np.concatenate(codes)
+        needed = self._count + codes.shape[0]
+        if self.codes is None:
+            self.codes = np.empty((max(needed, 1024),) + codes.shape[1:], dtype=codes.dtype)
+        elif needed > self.codes.shape[0]:
+            grown = np.empty((max(needed, 2 * self.codes.shape[0]),) + codes.shape[1:], dtype=codes.dtype)
+            grown[:self._count] = self.codes[:self._count]
+            self.codes = grown
+        self.codes[self._count:needed] = codes
+        self._count = needed
+
+    def scores(self, query: np.ndarray, ids: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        计算查询向量与已编码向量的近似内积
+        Args:
+            query: 已归一化的查询向量
+            ids: 只计算这些 id 的分数，为 None 时计算全部
+        Returns:
+            近似分数数组，与 ids（或全部 id）一一对应
+        """
+        codes = self.codes[:self._count] if ids is None else self.codes[ids]
+        scores = np.empty(codes.shape[0], dtype=np.float32)
+        for start in range(0, codes.shape[0], self.chunk_size):
+            end = start + self.chunk_size
+            scores[start:end] = self._decode_chunk(codes[start:end]) @ query
+        return scores
+
+    def _fit(self, vectors: np.ndarray):
+        pass
+
+    def _encode(self, vectors: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def _decode_chunk(self, codes: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+
+class Float16Quantizer(Quantizer):
+    """
+    半精度存储：每维 2 字节，精度损失极小，通常不需要重排
+    numpy 没有 float16 的 BLAS 内核，打分时需要逐块转换，速度慢于 float32 和 int8
+    """
+
+    def __repr__(self) -> str:
+        return 'Float16Quantizer()'
+
+    @property
+    def bytes_per_vector(self) -> float:
+        return 2.0 * (self.codes.shape[1] if self.codes is not None else 0)
+
+    def _encode(self, vectors: np.ndarray) -> np.ndarray:
+        return vectors.astype(np.float16)
+
+    def _decode_chunk(self, codes: np.ndarray) -> np.ndarray:
+        # numpy 的 float16 矩阵乘法没有 BLAS 加速，按块转换为 float32 再计算
+        return codes.astype(np.float32)
+
+
+class Int8Quantizer(Quantizer):
+    """
+    逐向量缩放的 int8 标量量化：每维 1 字节，另加每个向量一个 float32 缩放系数
+    x ≈ codes * scale，其中 scale = max(|x|) / 127
+    """
+    def __init__(self):
+        super().__init__()
+        self.scales = np.empty(0, dtype=np.float32)
+
+    def __repr__(self) -> str:
+        return 'Int8Quantizer()'
+
+    @property
+    def bytes_per_vector(self) -> float:
+        return (self.codes.shape[1] if self.codes is not None else 0) + 4.0
+
+    def add(self, vectors: np.ndarray):
+        start = self._count
+        super().add(vectors)
+        if self.scales.shape[0] < self.codes.shape[0]:
+            grown = np.empty(self.codes.shape[0], dtype=np.float32)
+            grown[:start] = self.scales[:start]
+            self.scales = grown
+        for offset in range(0, vectors.shape[0], self.chunk_size):
+            chunk = np.asarray(vectors[offset:offset + self.chunk_size], dtype=np.float32)
+            self.scales[start + offset:start + offset + chunk.shape[0]] = self._scales(chunk)
+
+    def train(self, vectors: np.ndarray):
+        self.scales = np.empty(0, dtype=np.float32)
+        super().train(vectors)
+
+    def reset(self):
+        super().reset()
+        self.scales = np.empty(0, dtype=np.float32)
+
+    def scores(self, query: np.ndarray, ids: Optional[np.ndarray] = None) -> np.ndarray:
+        # 先对整数编码做内积，再统一乘以各自的缩放系数
+        raw = super().scores(query, ids)
+        return raw * (self.scales[:self._count] if ids is None else self.scales[ids])
+
+    def _encode(self, vectors: np.ndarray) -> np.ndarray:
+        scales = self._scales(vectors)[:, None]
+        return np.rint(np.divide(vectors, scales, out=np.zeros_like(vectors), where=scales > 0)).astype(np.int8)
+
+    def _decode_chunk(self, codes: np.ndarray) -> np.ndarray:
+        return codes.astype(np.float32)
+
+    @staticmethod
+    def _scales(vectors: np.ndarray) -> np.ndarray:
+        return np.abs(vectors).max(axis=1) / 127
+
+
+class ProductQuantizer(Quantizer):
+    """
+    乘积量化（PQ）：把向量切成 m 个子空间，每个子空间用 256 个中心的 k-means 码本编码为 1 字节，
+    每个向量只占 m 字节。搜索时使用非对称距离计算（ADC）：先算出查询在每个子空间与
+    全部中心的内积表（m×256），向量的近似分数即为按编码查表求和，无需解码向量
+    """
+    def __init__(self, m: int = 64, iterations: int = 10, max_train_points: int = 32768, seed: int = 0):
+        """
+        Args:
+            m: 子空间数量，维度必须能被 m 整除；m 越大精度越高、占用越大
+            iterations: 每个子空间 k-means 的迭代次数
+            max_train_points: 训练码本时最多使用的样本数
+            seed: 随机种子，保证训练结果可复现
+        """
+        super().__init__()
+        self.m = m
+        self.iterations = iterations
+        self.max_train_points = max_train_points
+        self.seed = seed
+        # 码本，形状为 (m, 中心数, 子空间维度)；中心数为 256，训练样本不足 256 个时等于样本数
+        self.codebooks: Optional[np.ndarray] = None
+
+    def __repr__(self) -> str:
+        return f'ProductQuantizer(m={self.m})'
+
+    @property
+    def bytes_per_vector(self) -> float:
+        return float(self.m)
+
+    def reset(self):
+        super().reset()
+        self.codebooks = None
+
+    def scores(self, query: np.ndarray, ids: Optional[np.ndarray] = None) -> np.ndarray:
+        # ADC 查找表：table[j, c] = 查询第 j 段与第 j 个码本中第 c 个中心的内积
+        table = np.einsum('jcd,jd->jc', self.codebooks, query.reshape(self.m, -1))
+        codes = self.codes[:self._count] if ids is None else self.codes[ids]
+        scores = np.empty(codes.shape[0], dtype=np.float32)
+        columns = np.arange(self.m)
+        for start in range(0, codes.shape[0], self.chunk_size):
+            chunk = codes[start:start + self.chunk_size]
+            scores[start:start + chunk.shape[0]] = table[columns, chunk].sum(axis=1)
+        return scores
+
+    def _fit(self, vectors: np.ndarray):
+        count, dimension = vectors.shape
+        if dimension % self.m:
+            raise ValueError(f'Dimension {dimension} is not divisible by m={self.m}')
+        rng = np.random.default_rng(self.seed)
+        sample_size = min(count, self.max_train_points)
+        sample = np.asarray(vectors[np.sort(rng.choice(count, sample_size, replace=False))], dtype=np.float32)
+        sub = dimension // self.m
+        # 样本不足 256 个时只训练与样本数相同的中心，不留下可被编码选中的全零中心
+        centers = min(256, sample_size)
+
+        codebooks = np.empty((self.m, centers, sub), dtype=np.float32)
+        for j in range(self.m):
+            part = np.ascontiguousarray(sample[:, j * sub:(j + 1) * sub])
+            codebook = part[rng.choice(sample_size, centers, replace=False)].copy()
+            for _ in range(self.iterations):
+                labels = self._nearest(part, codebook)
+                sizes = np.bincount(labels, minlength=centers)
+                nonempty = sizes > 0
+                # 与 IVFIndex 相同，按簇排序后用 reduceat 分段求和
+                order = np.argsort(labels, kind='stable')
+                starts = (np.cumsum(sizes) - sizes)[nonempty]
+                codebook[nonempty] = np.add.reduceat(part[order], starts, axis=0) / sizes[nonempty, None]
+                # 空簇用随机样本重新初始化
+                empty = np.flatnonzero(~nonempty)
+                if len(empty):
+                    codebook[empty] = part[rng.choice(sample_size, len(empty), replace=False)]
+            codebooks[j] = codebook
+        self.codebooks = codebooks
+
+    def _encode(self, vectors: np.ndarray) -> np.ndarray:
+        sub = vectors.shape[1] // self.m
+        codes = np.empty((vectors.shape[0], self.m), dtype=np.uint8)
+        for j in range(self.m):
+            codes[:, j] = self._nearest(np.ascontiguousarray(vectors[:, j * sub:(j + 1) * sub]), self.codebooks[j])
+        return codes
+
+    @staticmethod
+    def _nearest(points: np.ndarray, codebook: np.ndarray) -> np.ndarray:
+        """欧氏距离最近的中心：||x - c||² 中与 x 无关的部分为 ||c||² - 2x·c"""
+        distances = (codebook ** 2).sum(axis=1) - 2 * points @ codebook.T
+        return np.argmin(distances, axis=1)
@@ -0,0 +1,247 @@
+import os
+import asyncio
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from VectorStore import VectorStore
+
+
+def _local_top_k(scores: np.ndarray, deleted: np.ndarray, top_k: int, start: int,
+                 allowed: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """取分片内未删除且满足过滤条件的前K个 (全局 id, 分数)"""
+    scores[deleted] = -np.inf
+    if allowed is not None:
+        scores[~allowed] = -np.inf
+    top = VectorStore._top_k_indices(scores, min(top_k, scores.shape[0]))
+    top = top[scores[top] > -np.inf]
+    return top + start, scores[top]
+
+
+def _shard_worker(conn, matrix_name: str, mask_name: str, shape: Tuple[int, int], start: int, end: int):
+    """
+    工作进程：挂载共享内存中的向量矩阵和删除标记，只对 [start, end) 行打分
+    每收到一个 (查询向量, top_k, 过滤位图) 请求，返回本分片的局部 top-k (全局 id, 分数)；
+    查询为 (查询数, 维度) 的矩阵时用一次矩阵乘法打分，返回每个查询的局部 top-k 列表。
+    收到 None 时退出
+    """
+    matrix_shm = shared_memory.SharedMemory(name=matrix_name)
+    mask_shm = shared_memory.SharedMemory(name=mask_name)
+    try:
+        rows = np.ndarray(shape, dtype=np.float32, buffer=matrix_shm.buf)[start:end]
+        deleted = np.ndarray((shape[0],), dtype=np.bool_, buffer=mask_shm.buf)[start:end]
+        while True:
+            request = conn.recv()
+            if request is None:
+                break
+            query, top_k, allowed = request
+            if query.ndim == 1:
+                conn.send(_local_top_k(rows @ query, deleted, top_k, start, allowed))
+            else:
+                scores = np.ascontiguousarray((rows @ query.T).T)
+                conn.send([_local_top_k(row, deleted, top_k, start, allowed) for row in scores])
+        del rows, deleted
+    finally:
+        matrix_shm.close()
+        mask_shm.close()
+        conn.close()
+
+
+class ShardedVectorStore:
+    """
+    多进程分片向量存储
+    把 VectorStore 的向量矩阵一次性复制到共享内存（multiprocessing.shared_memory），按行均分给
+    N 个工作进程，各进程直接映射同一块内存，不再复制数据。搜索时查询向量广播给所有分片，
+    各分片并行计算局部 top-k，再由父进程合并，从而利用多个 CPU 核心。
+
+    接口与 VectorStore 的检索部分一致（search / search_many / lexical_search 等），
+    可以直接作为 EmbeddingRetriever 的 vector_store 使用：
+        async with ShardedVectorStore(store, workers=8) as sharded:
+            retriever.vector_store = sharded
+
+    构造时对原存储做快照：之后新增的文档不会出现在搜索结果中，需要重新创建；
+    delete() 通过共享的删除标记立即对所有分片生效
+    """
+    def __init__(self, store: VectorStore, workers: Optional[int] = None):
+        """
+        Args:
+            store: 被分片的向量存储，文档内容和词法索引仍由它提供
+            workers: 工作进程（分片）数，默认为 CPU 核心数
+        """
+        self.store = store
+        self.workers = max(1, min(workers or os.cpu_count() or 1, len(store.documents) or 1))
+        self._processes: List[multiprocessing.Process] = []
+        self._connections = []
+        self._locks: List[asyncio.Lock] = []
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._matrix_shm: Optional[shared_memory.SharedMemory] = None
+        self._mask_shm: Optional[shared_memory.SharedMemory] = None
+        self._deleted: Optional[np.ndarray] = None
+        self._count = 0
+        self._bounds: Optional[np.ndarray] = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    @property
+    def documents(self):
+        return self.store.documents
+
+    @property
+    def deleted(self) -> set:
+        return self.store.deleted
+
+    def __len__(self) -> int:
+        """未被删除的文档数"""
+        return self._count - int(self._deleted.sum()) if self._deleted is not None else len(self.store)
+
+    async def start(self):
+        """把向量复制到共享内存并启动工作进程"""
+        if self._processes:
+            return
+        matrix = self.store.matrix
+        self._count, dimension = len(self.store.documents), self.store.dimension
+        shape = (self._count, dimension)
+        # 共享内存不允许大小为 0
+        self._matrix_shm = shared_memory.SharedMemory(create=True, size=max(1, matrix.nbytes))
+        self._mask_shm = shared_memory.SharedMemory(create=True, size=max(1, self._count))
+        np.ndarray(shape, dtype=np.float32, buffer=self._matrix_shm.buf)[:] = matrix
+        self._deleted = np.ndarray((self._count,), dtype=np.bool_, buffer=self._mask_shm.buf)
+        self._deleted[:] = False
+        self._deleted[list(self.store.deleted)] = True
+
+        # spawn 在各平台上行为一致，也不会继承父进程中事件循环的状态
+        context = multiprocessing.get_context('spawn')
+        bounds = self._bounds = np.linspace(0, self._count, self.workers + 1).astype(int)
+        for i in range(self.workers):
+            parent_conn, child_conn = context.Pipe()
+            process = context.Process(
+                target=_shard_worker,
+                args=(child_conn, self._matrix_shm.name, self._mask_shm.name, shape, bounds[i], bounds[i + 1]),
+                daemon=True,
+            )
+            process.start()
+            child_conn.close()
+            self._processes.append(process)
+            self._connections.append(parent_conn)
+            self._locks.append(asyncio.Lock())
+        # 每个分片一个线程，阻塞地等待管道返回结果，不占用事件循环
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='shard')
+        print(f"✅ Started {self.workers} search shards for {self._count} vectors")
+
+    async def close(self):
+        """停止工作进程并释放共享内存"""
+        for conn in self._connections:
+            try:
+                conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        loop = asyncio.get_running_loop()
+        for process in self._processes:
+            await loop.run_in_executor(None, process.join, 5)
+            if process.is_alive():
+                process.terminate()
+        for conn in self._connections:
+            conn.close()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        self._deleted = None
+        for shm in (self._matrix_shm, self._mask_shm):
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+        self._processes, self._connections, self._locks = [], [], []
+        self._executor = self._matrix_shm = self._mask_shm = None
+
+    def delete(self, ids: List[int]):
+        """将指定 id 的文档标记为已删除，同时更新原存储和共享的删除标记"""
+        self.store.delete(ids)
+        self._deleted[[doc_id for doc_id in ids if doc_id < self._count]] = True
+
+    async def search(self, query_embedding: List[float], top_k: int = 5, nprobe: Optional[int] = None,
+                     filter: Optional[Dict[str, Any]] = None, namespace: Optional[str] = None) -> List[str]:
+        """
+        搜索与查询向量最相似的文档，参数顺序与 VectorStore.search() 一致
+        Args:
+            query_embedding: 查询的嵌入向量
+            top_k: 返回最相似的前K个文档，默认为5
+            nprobe: 分片搜索始终是精确搜索，该参数被忽略
+            filter: 元数据过滤条件，位图在父进程中计算后按分片切分发送
+            namespace: 只在该命名空间内搜索
+        Returns:
+            按相似度排序的文档内容列表（最相似的在前）
+        """
+        return [self.documents[i] for i in await self.search_ids(query_embedding, top_k, nprobe, filter, namespace)]
+
+    async def search_ids(self, query_embedding: List[float], top_k: int = 5, nprobe: Optional[int] = None,
+                         filter: Optional[Dict[str, Any]] = None, namespace: Optional[str] = None) -> np.ndarray:
+        """与 search() 相同，但返回文档 id 数组"""
+        if not self._processes:
+            raise RuntimeError('ShardedVectorStore not started. Call start() first.')
+        if top_k <= 0 or self._count == 0:
+            return np.empty(0, dtype=np.int64)
+        query = VectorStore._normalize(np.asarray(query_embedding, dtype=np.float32))
+        allowed = self._filter_mask(filter, namespace)
+        results = await asyncio.gather(*(self._query_shard(i, query, top_k, allowed) for i in range(self.workers)))
+        return self._merge(results, top_k)
+
+    async def search_many(self, query_embeddings: List[List[float]], top_k: int = 5, nprobe: Optional[int] = None,
+                          filter: Optional[Dict[str, Any]] = None,
+                          namespace: Optional[str] = None) -> List[List[str]]:
+        """批量搜索多个查询向量，见 VectorStore.search_many()；nprobe 被忽略"""
+        return [[self.documents[i] for i in ids]
+                for ids in await self.search_many_ids(query_embeddings, top_k, nprobe, filter, namespace)]
+
+    async def search_many_ids(self, query_embeddings: List[List[float]], top_k: int = 5,
+                              nprobe: Optional[int] = None, filter: Optional[Dict[str, Any]] = None,
+                              namespace: Optional[str] = None) -> List[np.ndarray]:
+        """与 search_many() 相同，但返回每个查询的文档 id 数组；每个分片对整批查询只做一次矩阵乘法"""
+        if not self._processes:
+            raise RuntimeError('ShardedVectorStore not started. Call start() first.')
+        if len(query_embeddings) == 0:
+            return []
+        if top_k <= 0 or self._count == 0:
+            return [np.empty(0, dtype=np.int64) for _ in range(len(query_embeddings))]
+        queries = VectorStore._normalize(np.asarray(query_embeddings, dtype=np.float32))
+        allowed = self._filter_mask(filter, namespace)
+        results = await asyncio.gather(*(self._query_shard(i, queries, top_k, allowed) for i in range(self.workers)))
+        return [self._merge([shard[q] for shard in results], top_k) for q in range(queries.shape[0])]
+
+    async def lexical_search(self, query: str, top_k: int = 5, filter: Optional[Dict[str, Any]] = None,
+                             namespace: Optional[str] = None) -> List[str]:
+        """词法检索在父进程中完成，见 VectorStore.lexical_search()"""
+        return await self.store.lexical_search(query, top_k, filter, namespace)
+
+    def lexical_search_ids(self, query: str, top_k: int = 5, filter: Optional[Dict[str, Any]] = None,
+                           namespace: Optional[str] = None) -> np.ndarray:
+        return self.store.lexical_search_ids(query, top_k, filter, namespace)
+
+    def _filter_mask(self, filter: Optional[Dict[str, Any]], namespace: Optional[str]) -> Optional[np.ndarray]:
+        """在原存储的元数据上计算过滤位图，只保留快照范围内的部分"""
+        allowed = self.store.filter_mask(filter, namespace)
+        return allowed[:self._count] if allowed is not None else None
+
+    @staticmethod
+    def _merge(results: List[Tuple[np.ndarray, np.ndarray]], top_k: int) -> np.ndarray:
+        """合并各分片的局部 top-k；分片按 id 顺序排列，同分时仍按插入顺序"""
+        ids = np.concatenate([shard_ids for shard_ids, _ in results])
+        scores = np.concatenate([shard_scores for _, shard_scores in results])
+        return ids[VectorStore._top_k_indices(scores, min(top_k, scores.shape[0]))]
+
+    async def _query_shard(self, shard: int, query: np.ndarray, top_k: int, allowed: Optional[np.ndarray]):
+        """向一个分片发送查询（及该分片范围内的过滤位图）并等待结果；同一分片上的请求依次处理"""
+        conn = self._connections[shard]
+        if allowed is not None:
+            allowed = allowed[self._bounds[shard]:self._bounds[shard + 1]]
+
+        def roundtrip():
+            conn.send((query, top_k, allowed))
+            return conn.recv()
+
+        async with self._locks[shard]:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, roundtrip)
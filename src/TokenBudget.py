@@ -0,0 +1,103 @@
+from typing import Any, Dict, List, Tuple
+from utils import estimate_tokens
+
+# 每条消息的固定开销（角色、分隔符等）
+MESSAGE_OVERHEAD = 4
+
+
+class TokenBudget:
+    """
+    对话历史的 token 预算管理类
+    在本地估算消息历史的 token 数，超出预算时按以下顺序压缩：
+      1. 截断较早的工具输出，只保留开头和结尾
+      2. 从最早的消息组开始整体丢弃
+    固定消息（系统提示词、RAG 上下文）、最近一条用户提示和最近的若干消息组始终保留。
+    带 tool_calls 的助手消息与其全部工具结果视为一个消息组，要么一起保留要么一起丢弃，
+    不会留下孤立的 tool_call_id
+    """
+    def __init__(self, max_tokens: int = 32000, keep_recent: int = 4, tool_output_tokens: int = 500):
+        """
+        Args:
+            max_tokens: 每次请求的消息历史 token 上限
+            keep_recent: 始终完整保留的最近消息组数
+            tool_output_tokens: 较早的工具输出截断后保留的大致 token 数
+        """
+        self.max_tokens = max_tokens
+        self.keep_recent = keep_recent
+        self.tool_output_tokens = tool_output_tokens
+        self.compactions = 0
+
+    @staticmethod
+    def count(messages: List[Dict[str, Any]]) -> int:
+        """估算消息列表的 token 数"""
+        total = 0
+        for message in messages:
+            total += MESSAGE_OVERHEAD + estimate_tokens(message.get('content') or '')
+            for call in message.get('tool_calls') or []:
+                total += estimate_tokens(call['function']['name'] + call['function']['arguments'])
+        return total
+
+    def compact(self, messages: List[Dict[str, Any]], pinned: int) -> Tuple[List[Dict[str, Any]], int, int]:
+        """
+        将消息历史压缩到预算之内
+        Args:
+            messages: 完整的消息历史
+            pinned: 开头必须保留的固定消息数（系统提示词和上下文）
+        Returns:
+            (压缩后的消息列表, 压缩前的 token 数, 压缩后的 token 数)；未超出预算时原样返回消息列表
+        """
+        before = self.count(messages)
+        if before <= self.max_tokens:
+            return messages, before, before
+
+        head = messages[:pinned]
+        groups = self._group(messages[pinned:])
+        protected = set(range(max(0, len(groups) - self.keep_recent), len(groups)))
+        # 最近一条用户提示通常是当前任务本身，同样保留
+        for i in range(len(groups) - 1, -1, -1):
+            if groups[i][0]['role'] == 'user':
+                protected.add(i)
+                break
+
+        # 第一步：截断较早的工具输出
+        for i, group in enumerate(groups):
+            if i not in protected:
+                groups[i] = [self._truncate_tool_output(message) for message in group]
+
+        # 第二步：从最早的消息组开始整体丢弃
+        total = self.count(head) + sum(self.count(group) for group in groups)
+        for i, group in enumerate(groups):
+            if total <= self.max_tokens:
+                break
+            if i in protected:
+                continue
+            total -= self.count(group)
+            groups[i] = []
+
+        self.compactions += 1
+        compacted = head + [message for group in groups for message in group]
+        return compacted, before, self.count(compacted)
+
+    @staticmethod
+    def _group(messages: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """把带 tool_calls 的助手消息与其后的工具结果合并为一组，其余消息各自成组"""
+        groups: List[List[Dict[str, Any]]] = []
+        for message in messages:
+            if message['role'] == 'tool' and groups and groups[-1][0].get('tool_calls'):
+                groups[-1].append(message)
+            else:
+                groups.append([message])
+        return groups
+
+    def _truncate_tool_output(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        """截断工具输出，保留开头和结尾各一半"""
+        content = message.get('content') or ''
+        if message['role'] != 'tool' or estimate_tokens(content) <= self.tool_output_tokens:
+            return message
+        # 按字符截断：CJK 约一字一 token，这里保守地按字符数等于 token 数处理
+        keep = self.tool_output_tokens // 2
+        omitted = len(content) - 2 * keep
+        return {
+            **message,
+            'content': f"{content[:keep]}\n...[{omitted} characters truncated]...\n{content[-keep:]}",
+        }
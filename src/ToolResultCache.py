@@ -0,0 +1,138 @@
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# 用于判断写操作与缓存项是否相关的参数名
+SCOPE_KEYS = ('path', 'paths', 'source', 'destination', 'url', 'uri')
+
+
+class ToolResultCache:
+    """
+    MCP工具结果缓存类
+    只缓存白名单中的幂等（只读）工具，键为工具名加规范化后的 JSON 参数；
+    每个工具可单独设置 TTL，超过容量时按 LRU 淘汰。写类工具被调用时，
+    会使与之相关的缓存项失效：若双方参数中有相同的路径/URL（或写入路径位于缓存项的目录之下）
+    则只使这些项失效，缓存项没有此类参数时整体失效
+
+    工具调用可能并发执行：调用前用 generation() 记下工具的失效代数，put() 时若期间
+    该工具发生过失效（读操作开始后又有写操作完成），结果可能已过期，不写入缓存
+    """
+    def __init__(self, cacheable: Dict[str, Optional[float]],
+                 invalidates: Optional[Dict[str, List[str]]] = None,
+                 max_entries: int = 256):
+        """
+        Args:
+            cacheable: 可缓存的工具名到 TTL 秒数的映射，TTL 为 None 表示不过期
+            invalidates: 写类工具名到其影响的可缓存工具名列表的映射
+            max_entries: 最多缓存的结果数
+        """
+        self.cacheable = cacheable
+        self.invalidates = invalidates or {}
+        self.max_entries = max_entries
+        # 键 -> (过期时间, 工具名, 参数, 结果)
+        self._entries: OrderedDict[str, Tuple[float, str, Dict[str, Any], Any]] = OrderedDict()
+        # 可缓存工具名 -> 失效代数，每次 invalidate() 涉及该工具时加一
+        self._generations: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(name: str, params: Dict[str, Any]) -> str:
+        """工具名加规范化 JSON 参数（键排序、紧凑格式）作为缓存键"""
+        return name + ':' + json.dumps(params, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+
+    def get(self, name: str, params: Dict[str, Any]) -> Optional[Any]:
+        """
+        查询缓存的工具结果
+        Returns:
+            未过期的缓存结果，未命中或工具不可缓存时返回 None
+        """
+        if name not in self.cacheable:
+            return None
+        key = self.make_key(name, params)
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[3]
+
+    def generation(self, name: str) -> int:
+        """工具当前的失效代数，在调用工具之前获取并传给 put()"""
+        return self._generations.get(name, 0)
+
+    def put(self, name: str, params: Dict[str, Any], result: Any, generation: Optional[int] = None):
+        """
+        记录一次工具调用的结果：可缓存工具的成功结果写入缓存，写类工具使相关缓存项失效
+        Args:
+            generation: 调用工具前 generation() 的返回值；此后该工具发生过失效时结果不写入缓存
+        """
+        if name in self.invalidates:
+            self.invalidate(self.invalidates[name], params)
+        if name not in self.cacheable or getattr(result, 'isError', False):
+            return
+        if generation is not None and generation != self.generation(name):
+            return
+
+        ttl = self.cacheable[name]
+        expires = time.monotonic() + ttl if ttl is not None else float('inf')
+        key = self.make_key(name, params)
+        self._entries[key] = (expires, name, params, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, tools: Iterable[str], params: Optional[Dict[str, Any]] = None):
+        """
+        使指定工具的相关缓存项失效
+        Args:
+            tools: 受影响的工具名
+            params: 写操作的参数，用于只失效与之相关的项；为 None 时失效这些工具的全部缓存
+        """
+        tools = set(tools)
+        for name in tools:
+            self._generations[name] = self._generations.get(name, 0) + 1
+        written = self._scope_values(params) if params else set()
+        for key, (_, name, cached_params, _) in list(self._entries.items()):
+            if name not in tools:
+                continue
+            scope = self._scope_values(cached_params)
+            if not written or not scope or any(self._related(w, s) for w in written for s in scope):
+                del self._entries[key]
+                self.invalidations += 1
+
+    def stats(self) -> Dict[str, float]:
+        """返回命中/未命中/失效/淘汰计数及命中率"""
+        total = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'invalidations': self.invalidations,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
+
+    @staticmethod
+    def _scope_values(params: Dict[str, Any]) -> set:
+        """提取参数中的路径/URL 类取值"""
+        values = set()
+        for key in SCOPE_KEYS:
+            value = params.get(key)
+            if isinstance(value, str):
+                values.add(value)
+            elif isinstance(value, list):
+                values.update(item for item in value if isinstance(item, str))
+        return values
+
+    @staticmethod
+    def _related(written: str, cached: str) -> bool:
+        """写入的路径与缓存项的路径相同，或位于缓存项路径（目录）之下"""
+        return written == cached or written.startswith(cached.rstrip('/') + '/')
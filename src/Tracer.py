@@ -0,0 +1,317 @@
+import os
+import json
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Dict, Iterable, List, Optional
+
+
+# 火焰图汇总中按次数累加的属性；以 _s 结尾的耗时属性取平均值，其余属性只出现在导出的明细中
+ADDITIVE_ATTRIBUTES = ('prompt_tokens', 'completion_tokens', 'tokens', 'request_bytes', 'response_bytes',
+                       'texts', 'cache_hits', 'tool_calls', 'errors')
+
+
+class Span:
+    """
+    一段被追踪的操作：名称、起止时间（Unix 秒）、父子关系和任意属性（token 数、字节数、缓存命中等）
+    以 with 语句使用时自动成为当前 span，其间创建的 span（包括 asyncio 子任务中的）都是它的子节点
+    """
+    __slots__ = ('tracer', 'name', 'trace_id', 'span_id', 'parent_id', 'start', 'end', 'attributes', '_token')
+    recording = True
+
+    def __init__(self, tracer: 'Tracer', name: str, parent: Optional['Span'], attributes: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = parent.trace_id if parent is not None else os.urandom(8).hex()
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent.span_id if parent is not None else None
+        self.start = time.time()
+        self.end: Optional[float] = None
+        self.attributes = attributes
+        self._token = None
+
+    def __enter__(self) -> 'Span':
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self.attributes['error'] = exc_type.__name__
+            self.attributes['errors'] = 1
+        self.finish()
+
+    @property
+    def duration(self) -> float:
+        """耗时秒数，未结束时为到目前为止的耗时"""
+        return (self.end if self.end is not None else time.time()) - self.start
+
+    def set(self, **attributes):
+        """设置或覆盖属性"""
+        self.attributes.update(attributes)
+
+    def add(self, name: str, value: float):
+        """累加数值属性，如多次请求的 token 数"""
+        self.attributes[name] = self.attributes.get(name, 0) + value
+
+    def finish(self):
+        """结束 span 并交给导出器；重复调用无效"""
+        if self.end is None:
+            self.end = time.time()
+            self.tracer.export(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'start': self.start,
+            'end': self.end,
+            'attributes': self.attributes,
+        }
+
+
+class _NoopSpan:
+    """未启用追踪时使用的空 span，所有操作都不做任何事"""
+    __slots__ = ()
+    recording = False
+    trace_id = None
+    span_id = None
+    duration = 0.0
+
+    def __enter__(self) -> '_NoopSpan':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+    def set(self, **attributes):
+        pass
+
+    def add(self, name: str, value: float):
+        pass
+
+    def finish(self):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+_current_span: ContextVar[Optional[Span]] = ContextVar('current_span', default=None)
+_tracer: Optional['Tracer'] = None
+
+
+class Tracer:
+    """
+    轻量级追踪器
+    结束的 span 依次交给各导出器（JsonlExporter 写文件、SpanCollector 保存在进程内）。
+    未调用 set_tracer() 时 trace() 直接返回空 span，开销只有一次全局变量读取，可以常驻生产环境：
+        collector = SpanCollector()
+        set_tracer(Tracer(collector, JsonlExporter('traces.jsonl')))
+        ...
+        print(collector.flamegraph(agent.last_trace_id))
+    """
+    def __init__(self, *exporters):
+        """
+        Args:
+            exporters: 导出器，需实现 export(span_dict)，可选实现 close()
+        """
+        self.exporters = list(exporters)
+
+    def start_span(self, name: str, **attributes) -> Span:
+        """创建以当前 span 为父节点的 span，但不把它设为当前 span（适用于异步生成器等跨多次调度的操作）"""
+        return Span(self, name, _current_span.get(), attributes)
+
+    def export(self, span: Span):
+        record = span.to_dict()
+        for exporter in self.exporters:
+            exporter.export(record)
+
+    def close(self):
+        for exporter in self.exporters:
+            if hasattr(exporter, 'close'):
+                exporter.close()
+
+
+class JsonlExporter:
+    """把每个结束的 span 作为一行 JSON 追加写入文件"""
+    def __init__(self, path, flush_every: int = 64):
+        """
+        Args:
+            path: JSONL 文件路径
+            flush_every: 每写入多少个 span 刷新一次文件缓冲
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.file = open(path, 'a', encoding='utf-8')
+        self.flush_every = flush_every
+        self._pending = 0
+
+    def export(self, record: Dict[str, Any]):
+        self.file.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+        self._pending += 1
+        if self._pending >= self.flush_every:
+            self.file.flush()
+            self._pending = 0
+
+    def close(self):
+        self.file.close()
+
+
+class SpanCollector:
+    """在进程内保存最近结束的 span，供查询和生成火焰图式的汇总"""
+    def __init__(self, max_spans: int = 100000):
+        """
+        Args:
+            max_spans: 最多保留的 span 数，超出时丢弃最早的
+        """
+        self.records: deque = deque(maxlen=max_spans)
+
+    def export(self, record: Dict[str, Any]):
+        self.records.append(record)
+
+    def spans(self, trace_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """返回某次追踪（为 None 时为全部）的 span"""
+        return [record for record in self.records if trace_id is None or record['trace_id'] == trace_id]
+
+    def flamegraph(self, trace_id: Optional[str] = None) -> str:
+        """某次追踪的火焰图式文本汇总，见 format_flamegraph()"""
+        return format_flamegraph(self.spans(trace_id))
+
+    def folded(self, trace_id: Optional[str] = None) -> List[str]:
+        """某次追踪的折叠栈，见 folded_stacks()"""
+        return folded_stacks(self.spans(trace_id))
+
+
+def set_tracer(tracer: Optional[Tracer]) -> Optional[Tracer]:
+    """
+    设置全局追踪器
+    Args:
+        tracer: 追踪器，为 None 时关闭追踪
+    Returns:
+        之前的追踪器
+    """
+    global _tracer
+    previous, _tracer = _tracer, tracer
+    return previous
+
+
+def get_tracer() -> Optional[Tracer]:
+    return _tracer
+
+
+def trace(name: str, **attributes):
+    """
+    创建 span，以 with 语句使用：
+        with trace('vector.search', top_k=5) as span:
+            ...
+            span.set(candidates=len(ids))
+    未启用追踪时返回空 span
+    """
+    if _tracer is None:
+        return NOOP_SPAN
+    return Span(_tracer, name, _current_span.get(), attributes)
+
+
+def start_span(name: str, **attributes):
+    """创建不设为当前 span 的 span，结束时需调用 finish()；未启用追踪时返回空 span"""
+    if _tracer is None:
+        return NOOP_SPAN
+    return _tracer.start_span(name, **attributes)
+
+
+def current_span():
+    """当前的 span，没有时返回空 span"""
+    span = _current_span.get()
+    return span if span is not None else NOOP_SPAN
+
+
+def read_spans(path) -> List[Dict[str, Any]]:
+    """读取 JsonlExporter 写出的 span 文件"""
+    with open(path, encoding='utf-8') as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def _build_tree(records: Iterable[Dict[str, Any]]):
+    """按 parent_id 组织 span；父节点不在集合中的 span 视为根节点"""
+    records = sorted(records, key=lambda record: record['start'])
+    ids = {record['span_id'] for record in records}
+    children: Dict[Optional[str], List[Dict[str, Any]]] = {}
+    for record in records:
+        parent = record['parent_id'] if record['parent_id'] in ids else None
+        children.setdefault(parent, []).append(record)
+    return children
+
+
+def _merge(records: List[Dict[str, Any]], children) -> List[Dict[str, Any]]:
+    """
+    与火焰图相同，把同一父路径下同名的 span 合并为一个节点：累加次数、总耗时和计数类属性，
+    耗时类属性（以 _s 结尾）取平均值
+    自身耗时为总耗时减去子节点的耗时；子 span 并发执行时可能为负，按 0 计
+    """
+    nodes: Dict[str, Dict[str, Any]] = {}
+    for record in records:
+        node = nodes.setdefault(record['name'], {'name': record['name'], 'count': 0, 'total': 0.0,
+                                                 'attributes': {}, 'spans': []})
+        node['count'] += 1
+        node['total'] += record['end'] - record['start']
+        node['spans'].append(record)
+        for key, value in record['attributes'].items():
+            if isinstance(value, (int, float)) and (key in ADDITIVE_ATTRIBUTES or key.endswith('_s')):
+                node['attributes'][key] = node['attributes'].get(key, 0) + value
+    for node in nodes.values():
+        for key in node['attributes']:
+            if key.endswith('_s'):
+                node['attributes'][key] /= sum(1 for record in node['spans'] if key in record['attributes'])
+        child_records = [child for record in node['spans'] for child in children.get(record['span_id'], [])]
+        node['children'] = _merge(child_records, children)
+        node['self'] = max(0.0, node['total'] - sum(child['total'] for child in node['children']))
+    return list(nodes.values())
+
+
+def format_flamegraph(records: List[Dict[str, Any]], width: int = 30) -> str:
+    """
+    把一次追踪的 span 汇总为火焰图式的文本树：每行一个节点，同名兄弟节点已合并，
+    显示次数、总耗时、占根节点的百分比、自身耗时、耗时条和汇总后的属性
+    Args:
+        records: span 字典列表
+        width: 耗时条的最大字符数
+    Returns:
+        多行文本；没有 span 时为空字符串
+    """
+    children = _build_tree(records)
+    roots = _merge(children.get(None, []), children)
+    if not roots:
+        return ''
+    scale = max(root['total'] for root in roots) or 1.0
+    lines = [f"{'span':<36} {'count':>5} {'total':>10} {'%':>6} {'self':>10}"]
+
+    def walk(node, depth):
+        label = ('  ' * depth + node['name'])[:36]
+        attributes = ' '.join(f'{key}={value:.4g}' for key, value in node['attributes'].items())
+        bar = '█' * max(1, round(width * min(node['total'] / scale, 1.0)))
+        lines.append(f"{label:<36} {node['count']:>5} {node['total'] * 1000:>8.1f}ms "
+                     f"{100 * node['total'] / scale:>5.1f}% {node['self'] * 1000:>8.1f}ms {bar} {attributes}")
+        for child in sorted(node['children'], key=lambda child: -child['total']):
+            walk(child, depth + 1)
+
+    for root in roots:
+        walk(root, 0)
+    return '\n'.join(lines)
+
+
+def folded_stacks(records: List[Dict[str, Any]]) -> List[str]:
+    """
+    折叠栈格式（"根;子;孙 自身耗时微秒"），可直接交给 flamegraph.pl / speedscope 绘制火焰图
+    """
+    children = _build_tree(records)
+    lines = []
+
+    def walk(node, path):
+        stack = f"{path};{node['name']}" if path else node['name']
+        lines.append(f"{stack} {round(node['self'] * 1e6)}")
+        for child in node['children']:
+            walk(child, stack)
+
+    for root in _merge(children.get(None, []), children):
+        walk(root, '')
+    return lines
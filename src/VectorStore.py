@@ -1,78 +1,627 @@
-from typing import List
-import math
+import os
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Union
+import numpy as np
+from IVFIndex import IVFIndex
+from BM25Index import BM25Index
+from Quantizer import Quantizer
+from MetadataIndex import MetadataIndex
+from Tracer import trace
 
-class VectorStoreItem:
-    """向量存储项，包含嵌入向量和对应的文档内容"""
-    def __init__(self, embedding: List[float], document: str):
+# 持久化索引目录中的文件名；数据文件名带上保存的代数（如 vectors.3.f32），
+# 由 index.json 指明当前有效的一组文件。版本 1 的索引使用不带代数的文件名
+INDEX_META = 'index.json'
+INDEX_VECTORS = 'vectors.f32'
+INDEX_DOCUMENTS = 'documents.bin'
+INDEX_OFFSETS = 'offsets.u64'
+INDEX_DELETED = 'deleted.u64'
+INDEX_METADATA = 'metadata.npz'
+INDEX_FILES = {'vectors': INDEX_VECTORS, 'documents': INDEX_DOCUMENTS, 'offsets': INDEX_OFFSETS,
+               'deleted': INDEX_DELETED, 'metadata': INDEX_METADATA}
+# 满足过滤条件的文档占比低于该值时只对这些文档打分，否则全量打分后屏蔽
+FILTER_PRUNE_RATIO = 0.5
+INDEX_VERSION = 2
+SUPPORTED_INDEX_VERSIONS = (1, 2)
+
+
+class MappedDocuments(Sequence):
+    """
+    基于内存映射文件的文档序列
+    已持久化的文档只在被访问时才从映射文件中解码，新追加的文档暂存在内存中，
+    对外表现与 list 一致（支持下标、切片、append 和 extend）
+    """
+    def __init__(self, data: Optional[np.memmap], offsets: np.ndarray):
         """
-        初始化向量存储项
         Args:
-            embedding: 文档的嵌入向量
-            document: 原始文档内容
+            data: 所有文档 UTF-8 字节拼接而成的映射数组，无文档时为 None
+            offsets: 长度为 文档数+1 的偏移数组，第 i 个文档占 data[offsets[i]:offsets[i+1]]
         """
-        self.embedding = embedding
-        self.document = document
+        self._data = data
+        self._offsets = offsets
+        self._persisted = len(offsets) - 1
+        self.pending: List[str] = []
+
+    def __len__(self) -> int:
+        return self._persisted + len(self.pending)
+
+    def __getitem__(self, index: Union[int, slice]):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('document index out of range')
+        if index >= self._persisted:
+            return self.pending[index - self._persisted]
+        start, end = self._offsets[index], self._offsets[index + 1]
+        return bytes(self._data[start:end]).decode('utf-8')
+
+    def append(self, document: str):
+        self.pending.append(document)
+
+    def extend(self, documents: List[str]):
+        self.pending.extend(documents)
+
 
 class VectorStore:
     """
     向量存储类，用于存储文档嵌入向量并提供相似性搜索功能
     使用余弦相似度算法来计算查询向量与存储向量的相似性
+
+    所有向量在添加时即归一化，并存放在一块连续的 float32 矩阵中，
+    搜索时只需一次矩阵-向量乘法即可得到全部余弦相似度
+
+    通过 save()/load() 持久化到磁盘：向量以原始 float32 文件保存，加载时用
+    numpy.memmap 映射而不复制到内存；文档内容与偏移量另存为紧凑的旁路文件。
+    加载后新增的向量先放在内存中，再次 save() 到同一目录时只追加新增部分
+
+    每个文档以插入顺序的下标作为 id。delete() 只做删除标记，被删除的文档不再出现在
+    搜索结果中；compact() 会真正移除它们并重新分配 id
+
+    可选地挂载近似最近邻索引（IVFIndex）：调用 train_index() 之后，search() 只对
+    索引给出的候选向量打分；未训练时仍为精确搜索。索引不随 save() 持久化，加载后需重新训练
+
+    可选地挂载量化器（Quantizer.Float16Quantizer / Int8Quantizer / ProductQuantizer）：
+    调用 train_index() 之后，search() 先在内存中的压缩编码上计算近似分数，再用全精度向量
+    对前 top_k * rerank 个候选精确重排。配合 save()/load() 使用时全精度向量只保留在
+    内存映射的磁盘文件中，常驻内存的只有压缩编码，重排时只读取少量候选行
+
+    每个文档可附带元数据（来源文件、段落序号、标签、时间戳等），按列保存在 MetadataIndex 中。
+    search(..., filter=...) 先根据元数据位图裁剪候选，只对满足条件的向量打分；
+    namespace 参数是 filter={'namespace': ...} 的简写，用于在同一个进程中隔离多个知识库
+
+    可选地挂载词法索引（BM25Index）：lexical_search() 按 BM25 分数检索文档，不需要查询向量。
+    词法索引同样不持久化，在首次词法检索时根据文档内容惰性建立
     """
-    def __init__(self):
-        """初始化空的向量存储"""
-        self.vector_store: List[VectorStoreItem] = []
+    def __init__(self, initial_capacity: int = 1024, ann_index: Optional[IVFIndex] = None,
+                 lexical_index: Optional[BM25Index] = None, quantizer: Optional[Quantizer] = None,
+                 rerank: int = 4):
+        """
+        初始化空的向量存储
+        Args:
+            initial_capacity: 矩阵的初始行数，容量不足时按倍数扩容
+            ann_index: 近似最近邻索引，为 None 时始终精确搜索
+            lexical_index: 词法索引，为 None 时不支持 lexical_search()
+            quantizer: 向量量化器，为 None 时直接在 float32 向量上搜索
+            rerank: 使用量化器时精确重排的候选倍数，为 0 时直接返回近似结果
+        """
+        self.documents: Union[List[str], MappedDocuments] = []
+        self.dimension = 0
+        self._capacity = max(1, initial_capacity)
+        # 已持久化部分（内存映射，只读）
+        self._base: Optional[np.memmap] = None
+        self._path: Optional[Path] = None
+        # 已持久化部分所用的文件名（INDEX_FILES 的键 -> 文件名）
+        self._files: Dict[str, str] = {}
+        # 内存中的可增长部分
+        self._matrix: np.ndarray = np.empty((0, 0), dtype=np.float32)
+        # 已删除的文档 id
+        self.deleted: set = set()
+        self.ann_index = ann_index
+        self.lexical_index = lexical_index
+        self.quantizer = quantizer
+        self.rerank = rerank
+        self.metadata = MetadataIndex()
+
+    def __len__(self) -> int:
+        """未被删除的文档数"""
+        return len(self.documents) - len(self.deleted)
 
-    async def add_embedding(self, embedding: List[float], document: str):
+    @property
+    def _base_rows(self) -> int:
+        return 0 if self._base is None else self._base.shape[0]
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """
+        已归一化的向量矩阵，形状为 (文档数, 维度)
+        若存储由磁盘加载且之后又追加了向量，返回的是两部分拼接后的副本
+        """
+        tail = self._matrix[:len(self.documents) - self._base_rows]
+        if self._base is None:
+            return tail
+        if tail.shape[0] == 0:
+            return self._base
+        return np.concatenate([self._base, tail])
+
+    async def add_embedding(self, embedding: List[float], document: str,
+                            metadata: Optional[Dict[str, Any]] = None, namespace: Optional[str] = None):
         """
         添加文档嵌入向量到存储中
         Args:
             embedding: 文档的嵌入向量（浮点数列表）
             document: 对应的文档内容字符串
+            metadata: 文档的元数据
+            namespace: 文档所属的命名空间
         """
-        self.vector_store.append(VectorStoreItem(embedding, document))
+        await self.add_embeddings([embedding], [document], [metadata], namespace)
 
-    async def search(self, query_embedding: List[float], top_k: int = 5) -> List[str]:
+    async def add_embeddings(self, embeddings: List[List[float]], documents: List[str],
+                             metadatas: Optional[List[Optional[Dict[str, Any]]]] = None,
+                             namespace: Optional[str] = None):
+        """
+        批量添加文档嵌入向量，一次性完成归一化和写入
+        Args:
+            embeddings: 嵌入向量列表，与 documents 一一对应
+            documents: 文档内容列表
+            metadatas: 与 documents 一一对应的元数据字典（可以为 None）
+            namespace: 这批文档所属的命名空间，写入元数据的 namespace 字段
+        """
+        if len(embeddings) != len(documents):
+            raise ValueError(f"Got {len(embeddings)} embeddings for {len(documents)} documents")
+        if metadatas is not None and len(metadatas) != len(documents):
+            raise ValueError(f"Got {len(metadatas)} metadata entries for {len(documents)} documents")
+        if not documents:
+            return
+        metadatas = metadatas or [None] * len(documents)
+        if namespace is not None:
+            metadatas = [{**(metadata or {}), 'namespace': namespace} for metadata in metadatas]
+
+        vectors = self._normalize(np.asarray(embeddings, dtype=np.float32))
+        start = len(self.documents) - self._base_rows
+        # 先校验维度并预留容量，元数据最后追加：任何一步被拒绝时元数据与文档数仍保持一致
+        self._reserve(start + len(documents), vectors.shape[1])
+        self.metadata.add(metadatas)
+        self._matrix[start:start + len(documents)] = vectors
+        self.documents.extend(documents)
+        if self.ann_index is not None and self.ann_index.is_trained:
+            self.ann_index.add(vectors)
+        if self.quantizer is not None and self.quantizer.is_trained:
+            self.quantizer.add(vectors)
+
+    def train_index(self):
+        """用当前全部向量训练近似最近邻索引和量化器（已配置的），之后的搜索将使用它们"""
+        if self.ann_index is None and self.quantizer is None:
+            raise RuntimeError('VectorStore has no ANN index or quantizer configured')
+        matrix = self.matrix
+        if self.ann_index is not None:
+            self.ann_index.train(matrix)
+        if self.quantizer is not None:
+            self.quantizer.train(matrix)
+
+    def delete(self, ids: List[int]):
+        """
+        将指定 id 的文档标记为已删除
+        Args:
+            ids: 文档 id（插入顺序下标）列表
+        """
+        for doc_id in ids:
+            if not 0 <= doc_id < len(self.documents):
+                raise IndexError(f'document id {doc_id} out of range')
+        self.deleted.update(int(doc_id) for doc_id in ids)
+
+    def compact(self) -> np.ndarray:
+        """
+        移除已删除的文档，将剩余数据整理到内存中的连续矩阵
+        整理后下次 save() 会完整重写索引文件
+        Returns:
+            旧 id 到新 id 的映射数组，被删除的文档映射为 -1
+        """
+        count = len(self.documents)
+        keep = np.ones(count, dtype=bool)
+        keep[list(self.deleted)] = False
+        remap = np.full(count, -1, dtype=np.int64)
+        remap[keep] = np.arange(int(keep.sum()))
+
+        live = np.flatnonzero(keep)
+        matrix = self.matrix[live]
+        documents = [self.documents[i] for i in live]
+
+        self._base, self._path, self._files = None, None, {}
+        self._matrix = np.empty((max(self._capacity, len(documents)), self.dimension), dtype=np.float32)
+        self._matrix[:len(documents)] = matrix
+        self.documents = documents
+        self.metadata = self.metadata.take(live)
+        self.deleted = set()
+        # 已训练的索引和量化器按新 id 重新训练；文档全部删除时无法训练，清空为未训练状态，
+        # 否则之后追加的向量会接在旧编码之后，与文档 id 错位
+        for index in (self.ann_index, self.quantizer):
+            if index is not None and index.is_trained:
+                if documents:
+                    index.train(self.matrix)
+                else:
+                    index.reset()
+        if self.lexical_index is not None:
+            self.lexical_index.clear()
+        return remap
+
+    def clear(self):
+        """
+        清空全部文档、向量和元数据，保留挂载的索引、量化器、重排倍数和向量维度等配置；
+        已训练的近似索引和量化器回到未训练状态。清空后下次 save() 会完整重写索引文件
+        """
+        self.documents = []
+        self._base, self._path, self._files = None, None, {}
+        self._matrix = np.empty((self._capacity if self.dimension else 0, self.dimension), dtype=np.float32)
+        self.metadata = MetadataIndex()
+        self.deleted = set()
+        for index in (self.ann_index, self.quantizer):
+            if index is not None:
+                index.reset()
+        if self.lexical_index is not None:
+            self.lexical_index.clear()
+
+    async def search(self, query_embedding: List[float], top_k: int = 5, nprobe: Optional[int] = None,
+                     filter: Optional[Dict[str, Any]] = None, namespace: Optional[str] = None) -> List[str]:
         """
         搜索与查询向量最相似的文档
         Args:
             query_embedding: 查询的嵌入向量
-            top_k: 返回最相似的前K个文档，默认为3
+            top_k: 返回最相似的前K个文档，默认为5
+            nprobe: 使用近似索引时探查的簇数，默认取索引自身的设置
+            filter: 元数据过滤条件，格式见 MetadataIndex
+            namespace: 只在该命名空间内搜索
         Returns:
             按相似度排序的文档内容列表（最相似的在前）
         """
-        # 计算查询向量与所有存储向量的相似度分数
-        scored = [
-            {
-                'document': item.document,
-                'score': self._cosine_similarity(query_embedding, item.embedding)
-            }
-            for item in self.vector_store
-        ]
-
-        # 按相似度分数降序排序，取前top_k个文档
-        top_k_documents = [
-            item['document']
-            for item in sorted(scored, key=lambda x: x['score'], reverse=True)[:top_k]
-        ]
-        return top_k_documents
-    def _cosine_similarity(self, vec_a: List[float], vec_b: List[float]) -> float:
-        """
-        计算两个向量的余弦相似度
+        return [self.documents[i] for i in await self.search_ids(query_embedding, top_k, nprobe, filter, namespace)]
+
+    async def search_ids(self, query_embedding: List[float], top_k: int = 5, nprobe: Optional[int] = None,
+                         filter: Optional[Dict[str, Any]] = None, namespace: Optional[str] = None) -> np.ndarray:
+        """
+        与 search() 相同，但返回文档 id 数组（最相似的在前），便于与其他检索结果融合
+        """
+        with trace('vector.search', top_k=top_k, documents=len(self.documents)) as span:
+            top_k = min(top_k, len(self))
+            if top_k <= 0:
+                return np.empty(0, dtype=np.int64)
+
+            query = self._normalize(np.asarray(query_embedding, dtype=np.float32))
+            allowed = self.filter_mask(filter, namespace)
+            # 只对近似索引给出的候选向量打分，None 表示全部向量
+            ids = self.ann_index.candidates(query, nprobe) \
+                if self.ann_index is not None and self.ann_index.is_trained else None
+            if allowed is not None:
+                if ids is not None:
+                    ids = ids[allowed[ids]]
+                elif np.count_nonzero(allowed) < FILTER_PRUNE_RATIO * allowed.shape[0]:
+                    # 过滤条件足够严格时只对满足条件的向量打分，否则全量打分后再屏蔽
+                    ids = np.flatnonzero(allowed)
+            span.set(candidates=len(ids) if ids is not None else len(self.documents))
+
+            if self.quantizer is not None and self.quantizer.is_trained:
+                # 先在压缩编码上取近似的前若干名，再用全精度向量重排
+                scores = self.quantizer.scores(query, ids)
+                if not self.rerank:
+                    return self._select(ids, scores, top_k, allowed)
+                ids = np.sort(self._select(ids, scores, top_k * self.rerank, allowed))
+
+            if ids is None:
+                # 一次矩阵-向量乘法计算查询向量与所有存储向量的余弦相似度
+                scores = self._scores(query)
+            else:
+                scores = self._scores_at(query, ids)
+            return self._select(ids, scores, top_k, allowed)
+
+    async def search_many(self, query_embeddings: List[List[float]], top_k: int = 5, nprobe: Optional[int] = None,
+                          filter: Optional[Dict[str, Any]] = None,
+                          namespace: Optional[str] = None) -> List[List[str]]:
+        """
+        批量搜索多个查询向量
         Args:
-            vec_a: 第一个向量
-            vec_b: 第二个向量  
+            query_embeddings: 查询的嵌入向量列表
+            top_k: 每个查询返回的文档数，默认为5
+            nprobe: 使用近似索引时探查的簇数
+            filter: 元数据过滤条件，对所有查询生效
+            namespace: 只在该命名空间内搜索
         Returns:
-            余弦相似度值，范围在[-1, 1]之间
-            1表示完全相同，0表示正交，-1表示完全相反
-        """
-        # 计算点积：对应元素相乘后求和
-        dot_product = sum(a * b for a, b in zip(vec_a, vec_b))
-        
-        # 计算向量A的模长：各元素平方和的平方根
-        norm_a = math.sqrt(sum(a * a for a in vec_a))
-        
-        # 计算向量B的模长：各元素平方和的平方根
-        norm_b = math.sqrt(sum(b * b for b in vec_b))
-        
-        # 返回余弦相似度：点积除以两个向量模长的乘积
-        return dot_product / (norm_a * norm_b)
\ No newline at end of file
+            与查询一一对应的文档内容列表
+        """
+        return [[self.documents[i] for i in ids]
+                for ids in await self.search_many_ids(query_embeddings, top_k, nprobe, filter, namespace)]
+
+    async def search_many_ids(self, query_embeddings: List[List[float]], top_k: int = 5,
+                              nprobe: Optional[int] = None, filter: Optional[Dict[str, Any]] = None,
+                              namespace: Optional[str] = None) -> List[np.ndarray]:
+        """
+        与 search_many() 相同，但返回每个查询的文档 id 数组
+        精确搜索时所有查询与存储向量只做一次矩阵-矩阵乘法（查询很多时分块进行），
+        结果与逐个调用 search_ids() 完全一致；使用近似索引或量化器时逐个查询
+        """
+        with trace('vector.search_many', queries=len(query_embeddings), top_k=top_k,
+                   documents=len(self.documents)):
+            if len(query_embeddings) == 0:
+                return []
+            queries = self._normalize(np.asarray(query_embeddings, dtype=np.float32))
+            top_k = min(top_k, len(self))
+            if top_k <= 0:
+                return [np.empty(0, dtype=np.int64) for _ in range(queries.shape[0])]
+            if (self.ann_index is not None and self.ann_index.is_trained) \
+                    or (self.quantizer is not None and self.quantizer.is_trained):
+                return [await self.search_ids(query, top_k, nprobe, filter, namespace) for query in queries]
+
+            allowed = self.filter_mask(filter, namespace)
+            ids = None
+            if allowed is not None and np.count_nonzero(allowed) < FILTER_PRUNE_RATIO * allowed.shape[0]:
+                ids = np.flatnonzero(allowed)
+            results = []
+            # 每块查询的分数矩阵控制在约 2^24 个元素（64 MB）以内
+            chunk = max(1, (1 << 24) // len(self.documents))
+            for start in range(0, queries.shape[0], chunk):
+                block = queries[start:start + chunk].T
+                scores = self._scores(block) if ids is None else self._scores_at(block, ids)
+                results.extend(self._select(ids, row, top_k, allowed) for row in np.ascontiguousarray(scores.T))
+            return results
+
+    def filter_mask(self, filter: Optional[Dict[str, Any]] = None,
+                    namespace: Optional[str] = None) -> Optional[np.ndarray]:
+        """
+        计算过滤条件的文档位图
+        Returns:
+            长度为文档数的布尔数组；没有任何条件时返回 None
+        """
+        conditions = dict(filter or {})
+        if namespace is not None:
+            conditions['namespace'] = namespace
+        return self.metadata.filter(conditions) if conditions else None
+
+    async def lexical_search(self, query: str, top_k: int = 5, filter: Optional[Dict[str, Any]] = None,
+                             namespace: Optional[str] = None) -> List[str]:
+        """
+        按 BM25 分数检索文档，完全在本地完成
+        Args:
+            query: 查询文本
+            top_k: 返回的文档数上限
+            filter: 元数据过滤条件
+            namespace: 只在该命名空间内检索
+        Returns:
+            按分数排序的文档内容列表，只包含至少命中一个查询词项的文档
+        """
+        return [self.documents[i] for i in self.lexical_search_ids(query, top_k, filter, namespace)]
+
+    def lexical_search_ids(self, query: str, top_k: int = 5, filter: Optional[Dict[str, Any]] = None,
+                           namespace: Optional[str] = None) -> np.ndarray:
+        """与 lexical_search() 相同，但返回文档 id 数组"""
+        if self.lexical_index is None:
+            raise RuntimeError('VectorStore has no lexical index configured')
+        # 惰性地为新增文档建立索引
+        if len(self.lexical_index) < len(self.documents):
+            self.lexical_index.add(self.documents[len(self.lexical_index):])
+        with trace('lexical.search', top_k=top_k, documents=len(self.documents)):
+            ids, _ = self.lexical_index.search(query, top_k, exclude=self.deleted,
+                                               allowed=self.filter_mask(filter, namespace))
+        return ids
+
+    def save(self, path: Union[str, Path]):
+        """
+        将向量存储持久化到目录
+        若该目录正是本存储加载（或上次保存）的位置，只追加新增的向量和文档，
+        不重写已有文件；否则把全部数据写到新一代的文件中。
+        删除标记和文档元数据每次写到新一代的文件，index.json 最后以 os.replace 原子替换，
+        指向这一组新文件后旧文件才被删除：保存中途崩溃时旧索引仍然完整可用，
+        正在被内存映射的旧文件也不会在重写时被截断
+        Args:
+            path: 索引目录
+        """
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+
+        count = len(self.documents)
+        meta = self._read_meta(path)
+        append = self._path is not None and self._path.resolve() == path.resolve() \
+            and meta.get('count') == self._base_rows
+        generation = meta.get('generation', 0) + 1
+        old_files = self._meta_files(meta) if meta else {}
+        files = {key: f'{Path(name).stem}.{generation}{Path(name).suffix}' for key, name in INDEX_FILES.items()}
+        start = self._base_rows if append else 0
+        if append:
+            # 追加时沿用已有的向量、文档和偏移量文件：index.json 中的 count 之外的尾部都视为无效
+            for key in ('vectors', 'documents', 'offsets'):
+                files[key] = old_files[key]
+        mode = 'ab' if append else 'wb'
+
+        with open(path / files['offsets'], 'r+b' if append else 'wb') as offsets_file, \
+                open(path / files['vectors'], mode) as vectors_file, \
+                open(path / files['documents'], mode) as documents_file:
+            if append:
+                # 截掉上次中断的保存可能留下的未提交尾部，从最后一个有效偏移量继续写
+                offsets_file.truncate((start + 1) * 8)
+                offsets_file.seek(start * 8)
+                offset = int(np.frombuffer(offsets_file.read(8), dtype=np.uint64)[0])
+                vectors_file.truncate(start * self.dimension * 4)
+                documents_file.truncate(offset)
+                new_rows = self._matrix[:count - start]
+            else:
+                offset = 0
+                offsets_file.write(np.zeros(1, dtype=np.uint64).tobytes())
+                new_rows = self.matrix
+
+            vectors_file.write(np.ascontiguousarray(new_rows, dtype=np.float32).tobytes())
+            offsets = np.empty(count - start, dtype=np.uint64)
+            for i in range(start, count):
+                data = self.documents[i].encode('utf-8')
+                documents_file.write(data)
+                offset += len(data)
+                offsets[i - start] = offset
+            offsets_file.write(offsets.tobytes())
+            for file in (offsets_file, vectors_file, documents_file):
+                file.flush()
+                os.fsync(file.fileno())
+
+        # 删除标记和文档元数据通常很小，每次整体写出；加载时元数据按 count 截断或补齐
+        np.array(sorted(self.deleted), dtype=np.uint64).tofile(path / files['deleted'])
+        self.metadata.save(path / files['metadata'])
+
+        # index.json 最后原子替换：它决定哪一组文件、哪些行有效
+        meta_tmp = path / (INDEX_META + '.tmp')
+        with open(meta_tmp, 'w', encoding='utf-8') as file:
+            json.dump({
+                'version': INDEX_VERSION,
+                'generation': generation,
+                'dimension': self.dimension,
+                'count': count,
+                'deleted': len(self.deleted),
+                'files': files,
+            }, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(meta_tmp, path / INDEX_META)
+
+        self._open(path)
+        # 新的 index.json 生效后删除不再引用的旧文件（Windows 上仍被映射的文件删除失败时留到下次保存）
+        for name in set(old_files.values()) - set(files.values()):
+            try:
+                (path / name).unlink()
+            except OSError:
+                pass
+
+    @classmethod
+    def load(cls, path: Union[str, Path], ann_index: Optional[IVFIndex] = None,
+             lexical_index: Optional[BM25Index] = None, quantizer: Optional[Quantizer] = None,
+             rerank: int = 4) -> 'VectorStore':
+        """
+        从目录加载向量存储，向量与文档均以内存映射方式打开，不复制到内存
+        Args:
+            path: save() 写出的索引目录
+            ann_index: 挂载的近似最近邻索引（需调用 train_index() 训练）
+            lexical_index: 挂载的词法索引
+            quantizer: 挂载的向量量化器（需调用 train_index() 训练）
+            rerank: 使用量化器时精确重排的候选倍数
+        Returns:
+            VectorStore 实例
+        """
+        store = cls(ann_index=ann_index, lexical_index=lexical_index, quantizer=quantizer, rerank=rerank)
+        store._open(Path(path))
+        store.metadata = MetadataIndex.load(Path(path) / store._files['metadata'], len(store.documents))
+        return store
+
+    @staticmethod
+    def exists(path: Union[str, Path]) -> bool:
+        """判断目录下是否存在已保存的索引"""
+        return (Path(path) / INDEX_META).is_file()
+
+    def _open(self, path: Path):
+        """以内存映射方式打开索引目录，替换当前的全部数据"""
+        meta = self._read_meta(path)
+        if meta.get('version') not in SUPPORTED_INDEX_VERSIONS:
+            raise ValueError(f"Unsupported index version in {path}: {meta.get('version')}")
+        count, dimension = meta['count'], meta['dimension']
+        files = self._meta_files(meta)
+
+        offsets = np.fromfile(path / files['offsets'], dtype=np.uint64, count=count + 1)
+        size = int(offsets[-1])
+        self._base = np.memmap(path / files['vectors'], dtype=np.float32, mode='r',
+                               shape=(count, dimension)) if count else None
+        data = np.memmap(path / files['documents'], dtype=np.uint8, mode='r', shape=(size,)) if size else None
+
+        self.documents = MappedDocuments(data, offsets)
+        self.deleted = set(np.fromfile(path / files['deleted'], dtype=np.uint64,
+                                       count=meta.get('deleted', 0)).tolist()) if meta.get('deleted') else set()
+        self.dimension = dimension
+        self._path = path
+        self._files = files
+        self._matrix = np.empty((self._capacity if dimension else 0, dimension), dtype=np.float32)
+
+    @staticmethod
+    def _meta_files(meta: dict) -> Dict[str, str]:
+        """索引元数据中记录的文件名，版本 1 的索引没有记录时使用固定文件名"""
+        return {**INDEX_FILES, **meta.get('files', {})}
+
+    @staticmethod
+    def _read_meta(path: Path) -> dict:
+        """读取索引元数据，不存在时返回空字典"""
+        try:
+            return json.loads((path / INDEX_META).read_text(encoding='utf-8'))
+        except FileNotFoundError:
+            return {}
+
+    def _scores(self, query: np.ndarray) -> np.ndarray:
+        """
+        计算已归一化的查询向量与全部存储向量的相似度，依次覆盖已持久化部分和内存部分
+        query 也可以是 (维度, 查询数) 的矩阵，此时返回 (文档数, 查询数) 的分数矩阵
+        """
+        tail = self._matrix[:len(self.documents) - self._base_rows]
+        if self._base is None:
+            return tail @ query
+        return np.concatenate([self._base @ query, tail @ query])
+
+    def _scores_at(self, query: np.ndarray, ids: np.ndarray) -> np.ndarray:
+        """只计算查询向量与指定 id（升序）的存储向量的相似度"""
+        split = np.searchsorted(ids, self._base_rows)
+        tail_ids = ids[split:] - self._base_rows
+        tail_scores = self._matrix[tail_ids] @ query
+        if self._base is None:
+            return tail_scores
+        return np.concatenate([self._base[ids[:split]] @ query, tail_scores])
+
+    def _select(self, ids: Optional[np.ndarray], scores: np.ndarray, top_k: int,
+                allowed: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        从 ids（None 表示全部 id）对应的分数中取前K个未删除的文档 id
+        allowed 为过滤位图；ids 不为 None 时应已按位图裁剪过
+        """
+        if allowed is not None and ids is None:
+            scores[~allowed] = -np.inf
+        if self.deleted:
+            if ids is None:
+                scores[list(self.deleted)] = -np.inf
+            else:
+                scores[np.isin(ids, list(self.deleted))] = -np.inf
+        top = self._top_k_indices(scores, min(top_k, scores.shape[0]))
+        top = top[scores[top] > -np.inf]
+        return top if ids is None else ids[top]
+
+    @staticmethod
+    def _top_k_indices(scores: np.ndarray, top_k: int) -> np.ndarray:
+        """
+        取分数最高的前K个下标
+        先用 argpartition 在 O(N) 内选出候选，再只对候选排序；
+        分数相同时按插入顺序排列，与稳定排序的结果保持一致
+        """
+        count = scores.shape[0]
+        if top_k < count:
+            candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+            # argpartition 对边界处的并列分数取舍不确定，补齐所有与第K名同分的项
+            threshold = scores[candidates].min()
+            candidates = np.flatnonzero(scores >= threshold)
+        else:
+            candidates = np.arange(count)
+        order = np.lexsort((candidates, -scores[candidates]))
+        return candidates[order][:top_k]
+
+    def _reserve(self, rows: int, dimension: int):
+        """确保内存部分的矩阵至少能容纳 rows 行，容量不足时按倍数扩容"""
+        if self.dimension == 0:
+            self.dimension = dimension
+            self._matrix = np.empty((self._capacity, dimension), dtype=np.float32)
+        elif dimension != self.dimension:
+            raise ValueError(f"Embedding dimension mismatch: expected {self.dimension}, got {dimension}")
+
+        if rows > self._matrix.shape[0]:
+            capacity = max(1, self._matrix.shape[0])
+            while capacity < rows:
+                capacity *= 2
+            matrix = np.empty((capacity, self.dimension), dtype=np.float32)
+            used = len(self.documents) - self._base_rows
+            matrix[:used] = self._matrix[:used]
+            self._matrix = matrix
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        """
+        将向量（或矩阵的每一行）归一化为单位长度
+        零向量保持为零，使其与任何查询的相似度均为0
+        """
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
@@ -1,5 +1,7 @@
 import re
 import json
+from collections import deque
+from typing import Deque, Iterable, Iterator, List, Tuple
 def log_title(title: str):
     """
     Args:
@@ -9,19 +11,144 @@ def log_title(title: str):
 
 
 
-def read_paragraphs(filename, encoding='utf-8'):
-    """使用正则表达式识别段落"""
+PARAGRAPH_MARK = '　　'
+# CJK 字符（含全角标点），估算 token 时按一字一 token 计
+CJK_PATTERN = '[\u2e80-\u9fff\uac00-\ud7af\uff00-\uffef]'
+# 分词单元：单个 CJK 字符，或带前导空白的一段非 CJK 文本
+TOKEN_UNIT_RE = re.compile(f'{CJK_PATTERN}|\\s*(?:(?!{CJK_PATTERN})\\S)+|\\s+')
+# 句末标点，其后可跟随右引号/右括号
+SENTENCE_END_RE = re.compile(r'[^。！？!?；;…]*(?:[。！？!?；;]+|…+)[”’」』）)"\']*|[^。！？!?；;…]+$')
+
+def iter_paragraphs(filename, encoding='utf-8', block_size: int = 1 << 16) -> Iterator[str]:
+    """
+    流式读取文件并逐个产出段落
+    以全角空格"　　"作为段落开头，按块读取文件、找到段落边界即产出，
+    内存占用只与最长段落有关，与文件大小无关。第一个段落开头之前的内容会被忽略
+    Args:
+        filename: 文件路径
+        encoding: 文件编码
+        block_size: 每次读取的字符数
+    Yields:
+        去除首尾空白后的段落文本
+    """
+    # 当前段落已读入的文本片段，段落结束时才拼接，避免反复拼接和重新扫描长段落
+    parts: List[str] = []
+    # 上一块末尾可能是半个分隔符，与下一块一起查找
+    carry = ''
+    started = False
     with open(filename, 'r', encoding=encoding) as file:
-        content = file.read()
-    
-    # 匹配以全角空格开头的段落
-    # 这个正则会匹配从"　　"开始到下一个"　　"之前的所有内容
-    pattern = r'　　[^　]+(?:(?!　　).)*'
-    
-    paragraphs = re.findall(pattern, content, re.DOTALL)
-    
-    # 清理段落
-    paragraphs = [para.strip() for para in paragraphs if para.strip()]
-    
-    return paragraphs
+        while True:
+            block = file.read(block_size)
+            # 只扫描新读入的文本：parts 中的内容已确认不含分隔符
+            text = carry + block
+            position = 0
+            while True:
+                mark = text.find(PARAGRAPH_MARK, position)
+                if mark < 0:
+                    break
+                if started:
+                    parts.append(text[position:mark])
+                    paragraph = ''.join(parts).strip()
+                    parts = []
+                    if paragraph:
+                        yield paragraph
+                started = True
+                position = mark + len(PARAGRAPH_MARK)
+            if not block:
+                if started:
+                    parts.append(text[position:])
+                break
+            # 未遇到段落开头前的内容直接丢弃
+            split = max(position, len(text) - len(PARAGRAPH_MARK) + 1)
+            if started:
+                parts.append(text[position:split])
+            carry = text[split:]
+
+    if started:
+        paragraph = ''.join(parts).strip()
+        if paragraph:
+            yield paragraph
+
+def read_paragraphs(filename, encoding='utf-8'):
+    """读取文件中以全角空格开头的全部段落"""
+    return list(iter_paragraphs(filename, encoding))
+
+class TokenWindowChunker:
+    """
+    固定 token 窗口切分器
+    把段落流视为连续文本（段落之间以换行连接），切成约 window 个 token 的窗口，
+    相邻窗口重叠约 overlap 个 token
+    """
+    def __init__(self, window: int = 256, overlap: int = 32):
+        """
+        Args:
+            window: 每个窗口的 token 数
+            overlap: 相邻窗口重叠的 token 数，必须小于 window
+        """
+        if not 0 <= overlap < window:
+            raise ValueError('overlap must be in [0, window)')
+        self.window = window
+        self.overlap = overlap
 
+    def __repr__(self):
+        return f'TokenWindowChunker(window={self.window}, overlap={self.overlap})'
+
+    def __call__(self, paragraphs: Iterable[str]) -> Iterator[str]:
+        units: Deque[Tuple[str, int]] = deque()
+        tokens = 0
+        fresh = False  # 当前窗口是否包含尚未产出过的内容
+        for i, paragraph in enumerate(paragraphs):
+            for unit in TOKEN_UNIT_RE.findall(('\n' if i else '') + paragraph):
+                cost = 0 if unit.isspace() else estimate_tokens(unit)
+                units.append((unit, cost))
+                tokens += cost
+                fresh = True
+                if tokens >= self.window:
+                    yield ''.join(unit for unit, _ in units).strip()
+                    # 只保留末尾不超过 overlap 个 token 作为下一个窗口的开头
+                    while units and tokens > self.overlap:
+                        tokens -= units.popleft()[1]
+                    fresh = False
+        if fresh and units:
+            yield ''.join(unit for unit, _ in units).strip()
+
+class SentenceChunker:
+    """
+    按句子切分器
+    在段落内部按句末标点切分，再把相邻句子合并成不超过 max_tokens 的块，块不会跨越段落；
+    单个超长句子会独立成块
+    """
+    def __init__(self, max_tokens: int = 256):
+        """
+        Args:
+            max_tokens: 每个块的 token 上限
+        """
+        self.max_tokens = max_tokens
+
+    def __repr__(self):
+        return f'SentenceChunker(max_tokens={self.max_tokens})'
+
+    def __call__(self, paragraphs: Iterable[str]) -> Iterator[str]:
+        for paragraph in paragraphs:
+            chunk, tokens = '', 0
+            for sentence in SENTENCE_END_RE.findall(paragraph):
+                cost = estimate_tokens(sentence)
+                if chunk and tokens + cost > self.max_tokens:
+                    yield chunk.strip()
+                    chunk, tokens = '', 0
+                chunk += sentence
+                tokens += cost
+            if chunk.strip():
+                yield chunk.strip()
+
+def estimate_tokens(text: str) -> int:
+    """
+    粗略估算文本的 token 数，无需加载分词器
+    CJK 字符大致一字一 token，其余字符按约4个字符一个 token 计算
+    Args:
+        text: 待估算的文本
+    Returns:
+        估算的 token 数（至少为1）
+    """
+    cjk = sum(1 for ch in text if '\u2e80' <= ch <= '\u9fff' or '\uac00' <= ch <= '\ud7af' or '\uff00' <= ch <= '\uffef')
+    return max(1, cjk + (len(text) - cjk + 3) // 4)
@@ -0,0 +1,16 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+# src 下的模块以平铺方式互相导入（from VectorStore import VectorStore），测试中同样如此
+sys.path.insert(0, str(ROOT / 'src'))
+# benchmarks 中的本地替身服务（fake_servers、stub_mcp_server）也供测试使用
+sys.path.insert(0, str(ROOT / 'benchmarks'))
+
+
+@pytest.fixture
+def stub_mcp_args():
+    """启动 stdio MCP 替身服务器的命令参数（配合 sys.executable 使用）"""
+    return [str(ROOT / 'benchmarks' / 'stub_mcp_server.py')]
@@ -0,0 +1,191 @@
+import sys
+import json
+import time
+import asyncio
+
+from MCPClient import MCPClient, Tool
+from Agent import Agent
+from EventSink import NullSink
+
+
+class FakeClient(MCPClient):
+    """不启动服务器的MCP客户端：工具由协程函数实现，记录并发执行数"""
+    def __init__(self, name, handlers):
+        super().__init__(name, 'unused', [])
+        self.handlers = handlers
+        self.tools = [Tool(tool, '', {}) for tool in handlers]
+        self.running = 0
+        self.max_running = 0
+
+    async def init(self):
+        self._initialized = True
+
+    async def close(self):
+        self._initialized = False
+
+    def change_tools(self, handlers):
+        """模拟 tools/list_changed 通知后重新获取到的工具列表"""
+        self.handlers = handlers
+        self.tools = [Tool(tool, '', {}) for tool in handlers]
+        for callback in self._tools_listeners:
+            callback(self)
+
+    async def _call_tool(self, name, params):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            return await self.handlers[name](**params)
+        finally:
+            self.running -= 1
+
+
+def make_agent(clients, **kwargs):
+    return Agent('model', clients, api_key='test', sink=NullSink(), **kwargs)
+
+
+def tool_names(tools):
+    return [tool.name for tool in tools]
+
+
+async def ok():
+    return 'ok'
+
+
+def test_startup_timeout_is_not_extended_by_cleanup():
+    # 不响应 MCP 握手的"服务器"：启动必然超时，关闭 stdio 后子进程也不会立即退出
+    hung = MCPClient('hung', sys.executable, ['-c', 'import time; time.sleep(30)'])
+    agent = Agent('model', [hung], startup_timeout=0.5, api_key='test', sink=NullSink())
+
+    async def run():
+        start = time.perf_counter()
+        await agent.init()
+        elapsed = time.perf_counter() - start
+        await agent.close()
+        return elapsed
+
+    elapsed = asyncio.run(run())
+    assert elapsed < 1.5
+    assert agent.startup_times['hung'] < 1.5
+    assert agent.llm.tools == []
+
+
+def test_tool_routes_follow_list_changed_and_keep_first_on_collision():
+    first = FakeClient('first', {'read': ok, 'shared': ok})
+    second = FakeClient('second', {'shared': ok, 'write': ok})
+    agent = make_agent([first, second])
+
+    async def run():
+        await agent.init()
+        session = agent.session()
+        routes = {name: client.name for name, client in agent._tool_routes.items()}
+        assert routes == {'read': 'first', 'shared': 'first', 'write': 'second'}
+        assert tool_names(agent.llm.tools) == ['read', 'shared', 'write']
+
+        first.change_tools({'read': ok})
+        routes = {name: client.name for name, client in session._tool_routes.items()}
+        assert routes == {'read': 'first', 'shared': 'second', 'write': 'second'}
+        assert tool_names(agent.llm.tools) == tool_names(session.llm.tools) == ['read', 'shared', 'write']
+        await agent.close()
+
+    asyncio.run(run())
+
+
+def test_tools_listener_registered_once_and_removed_on_close():
+    client = FakeClient('fake', {'read': ok})
+    agent = make_agent([client])
+    rebuilds = []
+
+    async def run():
+        await agent.init()
+        await agent.init()
+        assert client._tools_listeners == [agent._on_tools_changed]
+        rebuild = agent._rebuild_tool_routes
+        agent._rebuild_tool_routes = lambda: rebuilds.append(1) or rebuild()
+        client.change_tools({'read': ok, 'write': ok})
+        assert rebuilds == [1]
+        await agent.close()
+        assert client._tools_listeners == []
+
+    asyncio.run(run())
+
+
+class ScriptedLLM:
+    """替代 ChatOpenAI 的桩：依次返回预设的响应，记录追加到历史中的工具结果"""
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.tool_results = []
+        self.tools = []
+
+    async def chat(self, prompt=None):
+        return self.responses.pop(0)
+
+    def append_tool_result(self, tool_call_id, content):
+        self.tool_results.append((tool_call_id, content))
+
+
+def tool_call(call_id, name, **arguments):
+    return {'id': call_id, 'function': {'name': name, 'arguments': json.dumps(arguments)}}
+
+
+def run_tool_calls(agent, *calls):
+    """让代理执行一轮给定的工具调用，返回 (按历史顺序的工具结果, 耗时)"""
+    async def run():
+        await agent.init()
+        agent.llm = ScriptedLLM({'content': '', 'toolCalls': list(calls)}, {'content': 'done', 'toolCalls': []})
+        start = time.perf_counter()
+        answer = await agent.invoke('go')
+        elapsed = time.perf_counter() - start
+        await agent.close()
+        assert answer == 'done'
+        return agent.llm.tool_results, elapsed
+
+    return asyncio.run(run())
+
+
+async def sleep_then(seconds, text):
+    await asyncio.sleep(seconds)
+    return text
+
+
+def test_tool_results_follow_tool_call_order_and_run_concurrently():
+    client = FakeClient('fake', {'sleep': sleep_then})
+    results, elapsed = run_tool_calls(
+        make_agent([client]),
+        tool_call('a', 'sleep', seconds=0.3, text='slow'),
+        tool_call('b', 'sleep', seconds=0.1, text='fast'),
+        tool_call('c', 'sleep', seconds=0.2, text='medium'),
+    )
+    assert results == [('a', 'slow'), ('b', 'fast'), ('c', 'medium')]
+    assert elapsed < 0.5
+
+
+def test_concurrent_tool_calls_are_limited_per_client():
+    first = FakeClient('first', {'sleep': sleep_then})
+    second = FakeClient('second', {'nap': sleep_then})
+    calls = [tool_call(f'f{i}', 'sleep', seconds=0.05, text=str(i)) for i in range(6)]
+    calls += [tool_call(f's{i}', 'nap', seconds=0.05, text=str(i)) for i in range(2)]
+    results, _ = run_tool_calls(make_agent([first, second], max_concurrent_tool_calls=2), *calls)
+    assert [call_id for call_id, _ in results] == [call['id'] for call in calls]
+    assert first.max_running == 2
+    assert second.max_running == 2
+
+
+def test_tool_timeout_error_and_unknown_tool_are_reported_in_order():
+    async def fail():
+        raise ValueError('boom')
+
+    client = FakeClient('fake', {'sleep': sleep_then, 'fail': fail})
+    results, elapsed = run_tool_calls(
+        make_agent([client], tool_timeout=0.1),
+        tool_call('a', 'sleep', seconds=5, text='never'),
+        tool_call('b', 'fail'),
+        tool_call('c', 'missing'),
+        tool_call('d', 'sleep', seconds=0, text='ok'),
+    )
+    assert results == [
+        ('a', 'Tool execution timed out after 0.1s'),
+        ('b', 'Tool execution failed: boom'),
+        ('c', 'Tool not found'),
+        ('d', 'ok'),
+    ]
+    assert elapsed < 1
@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+
+from AgentServer import AgentServer, ServerBusy
+
+
+class StubAgent:
+    """替代 Agent 的桩：invoke() 等待该提示词对应的事件被放行，记录执行顺序"""
+    def __init__(self, gates=None, log=None):
+        self.gates = gates if gates is not None else {}
+        self.log = log if log is not None else []
+        self.closed = False
+
+    def session(self, context=None, sink=None):
+        return StubAgent(self.gates, self.log)
+
+    def set_sink(self, sink):
+        pass
+
+    async def invoke(self, prompt):
+        self.log.append(('start', prompt))
+        gate = self.gates.get(prompt)
+        if gate is not None:
+            await gate.wait()
+        self.log.append(('end', prompt))
+        return prompt.upper()
+
+    async def close(self):
+        await asyncio.sleep(0.05)
+        self.closed = True
+
+
+def test_busy_session_does_not_hold_worker_slots():
+    async def run():
+        gate = asyncio.Event()
+        agent = StubAgent({'a1': gate})
+        server = AgentServer(agent, max_concurrent=2, max_queue=8, session_ttl=None)
+        await server.start()
+        a_jobs = [await server.submit(f'a{i}', 'a') for i in range(1, 4)]
+        b_job = await server.submit('b', 'b')
+        # 会话 a 的第一个任务阻塞时，其余 a 任务不占工作协程，b 仍能执行
+        b_result = await asyncio.wait_for(b_job.done, 1)
+        assert server.metrics()['running'] == 1
+        assert server.metrics()['queue_depth'] == 2
+        gate.set()
+        a_results = [await job.done for job in a_jobs]
+        await server.close()
+        return agent.log, b_result, a_results
+
+    log, b_result, a_results = asyncio.run(run())
+    assert b_result['content'] == 'B'
+    assert [r['content'] for r in a_results] == ['A1', 'A2', 'A3']
+    # 同一会话的任务依次执行，不重叠
+    a_log = [entry for entry in log if entry[1].startswith('a')]
+    assert a_log == [('start', 'a1'), ('end', 'a1'), ('start', 'a2'), ('end', 'a2'), ('start', 'a3'), ('end', 'a3')]
+
+
+def test_pending_session_jobs_count_against_max_queue():
+    async def run():
+        gate = asyncio.Event()
+        server = AgentServer(StubAgent({'a1': gate}), max_concurrent=2, max_queue=2, session_ttl=None)
+        await server.start()
+        first = await server.submit('a1', 'a')
+        await asyncio.sleep(0)
+        jobs = [await server.submit('a2', 'a'), await server.submit('a3', 'a')]
+        with pytest.raises(ServerBusy):
+            await server.submit('a4', 'a')
+        gate.set()
+        await asyncio.gather(first.done, *(job.done for job in jobs))
+        await server.close()
+        return server.metrics()
+
+    metrics = asyncio.run(run())
+    assert metrics['rejected'] == 1
+    assert metrics['completed'] == 3
+    assert metrics['queue_depth'] == 0
+
+
+def test_close_drains_pending_session_jobs():
+    async def run():
+        server = AgentServer(StubAgent(), max_concurrent=1, max_queue=8, session_ttl=None)
+        await server.start()
+        jobs = [await server.submit(f'a{i}', 'a') for i in range(5)]
+        await server.close(drain=True)
+        return [job.done.done() for job in jobs]
+
+    assert all(asyncio.run(run()))
+
+
+def test_close_awaits_expired_session_closes():
+    async def run():
+        server = AgentServer(StubAgent(), max_concurrent=1, max_queue=8, session_ttl=0.0)
+        await server.start()
+        await server.run('a', 'old')
+        agent = server.sessions['old'].agent
+        # 提交新任务时清除过期会话，关闭任务被保留引用
+        await server.run('b', 'new')
+        assert 'old' not in server.sessions
+        assert len(server._closing) == 1
+        await server.close()
+        return agent, server._closing
+
+    agent, closing = asyncio.run(run())
+    assert agent.closed
+    assert not closing
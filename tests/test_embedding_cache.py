@@ -0,0 +1,40 @@
+import asyncio
+
+import numpy as np
+
+from EmbeddingCache import EmbeddingCache
+
+
+def test_memory_and_disk_tiers(tmp_path):
+    async def run():
+        cache = EmbeddingCache(tmp_path / 'cache.sqlite', max_memory_items=2)
+        await cache.put_many('m', ['a', 'b', 'c'], [[1.0, 2.0], [3.0, 4.0], [5.0, 6.0]])
+        # 热点层只保留最近的两条，'a' 需要从 SQLite 读取
+        results = await cache.get_many('m', ['a', 'c', 'missing', '  c '])
+        cache.close()
+        return cache, results
+
+    cache, results = asyncio.run(run())
+    assert results[0].dtype == np.float32
+    np.testing.assert_array_equal(results[0], [1.0, 2.0])
+    np.testing.assert_array_equal(results[1], [5.0, 6.0])
+    assert results[2] is None
+    # 文本规范化后相同的键共享缓存项
+    np.testing.assert_array_equal(results[3], [5.0, 6.0])
+    assert cache.stats()['disk_hits'] == 1 and cache.stats()['misses'] == 1
+    assert len(cache._memory) == 2
+
+
+def test_persists_across_instances_and_models(tmp_path):
+    async def run():
+        cache = EmbeddingCache(tmp_path / 'cache.sqlite')
+        await cache.put_many('m1', ['文本'], [np.array([0.5, 0.25], dtype=np.float32)])
+        cache.close()
+        cache = EmbeddingCache(tmp_path / 'cache.sqlite')
+        results = await cache.get_many('m1', ['文本']) + await cache.get_many('m2', ['文本'])
+        cache.close()
+        return results
+
+    same_model, other_model = asyncio.run(run())
+    np.testing.assert_array_equal(same_model, [0.5, 0.25])
+    assert other_model is None
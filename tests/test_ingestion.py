@@ -0,0 +1,153 @@
+import asyncio
+import hashlib
+import json
+
+import numpy as np
+import pytest
+
+from IVFIndex import IVFIndex
+from KnowledgeIngestor import KnowledgeIngestor, MANIFEST_NAME
+from Quantizer import Int8Quantizer
+from VectorStore import VectorStore
+
+
+class StubRetriever:
+    """替代 EmbeddingRetriever 的桩：按文本哈希生成确定的向量，并记录嵌入过的文本"""
+    batch_size = 4
+    max_batch_tokens = 8192
+    max_concurrency = 2
+
+    def __init__(self, vector_store=None):
+        self.vector_store = vector_store if vector_store is not None else VectorStore()
+        self.embedded = []
+
+    async def embed_many(self, texts):
+        self.embedded.extend(texts)
+        return [np.frombuffer(hashlib.sha256(text.encode('utf-8')).digest()[:8], dtype=np.uint8)
+                .astype(np.float32) + 1.0 for text in texts]
+
+
+def write(path, *paragraphs):
+    path.write_text(''.join(f'　　{paragraph}\n' for paragraph in paragraphs), encoding='utf-8')
+
+
+def sync(ingestor, knowledge):
+    return asyncio.run(ingestor.sync(knowledge))
+
+
+@pytest.fixture
+def knowledge(tmp_path):
+    directory = tmp_path / 'knowledge'
+    directory.mkdir()
+    write(directory / 'a.txt', '甲一', '甲二', '甲三')
+    write(directory / 'b.txt', '乙一', '乙二')
+    return directory
+
+
+def live_documents(store):
+    return sorted(store.documents[i] for i in range(len(store.documents)) if i not in store.deleted)
+
+
+def test_first_sync_adds_every_paragraph_with_metadata(tmp_path, knowledge):
+    retriever = StubRetriever()
+    ingestor = KnowledgeIngestor(retriever, tmp_path / 'index')
+    stats = sync(ingestor, knowledge)
+    store = retriever.vector_store
+    assert stats == {'added': 5, 'deleted': 0, 'unchanged': 0, 'changed_files': 2}
+    assert sorted(retriever.embedded) == ['乙一', '乙二', '甲一', '甲三', '甲二']
+    assert sorted(ingestor.manifest['files']) == ['a.txt', 'b.txt']
+    for name, entry in ingestor.manifest['files'].items():
+        for i, (_, doc_id) in enumerate(entry['paragraphs']):
+            assert store.metadata.get(doc_id)['source'] == name
+            assert store.metadata.get(doc_id)['paragraph'] == i
+
+
+def test_unchanged_files_are_skipped(tmp_path, knowledge):
+    retriever = StubRetriever()
+    ingestor = KnowledgeIngestor(retriever, tmp_path / 'index')
+    sync(ingestor, knowledge)
+    retriever.embedded.clear()
+    stats = sync(ingestor, knowledge)
+    assert stats == {'added': 0, 'deleted': 0, 'unchanged': 5, 'changed_files': 0}
+    assert retriever.embedded == []
+
+
+def test_changed_file_reuses_unchanged_paragraph_ids(tmp_path, knowledge):
+    retriever = StubRetriever()
+    ingestor = KnowledgeIngestor(retriever, tmp_path / 'index')
+    sync(ingestor, knowledge)
+    old_ids = {paragraph_hash: doc_id for paragraph_hash, doc_id in ingestor.manifest['files']['a.txt']['paragraphs']}
+    retriever.embedded.clear()
+
+    write(knowledge / 'a.txt', '甲一', '甲二（修改后）', '甲三')
+    stats = sync(ingestor, knowledge)
+    assert retriever.embedded == ['甲二（修改后）']
+    assert stats == {'added': 1, 'deleted': 1, 'unchanged': 4, 'changed_files': 1}
+    paragraphs = ingestor.manifest['files']['a.txt']['paragraphs']
+    assert paragraphs[0][1] == old_ids[paragraphs[0][0]]
+    assert paragraphs[2][1] == old_ids[paragraphs[2][0]]
+    store = retriever.vector_store
+    assert [store.documents[doc_id] for _, doc_id in paragraphs] == ['甲一', '甲二（修改后）', '甲三']
+    assert live_documents(store) == ['乙一', '乙二', '甲一', '甲三', '甲二（修改后）']
+
+
+def test_removed_file_paragraphs_are_deleted(tmp_path, knowledge):
+    retriever = StubRetriever()
+    ingestor = KnowledgeIngestor(retriever, tmp_path / 'index', compact_ratio=1.0)
+    sync(ingestor, knowledge)
+    (knowledge / 'b.txt').unlink()
+    stats = sync(ingestor, knowledge)
+    assert stats['deleted'] == 2
+    assert list(ingestor.manifest['files']) == ['a.txt']
+    assert live_documents(retriever.vector_store) == ['甲一', '甲三', '甲二']
+
+
+def test_compaction_remaps_manifest_ids(tmp_path, knowledge):
+    retriever = StubRetriever()
+    ingestor = KnowledgeIngestor(retriever, tmp_path / 'index', compact_ratio=0.3)
+    sync(ingestor, knowledge)
+    (knowledge / 'a.txt').unlink()
+    sync(ingestor, knowledge)
+    store = retriever.vector_store
+    assert not store.deleted
+    paragraphs = ingestor.manifest['files']['b.txt']['paragraphs']
+    assert [store.documents[doc_id] for _, doc_id in paragraphs] == ['乙一', '乙二']
+
+
+def test_manifest_round_trip(tmp_path, knowledge):
+    index = tmp_path / 'index'
+    sync(KnowledgeIngestor(StubRetriever(), index), knowledge)
+    manifest = json.loads((index / MANIFEST_NAME).read_text(encoding='utf-8'))
+    assert manifest['index_count'] == 5
+
+    retriever = StubRetriever(VectorStore.load(index))
+    ingestor = KnowledgeIngestor(retriever, index)
+    assert ingestor.manifest['files'] == manifest['files']
+    stats = sync(ingestor, knowledge)
+    assert stats['unchanged'] == 5 and stats['added'] == 0
+    assert retriever.embedded == []
+
+
+def test_out_of_date_manifest_rebuilds_keeping_store_configuration(tmp_path, knowledge):
+    index = tmp_path / 'index'
+    sync(KnowledgeIngestor(StubRetriever(), index), knowledge)
+    manifest_path = index / MANIFEST_NAME
+    manifest = json.loads(manifest_path.read_text(encoding='utf-8'))
+    manifest['index_count'] += 1
+    manifest_path.write_text(json.dumps(manifest), encoding='utf-8')
+
+    ann_index, quantizer = IVFIndex(nlist=2), Int8Quantizer()
+    store = VectorStore.load(index, ann_index=ann_index, quantizer=quantizer, rerank=7)
+    store.train_index()
+    retriever = StubRetriever(store)
+    ingestor = KnowledgeIngestor(retriever, index)
+    assert retriever.vector_store is store
+    assert len(store.documents) == 0
+    assert store.ann_index is ann_index and store.quantizer is quantizer and store.rerank == 7
+    assert not ann_index.is_trained and not quantizer.is_trained
+
+    stats = sync(ingestor, knowledge)
+    assert stats['added'] == 5
+    store.train_index()
+    assert len(quantizer) == 5
+    assert asyncio.run(store.search(asyncio.run(retriever.embed_many(['乙二']))[0], top_k=1)) == ['乙二']
@@ -0,0 +1,161 @@
+import os
+import sys
+import uuid
+import signal
+import asyncio
+from pathlib import Path
+
+import pytest
+
+from MCPPool import MCPPool
+
+# kill_server() 通过 /proc 查找服务器进程
+pytestmark = pytest.mark.skipif(not Path('/proc/self/environ').exists(), reason='needs /proc')
+
+
+def marker_env():
+    """带唯一标记的环境变量，用于找到并杀死对应的服务器进程"""
+    return {'MCP_POOL_TEST': uuid.uuid4().hex}
+
+
+def kill_server(env):
+    """杀死环境变量中带有该标记的服务器进程，模拟进程意外退出"""
+    marker = f"MCP_POOL_TEST={env['MCP_POOL_TEST']}".encode()
+    killed = 0
+    for proc in Path('/proc').iterdir():
+        if not proc.name.isdigit():
+            continue
+        try:
+            environ = (proc / 'environ').read_bytes().split(b'\0')
+        except OSError:
+            continue
+        if marker in environ:
+            os.kill(int(proc.name), signal.SIGKILL)
+            killed += 1
+    assert killed == 1
+
+
+def test_clients_share_one_warm_process(stub_mcp_args):
+    async def run():
+        pool = MCPPool(health_check_interval=60)
+        env = marker_env()
+        first = pool.client('first', sys.executable, stub_mcp_args, env)
+        second = pool.client('second', sys.executable, stub_mcp_args, env)
+        assert first.get_tools() == []
+        await first.init()
+        await second.init()
+        stats = pool.stats()
+        shared = first._shared
+        names = [tool.name for tool in second.get_tools()]
+        result = await second.call_tool('echo', {'text': 'hi'})
+
+        # 归还后进程保持运行，再次借出复用同一个连接
+        await first.close()
+        await second.close()
+        released = pool.stats()
+        alive = await shared.ping()
+        third = pool.client('third', sys.executable, stub_mcp_args, env)
+        await third.init()
+        reused = third._shared is shared
+        await third.close()
+        await pool.close()
+        return stats, names, result, released, alive, reused, pool.stats()
+
+    stats, names, result, released, alive, reused, closed = asyncio.run(run())
+    assert stats == {'processes': 1, 'leases': 2, 'restarts': 0}
+    assert names == ['echo', 'write_file', 'busy']
+    assert result.content[0].text == 'hi'
+    assert released == {'processes': 1, 'leases': 0, 'restarts': 0}
+    assert alive and reused
+    assert closed['processes'] == 0
+
+
+def test_full_pool_evicts_least_recently_used_idle_process(stub_mcp_args):
+    async def run():
+        pool = MCPPool(max_processes=1, health_check_interval=60)
+        a = pool.client('a', sys.executable, stub_mcp_args, marker_env())
+        b = pool.client('b', sys.executable, stub_mcp_args, marker_env())
+        await a.init()
+        # 池已满且唯一的进程被借出：b 需要等待 a 归还
+        waiting = asyncio.create_task(b.init())
+        await asyncio.sleep(0.2)
+        blocked = not waiting.done()
+        old = a._shared
+        await a.close()
+        await waiting
+        evicted = not await old.ping()
+        stats = pool.stats()
+        await b.close()
+        await pool.close()
+        return blocked, evicted, stats
+
+    blocked, evicted, stats = asyncio.run(run())
+    assert blocked and evicted
+    assert stats == {'processes': 1, 'leases': 1, 'restarts': 0}
+
+
+def test_acquire_restarts_dead_process(stub_mcp_args):
+    async def run():
+        pool = MCPPool(health_check_interval=60)
+        env = marker_env()
+        client = pool.client('stub', sys.executable, stub_mcp_args, env)
+        await client.init()
+        await client.close()
+        kill_server(env)
+        await client.init()
+        result = await client.call_tool('echo', {'text': 'back'})
+        await client.close()
+        await pool.close()
+        return pool.restarts, result
+
+    restarts, result = asyncio.run(run())
+    assert restarts == 1
+    assert result.content[0].text == 'back'
+
+
+def test_health_check_restarts_dead_process_and_closes_idle_ones(stub_mcp_args):
+    async def run():
+        pool = MCPPool(health_check_interval=0.1, idle_timeout=None)
+        env = marker_env()
+        client = pool.client('stub', sys.executable, stub_mcp_args, env)
+        await client.init()
+        kill_server(env)
+        for _ in range(100):
+            if pool.restarts:
+                break
+            await asyncio.sleep(0.1)
+        result = await client.call_tool('echo', {'text': 'healed'})
+        await client.close()
+
+        # 空闲超时后由健康检查关闭
+        pool.idle_timeout = 0.1
+        for _ in range(50):
+            if not pool.stats()['processes']:
+                break
+            await asyncio.sleep(0.1)
+        stats = pool.stats()
+        await pool.close()
+        return result, stats
+
+    result, stats = asyncio.run(run())
+    assert result.content[0].text == 'healed'
+    assert stats == {'processes': 0, 'leases': 0, 'restarts': 1}
+
+
+def test_tools_listener_follows_the_shared_client(stub_mcp_args):
+    async def run():
+        pool = MCPPool(health_check_interval=60)
+        client = pool.client('stub', sys.executable, stub_mcp_args, marker_env())
+        calls = []
+        client.add_tools_listener(calls.append)
+        await client.init()
+        shared = client._shared
+        await shared.refresh_tools()
+        await client.close()
+        # 归还后监听者被移除
+        await shared.refresh_tools()
+        await pool.close()
+        return calls, shared
+
+    calls, shared = asyncio.run(run())
+    assert calls == [shared]
@@ -0,0 +1,83 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from VectorStore import VectorStore
+from MetadataIndex import MetadataIndex
+
+
+def build_store(count: int = 400, dim: int = 8) -> VectorStore:
+    rng = np.random.default_rng(0)
+    store = VectorStore()
+    metadatas = [{'source': f'{i % 4}.txt', 'paragraph': i, 'tags': ['even'] if i % 2 == 0 else []}
+                 for i in range(count)]
+    asyncio.run(store.add_embeddings(rng.standard_normal((count, dim)), [f'doc{i}' for i in range(count)],
+                                     metadatas))
+    return store
+
+
+def brute_force(store: VectorStore, query, top_k, keep):
+    """逐个文档判断过滤条件的参考实现"""
+    matrix = store.matrix
+    scores = matrix @ (np.asarray(query, dtype=np.float32) / np.linalg.norm(query))
+    ids = [i for i in np.argsort(-scores, kind='stable') if keep(i) and i not in store.deleted]
+    return ids[:top_k]
+
+
+@pytest.mark.parametrize('condition, keep', [
+    ({'source': '1.txt'}, lambda i: i % 4 == 1),
+    ({'source': ['0.txt', '3.txt']}, lambda i: i % 4 in (0, 3)),
+    ({'paragraph': {'$gte': 100, '$lt': 110}}, lambda i: 100 <= i < 110),
+    ({'tags': 'even', 'source': {'$ne': '0.txt'}}, lambda i: i % 2 == 0 and i % 4 != 0),
+    ({'paragraph': {'$in': [5, 6, 7]}}, lambda i: i in (5, 6, 7)),
+])
+def test_filtered_search_matches_brute_force(condition, keep):
+    store = build_store()
+    store.delete([1, 2, 5])
+    rng = np.random.default_rng(1)
+    for query in rng.standard_normal((5, 8)):
+        expected = brute_force(store, query, 5, keep)
+        assert asyncio.run(store.search_ids(query, 5, filter=condition)).tolist() == expected
+        assert [ids.tolist() for ids in asyncio.run(store.search_many_ids([query], 5, filter=condition))] == [expected]
+
+
+def test_namespaces_are_isolated():
+    store = VectorStore()
+    asyncio.run(store.add_embeddings([[1, 0], [1, 0.1]], ['a1', 'a2'], namespace='a'))
+    asyncio.run(store.add_embeddings([[1, 0]], ['b1'], namespace='b'))
+    assert asyncio.run(store.search([1, 0], top_k=5, namespace='a')) == ['a1', 'a2']
+    assert asyncio.run(store.search([1, 0], top_k=5, namespace='b')) == ['b1']
+    assert asyncio.run(store.search([1, 0], top_k=5, namespace='c')) == []
+
+
+def test_rejected_add_keeps_metadata_aligned():
+    store = build_store(count=401)
+    with pytest.raises(ValueError):
+        asyncio.run(store.add_embeddings([[1.0, 2.0]], ['wrong dimension'], [{'source': '1.txt'}]))
+    with pytest.raises(TypeError):
+        asyncio.run(store.add_embeddings([[1.0] * 8], ['type conflict'], [{'paragraph': 'not a number'}]))
+    assert store.metadata.count == len(store.documents) == 401
+    assert len(asyncio.run(store.search_ids(np.ones(8), 5, filter={'source': '1.txt'}))) == 5
+
+    asyncio.run(store.add_embeddings([np.ones(8)], ['ok'], [{'source': '1.txt'}]))
+    assert store.metadata.count == len(store.documents) == 402
+    assert asyncio.run(store.search(np.ones(8), 1, filter={'source': '1.txt'})) == ['ok']
+
+
+def test_compact_keeps_metadata_with_documents():
+    store = build_store(count=40)
+    store.delete(list(range(0, 40, 3)))
+    store.compact()
+    for doc_id, document in enumerate(store.documents):
+        assert store.metadata.get(doc_id)['paragraph'] == int(document[3:])
+
+
+def test_metadata_save_load_pads_to_count(tmp_path):
+    index = MetadataIndex()
+    index.add([{'source': 'a'}, {'tags': ['x']}])
+    index.save(tmp_path / 'metadata.npz')
+    loaded = MetadataIndex.load(tmp_path / 'metadata.npz', 3)
+    assert loaded.count == 3
+    assert loaded.filter({'source': 'a'}).tolist() == [True, False, False]
+    assert loaded.filter({'tags': 'x'}).tolist() == [False, True, False]
@@ -0,0 +1,130 @@
+import asyncio
+import json
+
+import numpy as np
+import pytest
+
+from VectorStore import VectorStore, INDEX_META
+
+
+def add(store: VectorStore, vectors, documents, metadatas=None):
+    asyncio.run(store.add_embeddings(vectors, documents, metadatas))
+
+
+def search(store: VectorStore, query, top_k=3, **kwargs):
+    return asyncio.run(store.search(query, top_k=top_k, **kwargs))
+
+
+@pytest.fixture
+def vectors():
+    return np.random.default_rng(0).standard_normal((50, 8)).astype(np.float32)
+
+
+def test_save_load_round_trip(tmp_path, vectors):
+    store = VectorStore()
+    add(store, vectors, [f'文档{i}' for i in range(50)], [{'source': f'{i % 3}.txt'} for i in range(50)])
+    store.delete([3, 7])
+    store.save(tmp_path)
+
+    loaded = VectorStore.load(tmp_path)
+    assert list(loaded.documents) == list(store.documents)
+    assert loaded.deleted == {3, 7}
+    np.testing.assert_allclose(loaded.matrix, store.matrix)
+    for query in vectors[:10]:
+        assert search(loaded, query) == search(store, query)
+        assert search(loaded, query, filter={'source': '1.txt'}) == search(store, query, filter={'source': '1.txt'})
+
+
+def test_append_only_writes_new_rows(tmp_path, vectors):
+    store = VectorStore()
+    add(store, vectors[:30], [f'doc{i}' for i in range(30)])
+    store.save(tmp_path)
+    files = json.loads((tmp_path / INDEX_META).read_text())['files']
+    size = (tmp_path / files['vectors']).stat().st_size
+
+    loaded = VectorStore.load(tmp_path)
+    add(loaded, vectors[30:], [f'doc{i}' for i in range(30, 50)])
+    loaded.delete([0])
+    loaded.save(tmp_path)
+
+    meta = json.loads((tmp_path / INDEX_META).read_text())
+    assert meta['files']['vectors'] == files['vectors']
+    assert (tmp_path / files['vectors']).stat().st_size == size + 20 * 8 * 4
+    reloaded = VectorStore.load(tmp_path)
+    assert list(reloaded.documents) == [f'doc{i}' for i in range(50)]
+    assert reloaded.deleted == {0}
+    assert search(reloaded, vectors[40], top_k=1) == ['doc40']
+
+
+def test_compact_then_save_rewrites_and_removes_old_files(tmp_path, vectors):
+    store = VectorStore()
+    add(store, vectors, [f'doc{i}' for i in range(50)], [{'n': i} for i in range(50)])
+    store.save(tmp_path)
+    store.delete(list(range(0, 50, 2)))
+    remap = store.compact()
+    assert remap[1] == 0 and remap[0] == -1
+    store.save(tmp_path)
+
+    reloaded = VectorStore.load(tmp_path)
+    assert list(reloaded.documents) == [f'doc{i}' for i in range(1, 50, 2)]
+    assert search(reloaded, vectors[5], top_k=1) == ['doc5']
+    assert search(reloaded, vectors[5], top_k=1, filter={'n': 7}) == ['doc7']
+    referenced = set(json.loads((tmp_path / INDEX_META).read_text())['files'].values())
+    assert {file.name for file in tmp_path.iterdir()} == referenced | {INDEX_META}
+
+
+def test_full_rewrite_keeps_live_memmap_valid(tmp_path, vectors):
+    store = VectorStore()
+    add(store, vectors[:30], [f'doc{i}' for i in range(30)])
+    store.save(tmp_path)
+    first = VectorStore.load(tmp_path)
+    second = VectorStore.load(tmp_path)
+    add(second, vectors[30:], [f'doc{i}' for i in range(30, 50)])
+    second.save(tmp_path)
+
+    # first 的内存映射文件仍是旧的一代；此时保存需要完整重写，不能截断它正在映射的文件
+    expected = [search(first, query) for query in vectors[:5]]
+    first.save(tmp_path)
+    assert [search(first, query) for query in vectors[:5]] == expected
+    assert len(VectorStore.load(tmp_path).documents) == 30
+
+
+def test_failed_save_keeps_previous_index(tmp_path, vectors, monkeypatch):
+    store = VectorStore()
+    add(store, vectors[:30], [f'doc{i}' for i in range(30)])
+    store.save(tmp_path)
+    meta = (tmp_path / INDEX_META).read_text()
+
+    store.delete([1])
+    add(store, vectors[30:], [f'doc{i}' for i in range(30, 50)])
+
+    def crash(file):
+        raise OSError('disk full')
+    monkeypatch.setattr(store.metadata, 'save', crash)
+    with pytest.raises(OSError):
+        store.save(tmp_path)
+
+    assert (tmp_path / INDEX_META).read_text() == meta
+    loaded = VectorStore.load(tmp_path)
+    assert list(loaded.documents) == [f'doc{i}' for i in range(30)]
+    assert loaded.deleted == set()
+    assert search(loaded, vectors[1], top_k=1) == ['doc1']
+
+
+def test_loads_version_1_layout(tmp_path, vectors):
+    # 版本 1 的索引使用固定文件名，index.json 中没有 files 字段
+    store = VectorStore()
+    add(store, vectors[:10], [f'doc{i}' for i in range(10)])
+    store.save(tmp_path)
+    meta = json.loads((tmp_path / INDEX_META).read_text())
+    for key, name in meta.pop('files').items():
+        (tmp_path / name).rename(tmp_path / VectorStore._meta_files({})[key])
+    meta['version'] = 1
+    del meta['generation']
+    (tmp_path / INDEX_META).write_text(json.dumps(meta))
+
+    loaded = VectorStore.load(tmp_path)
+    assert search(loaded, vectors[4], top_k=1) == ['doc4']
+    add(loaded, vectors[10:12], ['doc10', 'doc11'])
+    loaded.save(tmp_path)
+    assert list(VectorStore.load(tmp_path).documents) == [f'doc{i}' for i in range(12)]
@@ -0,0 +1,63 @@
+import asyncio
+
+import numpy as np
+
+from Quantizer import ProductQuantizer, Int8Quantizer, Float16Quantizer
+from IVFIndex import IVFIndex
+from VectorStore import VectorStore
+
+
+def test_product_quantizer_small_training_set_has_no_phantom_centers():
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((20, 16)).astype(np.float32) + 3.0
+    quantizer = ProductQuantizer(m=4)
+    quantizer.train(vectors)
+    assert quantizer.codebooks.shape == (4, 20, 4)
+    assert np.all(np.abs(quantizer.codebooks).sum(axis=2) > 0)
+
+    # 靠近原点的向量以前会被编码到未训练的全零中心
+    codes = quantizer._encode(np.full((1, 16), 0.01, dtype=np.float32))
+    assert codes.max() < 20
+    np.testing.assert_array_equal(codes[0], [quantizer._nearest(np.full((1, 4), 0.01, dtype=np.float32),
+                                                                quantizer.codebooks[j])[0] for j in range(4)])
+
+
+def test_product_quantizer_small_store_exact_after_rerank():
+    rng = np.random.default_rng(1)
+    vectors = rng.standard_normal((50, 32)).astype(np.float32)
+    documents = [f'doc{i}' for i in range(50)]
+    exact = VectorStore()
+    quantized = VectorStore(quantizer=ProductQuantizer(m=8), rerank=10)
+    for store in (exact, quantized):
+        asyncio.run(store.add_embeddings(vectors, documents))
+    quantized.train_index()
+    for query in vectors[:10]:
+        assert asyncio.run(quantized.search(query, top_k=3)) == asyncio.run(exact.search(query, top_k=3))
+
+
+def test_scalar_quantizers_keep_top_1():
+    rng = np.random.default_rng(2)
+    vectors = rng.standard_normal((300, 64)).astype(np.float32)
+    for quantizer in (Float16Quantizer(), Int8Quantizer()):
+        store = VectorStore(quantizer=quantizer, rerank=0)
+        asyncio.run(store.add_embeddings(vectors, [str(i) for i in range(300)]))
+        store.train_index()
+        hits = sum(asyncio.run(store.search(vector, top_k=1)) == [str(i)] for i, vector in enumerate(vectors[:50]))
+        assert hits == 50
+
+
+def test_compact_to_empty_resets_quantizer_and_ivf_index():
+    quantizer, ann_index = Int8Quantizer(), IVFIndex(nlist=1)
+    store = VectorStore(quantizer=quantizer, ann_index=ann_index, rerank=0)
+    asyncio.run(store.add_embeddings([[1.0, 0.0], [0.0, 1.0]], ['x', 'z']))
+    store.train_index()
+    store.delete([0, 1])
+    store.compact()
+    assert not quantizer.is_trained and len(quantizer) == 0
+    assert not ann_index.is_trained
+
+    asyncio.run(store.add_embeddings([[0.0, 1.0], [1.0, 0.0], [0.6, 0.8]], ['z', 'y', 'w']))
+    assert asyncio.run(store.search([1.0, 0.0], top_k=1)) == ['y']
+    store.train_index()
+    assert len(quantizer) == 3
+    assert asyncio.run(store.search([1.0, 0.0], top_k=1)) == ['y']
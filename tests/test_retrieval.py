@@ -0,0 +1,68 @@
+import asyncio
+
+import numpy as np
+
+from BM25Index import BM25Index, tokenize
+from VectorStore import VectorStore
+from EmbeddingRetriever import EmbeddingRetriever
+
+DOCUMENTS = ['郭靖在桃花岛练武', '黄蓉煮菜给洪七公', '欧阳锋练蛤蟆功', '郭靖与黄蓉同行']
+
+
+def test_tokenize_cjk_bigrams_and_words():
+    assert tokenize('郭靖和黄蓉') == ['郭靖', '靖和', '和黄', '黄蓉']
+    assert tokenize('靖, Hello World 42!') == ['靖', 'hello', 'world', '42']
+
+
+def test_bm25_ranks_matching_documents_and_respects_exclusions():
+    index = BM25Index()
+    index.add(DOCUMENTS)
+    ids, scores = index.search('郭靖', top_k=5)
+    assert sorted(ids.tolist()) == [0, 3]
+    assert np.all(np.diff(scores) <= 0)
+    ids, _ = index.search('郭靖', top_k=5, exclude={0})
+    assert ids.tolist() == [3]
+    assert index.search('完全无关', top_k=5)[0].tolist() == []
+
+
+def make_retriever(rrf_k: int = 60) -> EmbeddingRetriever:
+    return EmbeddingRetriever('test', vector_store=VectorStore(lexical_index=BM25Index()),
+                              retrieval_mode='hybrid', rrf_k=rrf_k, fusion_depth=2)
+
+
+def test_rrf_scores_are_sums_of_reciprocal_ranks():
+    retriever = make_retriever(rrf_k=60)
+    # 文档 7 在两路中分别排第 2、第 1；文档 3 只在第一路排第 1；文档 5 分别排第 3、第 2
+    fused = retriever._fuse([[3, 7, 5], [7, 5]], top_k=3)
+    assert fused == [7, 5, 3]
+
+
+def test_rrf_ties_break_by_id_and_top_k_truncates():
+    retriever = make_retriever()
+    # 文档 4 和 2 在两路中名次互换，得分相同，按 id 排列
+    assert retriever._fuse([[4, 2], [2, 4]], top_k=5) == [2, 4]
+    assert retriever._fuse([[9, 8, 7, 6]], top_k=2) == [9, 8]
+    assert retriever._fuse([np.array([1, 2]), np.array([], dtype=np.int64)], top_k=2) == [1, 2]
+
+
+def test_hybrid_retrieve_fuses_dense_and_lexical(monkeypatch):
+    retriever = make_retriever()
+    vectors = np.eye(4, dtype=np.float32)
+    asyncio.run(retriever.vector_store.add_embeddings(vectors, DOCUMENTS))
+
+    async def embed_query(query):
+        # 查询向量与"欧阳锋"一条最相似，词法上命中两条"郭靖"
+        return [0.1, 0.0, 1.0, 0.0]
+    async def embed_many(texts):
+        return [await embed_query(text) for text in texts]
+    monkeypatch.setattr(retriever, 'embed_query', embed_query)
+    monkeypatch.setattr(retriever, 'embed_many', embed_many)
+
+    dense = asyncio.run(retriever.retrieve('郭靖', top_k=1, mode='dense'))
+    lexical = asyncio.run(retriever.retrieve('郭靖', top_k=2, mode='lexical'))
+    hybrid = asyncio.run(retriever.retrieve('郭靖', top_k=2))
+    assert dense == ['欧阳锋练蛤蟆功']
+    assert sorted(lexical) == ['郭靖与黄蓉同行', '郭靖在桃花岛练武']
+    # 文档 0 在稠密检索中排第 2、在词法检索中排前两名，融合后排第一
+    assert hybrid[0] == '郭靖在桃花岛练武'
+    assert asyncio.run(retriever.retrieve_many(['郭靖'], top_k=2)) == [hybrid]
@@ -0,0 +1,28 @@
+import asyncio
+
+import numpy as np
+
+from ShardedVectorStore import ShardedVectorStore
+from VectorStore import VectorStore
+
+
+def test_sharded_search_matches_vector_store_with_positional_arguments():
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((200, 16)).astype(np.float32)
+    store = VectorStore()
+    metadatas = [{'group': i % 3} for i in range(200)]
+    asyncio.run(store.add_embeddings(vectors, [f'doc{i}' for i in range(200)], metadatas))
+    queries = vectors[:5] + 0.1
+    condition = {'group': 1}
+
+    async def run():
+        async with ShardedVectorStore(store, workers=3) as sharded:
+            # 第三个位置参数在两种存储中都是 nprobe
+            for query in queries:
+                assert await sharded.search(query, 7, None, condition) == await store.search(query, 7, None, condition)
+                np.testing.assert_array_equal(await sharded.search_ids(query, 7, 4),
+                                              await store.search_ids(query, 7, 4))
+            assert await sharded.search_many(queries, 7, None, condition) == \
+                await store.search_many(queries, 7, None, condition)
+
+    asyncio.run(run())
@@ -0,0 +1,53 @@
+import time
+import asyncio
+
+from Agent import Agent
+from EventSink import EventSink
+from fake_servers import FakeServerProcess
+
+SESSIONS = 4
+TOKENS = 20
+
+
+class RecordingSink(EventSink):
+    """把每个 token 事件按到达顺序记入共享日志，标明来自哪个会话"""
+    def __init__(self, name, log):
+        self.name = name
+        self.log = log
+
+    def emit(self, event):
+        if event['type'] == 'token':
+            self.log.append((self.name, event['content']))
+
+
+def test_concurrent_sessions_stream_interleaved():
+    async def run():
+        async with FakeServerProcess(ttft=0.2, token_delay=0.02, tokens=TOKENS, tool_rounds=0) as server:
+            agent = Agent('fake', [], base_url=server.url + '/v1', api_key='fake',
+                          sink=RecordingSink('init', []))
+            await agent.init()
+
+            single_log = []
+            started = time.perf_counter()
+            await agent.session(sink=RecordingSink(0, single_log)).invoke('warm up')
+            single = time.perf_counter() - started
+
+            log = []
+            sessions = [agent.session(sink=RecordingSink(i, log)) for i in range(SESSIONS)]
+            started = time.perf_counter()
+            answers = await asyncio.gather(*(session.invoke(f'task {i}') for i, session in enumerate(sessions)))
+            concurrent = time.perf_counter() - started
+            await agent.close()
+            return single_log, log, answers, single, concurrent
+
+    single_log, log, answers, single, concurrent = asyncio.run(run())
+    expected = ''.join(f'token{i} ' for i in range(TOKENS))
+    assert ''.join(content for _, content in single_log) == expected
+    assert answers == [expected] * SESSIONS
+    for i in range(SESSIONS):
+        assert ''.join(content for name, content in log if name == i) == expected
+    # 各会话的 token 交错到达，而不是一个会话全部结束后才轮到下一个
+    switches = sum(a[0] != b[0] for a, b in zip(log, log[1:]))
+    assert switches >= TOKENS
+    # 并发执行的总耗时接近单个会话，而不是 SESSIONS 倍
+    assert concurrent < single * 2
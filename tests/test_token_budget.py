@@ -0,0 +1,62 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from TokenBudget import TokenBudget
+from ChatOpenAI import ChatOpenAI
+from EventSink import CallbackSink
+
+
+def conversation(rounds: int):
+    messages = [{'role': 'system', 'content': '系统提示'}, {'role': 'user', 'content': '上下文' * 10}]
+    for i in range(rounds):
+        messages.append({'role': 'user', 'content': f'问题{i}'})
+        messages.append({'role': 'assistant', 'content': '', 'tool_calls': [
+            {'id': f'call{i}', 'type': 'function', 'function': {'name': 'read_file', 'arguments': '{}'}}]})
+        messages.append({'role': 'tool', 'tool_call_id': f'call{i}', 'content': '结果' * 400})
+        messages.append({'role': 'assistant', 'content': f'回答{i}'})
+    return messages
+
+
+def test_within_budget_returns_messages_unchanged(capsys):
+    messages = conversation(1)
+    compacted, before, after = TokenBudget(max_tokens=100000).compact(messages, 2)
+    assert compacted is messages and before == after == TokenBudget.count(messages)
+    assert capsys.readouterr().out == ''
+
+
+def test_compaction_keeps_pinned_recent_and_tool_groups(capsys):
+    messages = conversation(10)
+    budget = TokenBudget(max_tokens=2000, keep_recent=2, tool_output_tokens=50)
+    compacted, before, after = budget.compact(messages, 2)
+
+    assert before == TokenBudget.count(messages) and after == TokenBudget.count(compacted)
+    assert after <= 2000 < before
+    assert compacted[:2] == messages[:2]
+    assert compacted[-2:] == messages[-2:]
+    # 每个保留下来的 tool 消息前面都有对应的 tool_calls，不会出现孤立的 tool_call_id
+    calls = set()
+    for message in compacted:
+        calls.update(call['id'] for call in message.get('tool_calls') or [])
+        if message['role'] == 'tool':
+            assert message['tool_call_id'] in calls
+    assert budget.compactions == 1
+    # 压缩本身不输出任何内容，由 ChatOpenAI 通过 sink 上报
+    assert capsys.readouterr().out == ''
+
+
+def test_chat_reports_compaction_through_sink(capsys):
+    events = []
+    llm = ChatOpenAI('model', api_key='test', token_budget=TokenBudget(max_tokens=500),
+                     sink=CallbackSink(events.append, types={'history_compacted'}))
+    llm.messages = conversation(5)
+
+    async def fail(**kwargs):
+        raise RuntimeError('offline')
+    llm.llm = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=fail)))
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(llm.chat('新问题'))
+    assert len(events) == 1 and events[0]['before'] > events[0]['after']
+    assert capsys.readouterr().out == ''
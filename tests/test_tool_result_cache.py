@@ -0,0 +1,144 @@
+import asyncio
+from types import SimpleNamespace
+
+from MCPClient import MCPClient
+from ToolResultCache import ToolResultCache
+
+READS = ['read_file', 'list_directory']
+
+
+def make_cache(**kwargs) -> ToolResultCache:
+    return ToolResultCache(
+        cacheable={'read_file': 60, 'list_directory': 60, 'search': None},
+        invalidates={'write_file': READS, 'move_file': READS, 'reset': ['search']},
+        **kwargs,
+    )
+
+
+def test_hit_uses_normalized_arguments():
+    cache = make_cache()
+    cache.put('read_file', {'path': '/a', 'encoding': 'utf-8'}, 'A')
+    assert cache.get('read_file', {'encoding': 'utf-8', 'path': '/a'}) == 'A'
+    assert cache.get('read_file', {'path': '/b'}) is None
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+
+def test_non_whitelisted_and_error_results_are_not_cached():
+    cache = make_cache()
+    cache.put('write_file', {'path': '/a'}, 'ok')
+    cache.put('read_file', {'path': '/a'}, SimpleNamespace(isError=True))
+    assert cache.get('write_file', {'path': '/a'}) is None
+    assert cache.get('read_file', {'path': '/a'}) is None
+
+
+def test_write_invalidates_same_path_and_parent_directory_only():
+    cache = make_cache()
+    cache.put('read_file', {'path': '/out/a.md'}, 'A')
+    cache.put('read_file', {'path': '/out/b.md'}, 'B')
+    cache.put('list_directory', {'path': '/out'}, ['a.md', 'b.md'])
+    cache.put('list_directory', {'path': '/other'}, [])
+
+    cache.put('write_file', {'path': '/out/a.md', 'content': 'new'}, 'ok')
+
+    assert cache.get('read_file', {'path': '/out/a.md'}) is None
+    assert cache.get('list_directory', {'path': '/out'}) is None
+    assert cache.get('read_file', {'path': '/out/b.md'}) == 'B'
+    assert cache.get('list_directory', {'path': '/other'}) == []
+    assert cache.stats()['invalidations'] == 2
+
+
+def test_move_invalidates_source_and_destination():
+    cache = make_cache()
+    cache.put('read_file', {'path': '/x/a'}, 'A')
+    cache.put('read_file', {'path': '/y/b'}, 'B')
+    cache.put('read_file', {'path': '/z/c'}, 'C')
+    cache.put('move_file', {'source': '/x/a', 'destination': '/y/b'}, 'ok')
+    assert cache.get('read_file', {'path': '/x/a'}) is None
+    assert cache.get('read_file', {'path': '/y/b'}) is None
+    assert cache.get('read_file', {'path': '/z/c'}) == 'C'
+
+
+def test_unscoped_entries_are_invalidated_entirely():
+    cache = make_cache()
+    cache.put('search', {'query': 'q'}, 'hits')
+    cache.put('reset', {}, 'ok')
+    assert cache.get('search', {'query': 'q'}) is None
+
+
+def test_ttl_and_lru_eviction(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('ToolResultCache.time.monotonic', lambda: now[0])
+    cache = make_cache(max_entries=2)
+    cache.put('read_file', {'path': '/a'}, 'A')
+    cache.put('search', {'query': 'q'}, 'Q')
+    now[0] += 61
+    assert cache.get('read_file', {'path': '/a'}) is None
+    assert cache.get('search', {'query': 'q'}) == 'Q'
+
+    cache.put('read_file', {'path': '/b'}, 'B')
+    cache.get('search', {'query': 'q'})
+    cache.put('read_file', {'path': '/c'}, 'C')
+    assert cache.get('read_file', {'path': '/b'}) is None
+    assert cache.get('search', {'query': 'q'}) == 'Q'
+    assert cache.stats()['evictions'] == 1
+
+
+def test_mcp_client_serves_repeated_reads_from_cache():
+    class FakeClient(MCPClient):
+        def __init__(self):
+            super().__init__('fake', 'unused', [], result_cache=make_cache())
+            self.calls = []
+
+        async def _call_tool(self, name, params):
+            self.calls.append(name)
+            return f'{name} #{len(self.calls)}'
+
+    async def run():
+        client = FakeClient()
+        first = await client.call_tool('read_file', {'path': '/a'})
+        second = await client.call_tool('read_file', {'path': '/a'})
+        await client.call_tool('write_file', {'path': '/a', 'content': 'x'})
+        third = await client.call_tool('read_file', {'path': '/a'})
+        return client.calls, first, second, third
+
+    calls, first, second, third = asyncio.run(run())
+    assert calls == ['read_file', 'write_file', 'read_file']
+    assert first == second == 'read_file #1'
+    assert third == 'read_file #3'
+
+
+def test_read_overlapping_a_write_is_not_cached():
+    class FakeClient(MCPClient):
+        def __init__(self):
+            super().__init__('fake', 'unused', [], result_cache=make_cache())
+            self.content = 'old'
+            self.read_started = asyncio.Event()
+            self.write_done = asyncio.Event()
+            self.calls = []
+
+        async def _call_tool(self, name, params):
+            self.calls.append(name)
+            if name == 'read_file':
+                content = self.content
+                self.read_started.set()
+                # 读到旧内容后，写操作在读返回之前完成
+                await self.write_done.wait()
+                return content
+            await self.read_started.wait()
+            self.content = params['content']
+            self.write_done.set()
+            return 'ok'
+
+    async def run():
+        client = FakeClient()
+        stale, _ = await asyncio.gather(
+            client.call_tool('read_file', {'path': '/a'}),
+            client.call_tool('write_file', {'path': '/a', 'content': 'new'}),
+        )
+        fresh = await client.call_tool('read_file', {'path': '/a'})
+        return client.calls, stale, fresh
+
+    calls, stale, fresh = asyncio.run(run())
+    assert stale == 'old'
+    assert fresh == 'new'
+    assert calls == ['read_file', 'write_file', 'read_file']
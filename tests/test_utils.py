@@ -0,0 +1,37 @@
+import re
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from utils import iter_paragraphs, read_paragraphs, PARAGRAPH_MARK
+
+
+def regex_paragraphs(filename):
+    """原来的 read_paragraphs：一次读入整个文件，用正则表达式识别段落"""
+    with open(filename, 'r', encoding='utf-8') as file:
+        content = file.read()
+    paragraphs = re.findall(r'　　[^　]+(?:(?!　　).)*', content, re.DOTALL)
+    return [para.strip() for para in paragraphs if para.strip()]
+
+
+@pytest.mark.parametrize('seed', range(30))
+@pytest.mark.parametrize('block_size', [1, 2, 3, 7, 1 << 16])
+def test_iter_paragraphs_matches_regex_splitter(tmp_path, seed, block_size):
+    rng = np.random.default_rng(seed)
+    pieces = ['　　', '　　', '郭靖', '黄蓉。', 'text ', '\n', '\r\n', ' ']
+    content = '前言' * int(rng.integers(0, 2)) + ''.join(rng.choice(pieces, size=int(rng.integers(0, 80))))
+    path = tmp_path / 'chapter.txt'
+    path.write_text(content, encoding='utf-8', newline='')
+    assert list(iter_paragraphs(path, block_size=block_size)) == regex_paragraphs(path)
+
+
+def test_knowledge_files_match_regex_splitter():
+    for path in sorted((Path(__file__).resolve().parent.parent / 'knowledge').glob('*.txt'))[:3]:
+        assert read_paragraphs(path) == regex_paragraphs(path)
+
+
+def test_long_paragraph_spanning_many_blocks(tmp_path):
+    path = tmp_path / 'dump.txt'
+    path.write_text('前言' + PARAGRAPH_MARK + 'x' * 100_000 + PARAGRAPH_MARK + '尾', encoding='utf-8')
+    assert list(iter_paragraphs(path, block_size=1000)) == ['x' * 100_000, '尾']
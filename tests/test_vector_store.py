@@ -0,0 +1,53 @@
+import asyncio
+
+import numpy as np
+
+from VectorStore import VectorStore
+
+
+def make_store(vectors, documents=None, **kwargs) -> VectorStore:
+    store = VectorStore(**kwargs)
+    documents = documents or [f'doc{i}' for i in range(len(vectors))]
+    asyncio.run(store.add_embeddings(vectors, documents))
+    return store
+
+
+def test_search_orders_by_cosine_similarity():
+    store = make_store([[1, 0], [0.6, 0.8], [0, 1], [-1, 0]])
+    assert asyncio.run(store.search([1, 0.1], top_k=3)) == ['doc0', 'doc1', 'doc2']
+
+
+def test_ties_keep_insertion_order():
+    # 分数相同的文档按插入顺序返回，与旧实现的稳定排序一致
+    store = make_store([[0, 1], [1, 0], [0, 1], [1, 0], [0, 1]])
+    assert asyncio.run(store.search([1, 0], top_k=2)) == ['doc1', 'doc3']
+    assert asyncio.run(store.search([0, 1], top_k=2)) == ['doc0', 'doc2']
+    assert asyncio.run(store.search([0, 1], top_k=3)) == ['doc0', 'doc2', 'doc4']
+
+
+def test_top_k_indices_matches_stable_sort():
+    rng = np.random.default_rng(0)
+    # 取值很少的分数制造大量并列，检验 argpartition 边界处的取舍
+    scores = rng.integers(0, 5, size=500).astype(np.float32)
+    expected = np.argsort(-scores, kind='stable')
+    for top_k in (1, 7, 100, 499, 500):
+        np.testing.assert_array_equal(VectorStore._top_k_indices(scores.copy(), top_k), expected[:top_k])
+
+
+def test_top_k_larger_than_store_and_empty_store():
+    store = make_store([[1, 0], [0, 1]])
+    assert asyncio.run(store.search([1, 0], top_k=10)) == ['doc0', 'doc1']
+    assert asyncio.run(VectorStore().search([1, 0])) == []
+
+
+def test_zero_vector_scores_zero():
+    store = make_store([[0, 0], [-1, 0]])
+    assert asyncio.run(store.search([1, 0], top_k=2)) == ['doc0', 'doc1']
+
+
+def test_search_many_matches_search():
+    rng = np.random.default_rng(1)
+    store = make_store(rng.standard_normal((200, 16)).tolist())
+    queries = rng.standard_normal((20, 16)).tolist()
+    batched = asyncio.run(store.search_many(queries, top_k=5))
+    assert batched == [asyncio.run(store.search(query, top_k=5)) for query in queries]